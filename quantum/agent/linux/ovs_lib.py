@@ -18,17 +18,21 @@
 # @author: Dan Wendlandt, Nicira Networks, Inc.
 # @author: Dave Lapsley, Nicira Networks, Inc.
 
+import contextlib
 import logging
 import shlex
 import signal
 import subprocess
 
 from quantum.agent.linux import utils
+from quantum.openstack.common import jsonutils
 
 LOG = logging.getLogger(__name__)
 
 
-class VifPort:
+class VifPort(object):
+    __slots__ = ('port_name', 'ofport', 'vif_id', 'vif_mac', 'switch')
+
     def __init__(self, port_name, ofport, vif_id, vif_mac, switch):
         self.port_name = port_name
         self.ofport = ofport
@@ -37,45 +41,168 @@ class VifPort:
         self.switch = switch
 
     def __str__(self):
-        return ("iface-id=" + self.vif_id + ", vif_mac=" +
-                self.vif_mac + ", port_name=" + self.port_name +
-                ", ofport=" + str(self.ofport) + ", bridge_name = " +
-                self.switch.br_name)
+        return ("iface-id=%s, vif_mac=%s, port_name=%s, ofport=%s, "
+                "bridge_name = %s" % (self.vif_id, self.vif_mac,
+                                      self.port_name, self.ofport,
+                                      self.switch.br_name))
 
 
 class OVSBridge:
     def __init__(self, br_name, root_helper):
         self.br_name = br_name
         self.root_helper = root_helper
+        self._vsctl_ops = None
+        self._flow_ops = None
 
-    def run_vsctl(self, args):
+    def _execute_vsctl(self, args):
         full_args = ["ovs-vsctl", "--timeout=2"] + args
         return utils.execute(full_args, root_helper=self.root_helper)
 
+    def run_vsctl(self, args):
+        # NOTE(jkoelker) Callers expect to see the effect of anything they
+        #                queued, so push pending operations out first.
+        self.flush_vsctl()
+        return self._execute_vsctl(args)
+
+    def queue_vsctl(self, args):
+        """Run an ovs-vsctl command, deferring it inside a transaction"""
+        if self._vsctl_ops is None:
+            return self.run_vsctl(args)
+        self._vsctl_ops.append(args)
+
+    def flush_vsctl(self):
+        """Run all queued ovs-vsctl commands as a single invocation"""
+        if not self._vsctl_ops:
+            return
+        ops, self._vsctl_ops = self._vsctl_ops, []
+        if len(ops) == 1:
+            return self._execute_vsctl(ops[0])
+        args = []
+        for op in ops:
+            if op[0] != "--":
+                args.append("--")
+            args.extend(op)
+        return self._execute_vsctl(args)
+
+    @contextlib.contextmanager
+    def vsctl_transaction(self):
+        """Collect ovs-vsctl writes and run them with one ovs-vsctl call
+
+        Commands issued through queue_vsctl inside the block are chained
+        with '--' and flushed when the block exits, even on error, or
+        before any command that reads from the database. Nested
+        transactions join the outermost one.
+        """
+        if self._vsctl_ops is not None:
+            yield
+            return
+        self._vsctl_ops = []
+        try:
+            yield
+        finally:
+            try:
+                self.flush_vsctl()
+            finally:
+                self._vsctl_ops = None
+
+    def create_bridge(self):
+        self.run_vsctl(["--", "--may-exist", "add-br", self.br_name])
+
     def reset_bridge(self):
         self.run_vsctl(["--", "--if-exists", "del-br", self.br_name])
         self.run_vsctl(["add-br", self.br_name])
 
     def delete_port(self, port_name):
-        self.run_vsctl(["--", "--if-exists", "del-port", self.br_name,
-          port_name])
+        self.queue_vsctl(["--", "--if-exists", "del-port", self.br_name,
+                          port_name])
 
     def set_db_attribute(self, table_name, record, column, value):
         args = ["set", table_name, record, "%s=%s" % (column, value)]
-        self.run_vsctl(args)
+        self.queue_vsctl(args)
 
     def clear_db_attribute(self, table_name, record, column):
         args = ["clear", table_name, record, column]
-        self.run_vsctl(args)
+        self.queue_vsctl(args)
 
-    def run_ofctl(self, cmd, args):
+    def _execute_ofctl(self, cmd, args, process_input=None):
         full_args = ["ovs-ofctl", cmd, self.br_name] + args
-        return utils.execute(full_args, root_helper=self.root_helper)
+        if process_input is None:
+            return utils.execute(full_args, root_helper=self.root_helper)
+        return utils.execute(full_args, root_helper=self.root_helper,
+                             process_input=process_input)
+
+    def run_ofctl(self, cmd, args):
+        self.flush_flows()
+        return self._execute_ofctl(cmd, args)
+
+    def _queue_flow(self, action, flow_str):
+        if self._flow_ops is None:
+            return self.run_ofctl(action, [flow_str])
+        if self._flow_ops and self._flow_ops[-1][0] == action:
+            self._flow_ops[-1][1].append(flow_str)
+        else:
+            self._flow_ops.append((action, [flow_str]))
+
+    def flush_flows(self):
+        """Apply all buffered flow operations
+
+        Consecutive operations of the same kind are sent to a single
+        'ovs-ofctl add-flows|mod-flows|del-flows <bridge> -' call on
+        stdin, so the relative order of adds, mods and deletes is kept.
+        """
+        if not self._flow_ops:
+            return
+        ops, self._flow_ops = self._flow_ops, []
+        for action, flows in ops:
+            if not action.endswith("s"):
+                action += "s"
+            self._execute_ofctl(action, ["-"],
+                                process_input="\n".join(flows) + "\n")
+
+    @contextlib.contextmanager
+    def deferred_flows(self):
+        """Buffer add_flow, mod_flow and delete_flows calls
+
+        The buffer is applied when the block exits, even on error, or
+        before any other ovs-ofctl command runs. Nested blocks join the
+        outermost one.
+        """
+        if self._flow_ops is not None:
+            yield
+            return
+        self._flow_ops = []
+        try:
+            yield
+        finally:
+            try:
+                self.flush_flows()
+            finally:
+                self._flow_ops = None
 
     def count_flows(self):
         flow_list = self.run_ofctl("dump-flows", []).split("\n")[1:]
         return len(flow_list) - 1
 
+    def dump_flows(self):
+        """Return a (match, actions) tuple for every flow on the bridge
+
+        match maps each field of the flow to its value, or to None for
+        fields without one (e.g. 'ip'). Statistics such as n_packets are
+        included as well.
+        """
+        flows = []
+        for line in self.run_ofctl("dump-flows", []).splitlines()[1:]:
+            line = line.strip()
+            if " actions=" not in line:
+                continue
+            match_str, actions = line.split(" actions=", 1)
+            match = {}
+            for field in match_str.replace(",", " ").split():
+                key, sep, value = field.partition("=")
+                match[key] = sep and value or None
+            flows.append((match, actions))
+        return flows
+
     def remove_all_flows(self):
         self.run_ofctl("del-flows", [])
 
@@ -85,7 +212,6 @@ class OVSBridge:
     def _build_flow_expr_arr(self, **kwargs):
         flow_expr_arr = []
         is_delete_expr = kwargs.get('delete', False)
-        print "kwargs = %s" % kwargs
         if not is_delete_expr:
             prefix = ("hard_timeout=%s,idle_timeout=%s,priority=%s"
                     % (kwargs.get('hard_timeout', '0'),
@@ -124,7 +250,16 @@ class OVSBridge:
         flow_expr_arr = self._build_flow_expr_arr(**kwargs)
         flow_expr_arr.append("actions=%s" % (kwargs["actions"]))
         flow_str = ",".join(flow_expr_arr)
-        self.run_ofctl("add-flow", [flow_str])
+        self._queue_flow("add-flow", flow_str)
+
+    def mod_flow(self, **kwargs):
+        if "actions" not in kwargs:
+            raise Exception("must specify one or more actions")
+        kwargs['delete'] = True
+        flow_expr_arr = self._build_flow_expr_arr(**kwargs)
+        flow_expr_arr.append("actions=%s" % (kwargs["actions"]))
+        flow_str = ",".join(flow_expr_arr)
+        self._queue_flow("mod-flows", flow_str)
 
     def delete_flows(self, **kwargs):
         kwargs['delete'] = True
@@ -132,23 +267,34 @@ class OVSBridge:
         if "actions" in kwargs:
             flow_expr_arr.append("actions=%s" % (kwargs["actions"]))
         flow_str = ",".join(flow_expr_arr)
-        self.run_ofctl("del-flows", [flow_str])
+        if not flow_str:
+            # NOTE(jkoelker) A blank line read from stdin matches nothing,
+            #                so deleting every flow can't be buffered.
+            return self.run_ofctl("del-flows", [flow_str])
+        self._queue_flow("del-flows", flow_str)
+
+    def queue_tunnel_port(self, port_name, remote_ip):
+        """Create a GRE tunnel port without waiting for its ofport"""
+        with self.vsctl_transaction():
+            self.queue_vsctl(["add-port", self.br_name, port_name])
+            self.set_db_attribute("Interface", port_name, "type", "gre")
+            self.set_db_attribute("Interface", port_name,
+                                  "options:remote_ip", remote_ip)
+            self.set_db_attribute("Interface", port_name, "options:in_key",
+                                  "flow")
+            self.set_db_attribute("Interface", port_name, "options:out_key",
+                                  "flow")
 
     def add_tunnel_port(self, port_name, remote_ip):
-        self.run_vsctl(["add-port", self.br_name, port_name])
-        self.set_db_attribute("Interface", port_name, "type", "gre")
-        self.set_db_attribute("Interface", port_name, "options:remote_ip",
-                              remote_ip)
-        self.set_db_attribute("Interface", port_name, "options:in_key", "flow")
-        self.set_db_attribute("Interface", port_name, "options:out_key",
-                              "flow")
+        self.queue_tunnel_port(port_name, remote_ip)
         return self.get_port_ofport(port_name)
 
     def add_patch_port(self, local_name, remote_name):
-        self.run_vsctl(["add-port", self.br_name, local_name])
-        self.set_db_attribute("Interface", local_name, "type", "patch")
-        self.set_db_attribute("Interface", local_name, "options:peer",
-                              remote_name)
+        with self.vsctl_transaction():
+            self.queue_vsctl(["add-port", self.br_name, local_name])
+            self.set_db_attribute("Interface", local_name, "type", "patch")
+            self.set_db_attribute("Interface", local_name, "options:peer",
+                                  remote_name)
         return self.get_port_ofport(local_name)
 
     def db_get_map(self, table, record, column):
@@ -175,19 +321,96 @@ class OVSBridge:
     def get_port_stats(self, port_name):
         return self.db_get_map("Interface", port_name, "statistics")
 
+    def _xapi_iface_id_cmd(self, xs_vif_uuid):
+        return ["xe", "vif-param-get", "param-name=other-config",
+                "param-key=nicira-iface-id", "uuid=%s" % xs_vif_uuid]
+
     def get_xapi_iface_id(self, xs_vif_uuid):
-        return utils.execute(["xe", "vif-param-get", "param-name=other-config",
-                              "param-key=nicira-iface-id",
-                              "uuid=%s" % xs_vif_uuid],
-                              root_helper=self.root_helper).strip()
+        return utils.execute(self._xapi_iface_id_cmd(xs_vif_uuid),
+                             root_helper=self.root_helper).strip()
+
+    def get_xapi_iface_ids(self, xs_vif_uuids):
+        """Look up the iface-id of several XAPI VIFs concurrently"""
+        cmds = [self._xapi_iface_id_cmd(uuid) for uuid in xs_vif_uuids]
+        return [res.strip() for res in
+                utils.execute_many(cmds, root_helper=self.root_helper)]
+
+    @staticmethod
+    def _db_json_value(value):
+        # NOTE(jkoelker) ovs-vsctl encodes maps as ["map", [[k, v], ...]]
+        #                and sets (including empty columns) as
+        #                ["set", [...]]; scalars are passed through.
+        if isinstance(value, list) and len(value) == 2:
+            if value[0] == "map":
+                return dict(value[1])
+            if value[0] == "set":
+                return value[1]
+        return value
+
+    def _list_records(self, table, columns):
+        """Return the given columns of the Port or Interface of every port
+
+        The records are fetched with a single 'ovs-vsctl --format=json
+        list' call and returned as dicts of decoded values.
+        """
+        port_names = self.get_port_name_list()
+        if not port_names:
+            return []
+        res = self.run_vsctl(["--format=json",
+                              "--columns=%s" % ",".join(columns),
+                              "list", table] + port_names)
+        data = jsonutils.loads(res)
+        return [dict((heading, self._db_json_value(value))
+                     for heading, value in zip(data["headings"], row))
+                for row in data["data"]]
+
+    def get_interfaces(self):
+        """Return (name, ofport, external_ids) for each port on the bridge
+
+        Interfaces that have not been assigned an ofport yet are skipped.
+        """
+        interfaces = []
+        for row in self._list_records("Interface",
+                                      ["name", "ofport", "external_ids"]):
+            if isinstance(row["ofport"], list):
+                continue
+            interfaces.append((row["name"], str(row["ofport"]),
+                               row["external_ids"]))
+        return interfaces
+
+    def get_tunnel_ports(self):
+        """Return a remote_ip -> (port name, ofport) map of the GRE ports
+
+        The ofport is None while it has not been assigned.
+        """
+        tunnel_ports = {}
+        for row in self._list_records("Interface",
+                                      ["name", "ofport", "type", "options"]):
+            if row["type"] != "gre" or "remote_ip" not in row["options"]:
+                continue
+            ofport = row["ofport"]
+            if isinstance(ofport, list):
+                ofport = None
+            else:
+                ofport = str(ofport)
+            tunnel_ports[row["options"]["remote_ip"]] = (row["name"], ofport)
+        return tunnel_ports
+
+    def get_port_tags(self):
+        """Return a port name -> VLAN tag map, None for untagged ports"""
+        tags = {}
+        for row in self._list_records("Port", ["name", "tag"]):
+            tag = row["tag"]
+            if isinstance(tag, list):
+                tag = None
+            tags[row["name"]] = tag
+        return tags
 
     # returns a VIF object for each VIF port
     def get_vif_ports(self):
         edge_ports = []
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            external_ids = self.db_get_map("Interface", name, "external_ids")
-            ofport = self.db_get_val("Interface", name, "ofport")
+        xapi_ports = []
+        for name, ofport, external_ids in self.get_interfaces():
             if "iface-id" in external_ids and "attached-mac" in external_ids:
                 p = VifPort(name, ofport, external_ids["iface-id"],
                             external_ids["attached-mac"], self)
@@ -196,7 +419,14 @@ class OVSBridge:
                   "attached-mac" in external_ids):
                 # if this is a xenserver and iface-id is not automatically
                 # synced to OVS from XAPI, we grab it from XAPI directly
-                iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
+                xapi_ports.append((name, ofport, external_ids))
+
+        if xapi_ports:
+            iface_ids = self.get_xapi_iface_ids(
+                [external_ids["xs-vif-uuid"]
+                 for _name, _ofport, external_ids in xapi_ports])
+            for (name, ofport, external_ids), iface_id in zip(xapi_ports,
+                                                              iface_ids):
                 p = VifPort(name, ofport, iface_id,
                             external_ids["attached-mac"], self)
                 edge_ports.append(p)
@@ -18,35 +18,245 @@
 # @author: Juliano Martinez, Locaweb.
 
 import os
+import Queue
 import shlex
+import socket
 import logging
 import subprocess
+import threading
+
+from quantum.openstack.common import jsonutils
 
 LOG = logging.getLogger(__name__)
 
+# NOTE(jkoelker) A root_helper of the form "unix:<socket path>" sends the
+#                commands to a quantum-rootwrap-daemon listening on that
+#                socket instead of forking the helper for each of them.
+ROOTWRAP_DAEMON_PREFIX = 'unix:'
+ROOTWRAP_OUTPUT_ENCODING = 'latin-1'
+
+# Default number of commands execute_many runs at the same time
+DEFAULT_MAX_WORKERS = 8
+
+# NOTE(jkoelker) A connection can only carry one command at a time, so
+#                every thread gets its own.
+_rootwrap_clients = threading.local()
+
+# Number of commands run by this process, by how they were run
+_execute_counts = {'forked': 0, 'daemon': 0}
+_execute_counts_lock = threading.Lock()
+
+
+class RootwrapClient(object):
+    """Persistent connection to a quantum-rootwrap-daemon."""
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.sock = None
+        self.rfile = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+        self.sock = sock
+        self.rfile = sock.makefile('rb')
+
+    def close(self):
+        if self.sock is not None:
+            self.rfile.close()
+            self.sock.close()
+        self.sock = None
+        self.rfile = None
+
+    def _send(self, request, timeout):
+        self.sock.settimeout(timeout)
+        self.sock.sendall(request)
+
+    def _receive(self):
+        response = self.rfile.readline()
+        if not response:
+            raise socket.error("Connection closed by rootwrap daemon")
+        return jsonutils.loads(response)
+
+    def execute(self, cmd, process_input=None, timeout=None):
+        """Returns a (returncode, stdout, stderr) tuple."""
+        if process_input is not None:
+            process_input = process_input.decode(ROOTWRAP_OUTPUT_ENCODING)
+        request = jsonutils.dumps({'cmd': cmd, 'stdin': process_input})
+        request += '\n'
+
+        reconnected = self.sock is None
+        if reconnected:
+            self._connect()
+        try:
+            try:
+                self._send(request, timeout)
+            except socket.timeout:
+                raise
+            except socket.error:
+                self.close()
+                # NOTE(jkoelker) Only retry when the command could not be
+                #                sent on a reused connection, the daemon
+                #                may have been restarted since the last
+                #                command. Once sent, the command may have
+                #                run and is never sent again.
+                if reconnected:
+                    raise
+                self._connect()
+                self._send(request, timeout)
+            try:
+                response = self._receive()
+            except socket.timeout:
+                raise
+            except socket.error:
+                self.close()
+                raise
+        except socket.timeout:
+            # The reply would arrive on the next request, drop the
+            # connection instead
+            self.close()
+            raise RuntimeError("Command %s timed out after %s seconds" %
+                               (cmd, timeout))
+
+        return (response['returncode'],
+                response['stdout'].encode(ROOTWRAP_OUTPUT_ENCODING),
+                response['stderr'].encode(ROOTWRAP_OUTPUT_ENCODING))
+
+
+def _kill(obj):
+    try:
+        obj.kill()
+    except OSError:
+        # The command exited in the meantime
+        pass
+
+
+def _count_execute(kind):
+    with _execute_counts_lock:
+        _execute_counts[kind] += 1
+
+
+def get_execute_counts():
+    """
+    Returns how many commands were forked and how many were sent to a
+    quantum-rootwrap-daemon since the process started.
+    """
+    with _execute_counts_lock:
+        return dict(_execute_counts)
+
+
+def get_rootwrap_client(socket_path):
+    clients = _rootwrap_clients.__dict__
+    if socket_path not in clients:
+        clients[socket_path] = RootwrapClient(socket_path)
+    return clients[socket_path]
+
+
+def _close_rootwrap_clients():
+    """Closes the daemon connections opened by the current thread."""
+    clients = _rootwrap_clients.__dict__
+    for client in clients.values():
+        client.close()
+    clients.clear()
+
 
 def execute(cmd, root_helper=None, process_input=None, addl_env=None,
-            check_exit_code=True, return_stderr=False):
-    if root_helper:
-        cmd = shlex.split(root_helper) + cmd
-    cmd = map(str, cmd)
-
-    LOG.debug("Running command: " + " ".join(cmd))
-    env = os.environ.copy()
-    if addl_env:
-        env.update(addl_env)
-    obj = subprocess.Popen(cmd, shell=False, stdin=subprocess.PIPE,
-                           stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                           env=env)
-
-    _stdout, _stderr = (process_input and
-                        obj.communicate(process_input) or
-                        obj.communicate())
-    obj.stdin.close()
+            check_exit_code=True, return_stderr=False, timeout=None):
+    if root_helper and root_helper.startswith(ROOTWRAP_DAEMON_PREFIX):
+        # NOTE(jkoelker) Like sudo, the daemon does not take the caller's
+        #                environment, so addl_env is not passed along.
+        cmd = map(str, cmd)
+        LOG.debug("Running command: " + " ".join(cmd))
+        client = get_rootwrap_client(
+            root_helper[len(ROOTWRAP_DAEMON_PREFIX):])
+        _count_execute('daemon')
+        returncode, _stdout, _stderr = client.execute(cmd, process_input,
+                                                      timeout)
+    else:
+        if root_helper:
+            cmd = shlex.split(root_helper) + cmd
+        cmd = map(str, cmd)
+
+        LOG.debug("Running command: " + " ".join(cmd))
+        env = os.environ.copy()
+        if addl_env:
+            env.update(addl_env)
+        obj = subprocess.Popen(cmd, shell=False, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               env=env)
+        _count_execute('forked')
+
+        timer = None
+        if timeout is not None:
+            timer = threading.Timer(timeout, _kill, [obj])
+            timer.start()
+        try:
+            _stdout, _stderr = (process_input and
+                                obj.communicate(process_input) or
+                                obj.communicate())
+        finally:
+            if timer is not None:
+                timer.cancel()
+        obj.stdin.close()
+        returncode = obj.returncode
+        if timer is not None and timer.finished.is_set() and returncode < 0:
+            raise RuntimeError("Command %s timed out after %s seconds" %
+                               (cmd, timeout))
+
     m = ("\nCommand: %s\nExit code: %s\nStdout: %r\nStderr: %r" %
-        (cmd, obj.returncode, _stdout, _stderr))
+        (cmd, returncode, _stdout, _stderr))
     LOG.debug(m)
-    if obj.returncode and check_exit_code:
+    if returncode and check_exit_code:
         raise RuntimeError(m)
 
     return return_stderr and (_stdout, _stderr) or _stdout
+
+
+def execute_many(cmds, root_helper=None, max_workers=DEFAULT_MAX_WORKERS,
+                 timeout=None, check_exit_code=True):
+    """
+    Run independent commands concurrently, at most max_workers at a time,
+    and return their output in the order of cmds. timeout applies to each
+    command. Once every command has finished, the error of the first
+    failed one, if any, is raised.
+    """
+    cmds = list(cmds)
+    if len(cmds) <= 1 or max_workers <= 1:
+        return [execute(cmd, root_helper=root_helper, timeout=timeout,
+                        check_exit_code=check_exit_code) for cmd in cmds]
+
+    results = [None] * len(cmds)
+    errors = [None] * len(cmds)
+    pending = Queue.Queue()
+    for i, cmd in enumerate(cmds):
+        pending.put((i, cmd))
+
+    def worker():
+        try:
+            while True:
+                try:
+                    i, cmd = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    results[i] = execute(cmd, root_helper=root_helper,
+                                         timeout=timeout,
+                                         check_exit_code=check_exit_code)
+                except Exception as e:
+                    errors[i] = e
+        finally:
+            # NOTE(jkoelker) The worker threads do not outlive this call,
+            #                neither should their daemon connections.
+            _close_rootwrap_clients()
+
+    workers = [threading.Thread(target=worker)
+               for _i in xrange(min(max_workers, len(cmds)))]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    for error in errors:
+        if error is not None:
+            raise error
+    return results
@@ -0,0 +1,169 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Statistics of the polling cycles of the agents.
+
+Each cycle records how long its phases took, how many ports were added,
+removed and changed and how many commands were run. Every cycle is logged
+at debug level and sent to the optional statsd sink, and a summary of the
+cycles of the last report_interval seconds is logged at info level.
+"""
+
+import contextlib
+import logging
+import socket
+import time
+
+from quantum.agent.linux import utils
+
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_REPORT_INTERVAL = 60
+DEFAULT_STATSD_PORT = 8125
+STATSD_PREFIX = 'quantum.agent'
+
+
+def get_statsd_prefix(agent):
+    # NOTE(jkoelker) statsd splits names on dots, so only keep the short
+    #                host name.
+    host = socket.gethostname().split('.')[0]
+    return '%s.%s.%s' % (STATSD_PREFIX, host, agent)
+
+
+class StatsdSink(object):
+    """Sends the statistics of each cycle to statsd in one UDP packet."""
+
+    def __init__(self, host, port=DEFAULT_STATSD_PORT, prefix=STATSD_PREFIX):
+        family, socktype, proto, _name, address = socket.getaddrinfo(
+            host, port, 0, socket.SOCK_DGRAM)[0]
+        self.address = address
+        self.prefix = prefix
+        self.sock = socket.socket(family, socktype, proto)
+
+    def send(self, timers, counters):
+        lines = ['%s.%s:%d|ms' % (self.prefix, name, value * 1000)
+                 for name, value in sorted(timers.iteritems())]
+        lines.extend('%s.%s:%d|c' % (self.prefix, name, value)
+                     for name, value in sorted(counters.iteritems()))
+        try:
+            self.sock.sendto('\n'.join(lines), self.address)
+        except socket.error as e:
+            LOG.debug("Unable to send statistics to %s: %s" %
+                      (self.address, e))
+
+
+class CycleStats(object):
+    """
+    Statistics of the polling cycles of one agent. start() is called at the
+    beginning of a cycle and finish() once its work is done, before the
+    agent sleeps. A cycle which is not finished is not reported.
+    """
+
+    def __init__(self, polling_interval,
+                 report_interval=DEFAULT_REPORT_INTERVAL, sink=None,
+                 timer=time.time):
+        self.polling_interval = polling_interval
+        self.report_interval = report_interval
+        self.sink = sink
+        self.timer = timer
+        self._reset_window()
+        self.start()
+
+    def _reset_window(self):
+        self.window_start = self.timer()
+        self.window_cycles = 0
+        self.window_overruns = 0
+        self.window_max = 0.0
+        self.window_timers = {}
+        self.window_counters = {}
+
+    def start(self):
+        self.cycle_start = self.timer()
+        self.execute_counts = utils.get_execute_counts()
+        self.timers = {}
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Adds the time spent in the block to the phase name."""
+        start = self.timer()
+        try:
+            yield
+        finally:
+            self.timers[name] = (self.timers.get(name, 0.0) +
+                                 self.timer() - start)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self):
+        now = self.timer()
+        elapsed = now - self.cycle_start
+        self.timers['cycle'] = elapsed
+        for kind, count in utils.get_execute_counts().iteritems():
+            self.count(kind, count - self.execute_counts.get(kind, 0))
+
+        LOG.debug("Cycle statistics: %s" %
+                  self._format(self.timers, self.counters))
+        if elapsed > self.polling_interval:
+            LOG.warning("Cycle took %.3fs, longer than the polling interval "
+                        "of %ss" % (elapsed, self.polling_interval))
+        if self.sink is not None:
+            self.sink.send(self.timers, self.counters)
+
+        self.window_cycles += 1
+        self.window_max = max(self.window_max, elapsed)
+        if elapsed > self.polling_interval:
+            self.window_overruns += 1
+        for name, value in self.timers.iteritems():
+            self.window_timers[name] = self.window_timers.get(name, 0) + value
+        for name, value in self.counters.iteritems():
+            self.window_counters[name] = (self.window_counters.get(name, 0) +
+                                          value)
+
+        if now - self.window_start >= self.report_interval:
+            self.report()
+            self._reset_window()
+
+    def report(self):
+        if not self.window_cycles:
+            return
+        timers = dict((name, value / self.window_cycles)
+                      for name, value in self.window_timers.iteritems())
+        timers['max'] = self.window_max
+        LOG.info("%d cycles in %ds, %d longer than the polling interval, "
+                 "average %s, total %s" %
+                 (self.window_cycles, self.timer() - self.window_start,
+                  self.window_overruns, self._format(timers, {}),
+                  self._format({}, self.window_counters)))
+
+    @staticmethod
+    def _format(timers, counters):
+        items = ['%s=%.3fs' % item for item in sorted(timers.iteritems())]
+        items.extend('%s=%d' % item for item in sorted(counters.iteritems()))
+        return ' '.join(items)
+
+
+def create_stats(agent, polling_interval,
+                 report_interval=DEFAULT_REPORT_INTERVAL, statsd_host=None,
+                 statsd_port=DEFAULT_STATSD_PORT):
+    sink = None
+    if statsd_host:
+        sink = StatsdSink(statsd_host, statsd_port, get_statsd_prefix(agent))
+    return CycleStats(polling_interval, report_interval, sink)
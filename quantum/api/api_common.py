@@ -46,6 +46,17 @@ class OperationalStatus:
     UNKNOWN = "UNKNOWN"
 
 
+def get_ports_details(plugin, tenant_id, network_id, port_ids):
+    """
+    Returns the details of the ports port_ids of network_id, in one call
+    if the plugin implements get_ports_details.
+    """
+    if hasattr(plugin, 'get_ports_details'):
+        return plugin.get_ports_details(tenant_id, network_id, port_ids)
+    return [plugin.get_port_details(tenant_id, network_id, port_id)
+            for port_id in port_ids]
+
+
 def create_resource(version, controller_dict):
     """
     Generic function for creating a wsgi resource
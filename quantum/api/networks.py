@@ -57,10 +57,9 @@ class Controller(common.QuantumController):
         ports_data = None
         if port_details:
             port_list = self._plugin.get_all_ports(tenant_id, network_id)
-            ports_data = [
-                self._plugin.get_port_details(tenant_id, network_id,
-                                              port['port-id'])
-                for port in port_list]
+            ports_data = common.get_ports_details(
+                self._plugin, tenant_id, network_id,
+                [port['port-id'] for port in port_list])
         builder = networks_view.get_view_builder(request, self.version)
         result = builder.build(network, net_details,
                                ports_data, port_details)['network']
@@ -83,7 +82,8 @@ class Controller(common.QuantumController):
         # Inefficient, API-layer filtering
         # will be performed only for the filters not implemented by the plugin
         # NOTE(salvatore-orlando): the plugin is supposed to leave only filters
-        # it does not implement in filter_opts
+        # it does not implement in filter_opts, or to name the ones it
+        # implements in supported_network_filters
         networks = filters.filter_networks(networks,
                                            self._plugin,
                                            tenant_id,
@@ -67,18 +67,17 @@ class Controller(common.QuantumController):
         # This can be inefficient.
         # TODO(salvatore-orlando): the fix for bug #834012 should deal with it
         if port_details:
-            port_list_detail = [
-                self._plugin.get_port_details(tenant_id, network_id,
-                                              port['port-id'])
-                for port in port_list]
-            port_list = port_list_detail
+            port_list = common.get_ports_details(
+                self._plugin, tenant_id, network_id,
+                [port['port-id'] for port in port_list])
 
         # Perform manual filtering if not supported by plugin
         # Inefficient, API-layer filtering
         # will be performed only if the plugin does
         # not support filtering
         # NOTE(salvatore-orlando): the plugin is supposed to leave only filters
-        # it does not implement in filter_opts
+        # it does not implement in filter_opts, or to name the ones it
+        # implements in supported_port_filters
         port_list = filters.filter_ports(port_list, self._plugin,
                                          tenant_id, network_id,
                                          filter_opts)
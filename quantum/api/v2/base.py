@@ -14,6 +14,7 @@
 # limitations under the License.
 
 import logging
+import urllib
 
 import webob.exc
 
@@ -27,7 +28,8 @@ XML_NS_V20 = 'http://openstack.org/quantum/api/v2.0'
 
 FAULT_MAP = {exceptions.NotFound: webob.exc.HTTPNotFound,
              exceptions.InUse: webob.exc.HTTPConflict,
-             exceptions.StateInvalid: webob.exc.HTTPBadRequest}
+             exceptions.StateInvalid: webob.exc.HTTPBadRequest,
+             exceptions.MacAddressReserved: webob.exc.HTTPBadRequest}
 
 
 def fields(request):
@@ -51,7 +53,7 @@ def filters(request):
     """
     res = {}
     for key in set(request.GET):
-        if key in ('verbose', 'fields'):
+        if key in ('verbose', 'fields', 'limit', 'marker'):
             continue
 
         values = [v for v in request.GET.getall(key) if v]
@@ -92,12 +94,66 @@ def verbose(request):
     return verbose
 
 
+def limit(request, max_limit=None):
+    """
+    Determines the page size for a collection request
+
+    Returns the requested limit capped at max_limit. If no limit was
+    requested max_limit is returned, which may be None meaning the
+    collection is not paginated.
+    """
+    requested = request.GET.get('limit')
+    if not requested:
+        return max_limit
+
+    try:
+        value = int(requested)
+    except ValueError:
+        value = 0
+
+    if value <= 0:
+        msg = _("Limit must be a positive integer, not '%s'") % requested
+        raise webob.exc.HTTPBadRequest(msg)
+
+    if max_limit:
+        return min(value, max_limit)
+    return value
+
+
+def marker(request):
+    """
+    Extracts the id of the last item of the previous page, if any
+    """
+    return request.GET.get('marker') or None
+
+
+def next_links(request, obj_list, page_size):
+    """
+    Builds the links for the next page of a collection
+
+    A full page implies there may be more items, so a 'next' link with
+    the id of the last item as the marker is returned. A short page is
+    the end of the collection and has no links.
+    """
+    if not page_size or len(obj_list) < page_size:
+        return []
+
+    params = [(key, value) for key, value in request.GET.items()
+              if key not in ('limit', 'marker')]
+    params.append(('limit', page_size))
+    params.append(('marker', obj_list[-1]['id']))
+    href = '%s?%s' % (request.path_url, urllib.urlencode(params))
+    return [{'rel': 'next', 'href': href}]
+
+
 class Controller(object):
-    def __init__(self, plugin, collection, resource, params):
+    def __init__(self, plugin, collection, resource, params,
+                 max_limit=None):
         self._plugin = plugin
         self._collection = collection
         self._resource = resource
         self._params = params
+        self._max_limit = max_limit
         self._view = getattr(views, self._resource)
 
     def _items(self, request):
@@ -106,9 +162,33 @@ class Controller(object):
                   'verbose': verbose(request),
                   'fields': fields(request)}
 
+        # NOTE(jkoelker) Only pass the pagination arguments along when
+        #                paginating so plugins which do not know about
+        #                them keep working when no limit is configured
+        page_size = limit(request, self._max_limit)
+        strip_id = False
+        if page_size:
+            kwargs['limit'] = page_size
+            kwargs['marker'] = marker(request)
+
+            # NOTE(jkoelker) The id is the marker for the next page
+            if kwargs['fields'] and 'id' not in kwargs['fields']:
+                kwargs['fields'].append('id')
+                strip_id = True
+
         obj_getter = getattr(self._plugin, "get_%s" % self._collection)
         obj_list = obj_getter(request.context, **kwargs)
-        return {self._collection: [self._view(obj) for obj in obj_list]}
+        links = next_links(request, obj_list, page_size)
+
+        items = [self._view(obj) for obj in obj_list]
+        if strip_id:
+            for item in items:
+                item.pop('id', None)
+
+        res = {self._collection: items}
+        if links:
+            res['%s_links' % self._collection] = links
+        return res
 
     def _item(self, request, id):
         """Retrieves and formats a single element of the requested entity"""
@@ -130,6 +210,13 @@ class Controller(object):
     def create(self, request, body=None):
         """Creates a new instance of the requested entity"""
         body = self._prepare_request_body(body, allow_bulk=True)
+        if self._collection in body:
+            obj_creator = getattr(self._plugin,
+                                  "create_%s_bulk" % self._resource)
+            kwargs = {self._collection: body}
+            obj_list = obj_creator(request.context, **kwargs)
+            return {self._collection: [self._view(obj) for obj in obj_list]}
+
         obj_creator = getattr(self._plugin,
                               "create_%s" % self._resource)
         kwargs = {self._resource: body}
@@ -192,7 +279,11 @@ class Controller(object):
 
 
 def create_resource(collection, resource, plugin, conf, params):
-    controller = Controller(plugin, collection, resource, params)
+    # NOTE(jkoelker) conf values come from paste and are strings, a
+    #                missing or non-positive value disables the cap
+    max_limit = int(conf.get('pagination_max_limit', 0) or 0)
+    controller = Controller(plugin, collection, resource, params,
+                            max_limit=max_limit if max_limit > 0 else None)
 
     # NOTE(jkoelker) To anyone wishing to add "proper" xml support
     #                this is where you do it
@@ -18,6 +18,8 @@
 
 import logging
 
+from quantum.api import api_common as common
+
 
 LOG = logging.getLogger(__name__)
 
@@ -29,11 +31,9 @@ def _load_network_ports_details(network, **kwargs):
     if not 'net-ports' in network:
         # Don't pass filter options, don't care about unused filters
         port_list = plugin.get_all_ports(tenant_id, network['net-id'])
-        ports_data = [plugin.get_port_details(
-                                   tenant_id, network['net-id'],
-                                   port['port-id'])
-                      for port in port_list]
-        network['net-ports'] = ports_data
+        network['net-ports'] = common.get_ports_details(
+            plugin, tenant_id, network['net-id'],
+            [port['port-id'] for port in port_list])
 
 
 def _filter_network_by_name(network, name, **kwargs):
@@ -117,12 +117,16 @@ def _do_filtering(items, filters, filter_opts, plugin,
     return filtered_items
 
 
-def filter_networks(networks, plugin, tenant_id, filter_opts):
-    # Do filtering only if the plugin supports it
-    # and if filtering options have been specific
-    if len(filter_opts) == 0:
-        return networks
+def _pending_filters(filter_opts, filters, supported):
+    """
+    Returns the options of filter_opts the plugin did not apply itself,
+    ignoring the ones that are not filters at all.
+    """
+    return dict((flt, value) for flt, value in filter_opts.iteritems()
+                if flt in filters and flt not in supported)
 
+
+def filter_networks(networks, plugin, tenant_id, filter_opts):
     # load filter functions
     filters = {
         'name': _filter_network_by_name,
@@ -132,26 +136,34 @@ def filter_networks(networks, plugin, tenant_id, filter_opts):
         'has-attachment': _filter_network_has_interface,
         'attachment': _filter_network_by_interface,
         'port': _filter_network_by_port}
+    # Do filtering only for the options the plugin did not apply itself
+    # and if filtering options have been specific
+    filter_opts = _pending_filters(
+        filter_opts, filters, getattr(plugin, 'supported_network_filters', ()))
+    if len(filter_opts) == 0:
+        return networks
+
     # filter networks
     return _do_filtering(networks, filters, filter_opts, plugin, tenant_id)
 
 
 def filter_ports(ports, plugin, tenant_id, network_id, filter_opts):
-    # Do filtering only if the plugin supports it
-    # and if filtering options have been specific
-    if len(filter_opts) == 0:
-        return ports
-
     # load filter functions
     filters = {
         'state': _filter_port_by_state,
         'op-status': _filter_port_by_op_status,
         'has-attachment': _filter_port_has_interface,
         'attachment': _filter_port_by_interface}
+    # Do filtering only for the options the plugin did not apply itself
+    # and if filtering options have been specific
+    filter_opts = _pending_filters(
+        filter_opts, filters, getattr(plugin, 'supported_port_filters', ()))
+    if len(filter_opts) == 0:
+        return ports
+
     # port details are need for filtering
-    ports = [plugin.get_port_details(tenant_id, network_id,
-                                     port['port-id'])
-              for port in ports]
+    ports = common.get_ports_details(plugin, tenant_id, network_id,
+                                     [port['port-id'] for port in ports])
     # filter ports
     return _do_filtering(ports,
                          filters,
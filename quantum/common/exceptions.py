@@ -91,6 +91,25 @@ class PortInUse(InUse):
                 "is plugged into the logical port.")
 
 
+class IpAddressGenerationFailure(InUse):
+    message = _("No more IP addresses available on subnet %(subnet_id)s.")
+
+
+class MacAddressInUse(InUse):
+    message = _("Unable to complete operation for network %(net_id)s. "
+                "The mac address %(mac)s is in use.")
+
+
+class MacAddressReserved(QuantumException):
+    message = _("Unable to complete operation for network %(net_id)s. "
+                "The mac address %(mac)s is reserved for generated "
+                "addresses.")
+
+
+class MacAddressGenerationFailure(QuantumException):
+    message = _("Unable to generate unique mac on network %(net_id)s.")
+
+
 class AlreadyAttached(QuantumException):
     message = _("Unable to plug the attachment %(att_id)s into port "
                 "%(port_id)s for network %(net_id)s. The attachment is "
@@ -130,6 +149,6 @@ class NotImplementedError(Error):
     pass
 
 
-class FixedIPNotAvailable(QuantumException):
+class FixedIPNotAvailable(InUse):
     message = _("Fixed IP (%(ip)s) unavailable for network "
                 "%(network_uuid)s")
@@ -27,6 +27,8 @@ import inspect
 import logging
 import os
 import random
+import socket
+import struct
 import subprocess
 import sys
 
@@ -160,6 +162,44 @@ def last_octet(address):
     return int(address.split(".")[-1])
 
 
+def ip_version(address):
+    """Returns 6 for IPv6 addresses and 4 otherwise"""
+    return 6 if ':' in address else 4
+
+
+def ip_to_int(address):
+    """Converts an IPv4 or IPv6 address string to an integer"""
+    if ip_version(address) == 6:
+        high, low = struct.unpack('!QQ',
+                                  socket.inet_pton(socket.AF_INET6, address))
+        return high << 64 | low
+    return struct.unpack('!L', socket.inet_pton(socket.AF_INET, address))[0]
+
+
+def int_to_ip(value, version=4):
+    """Converts an integer back into an address string"""
+    if version == 6:
+        packed = struct.pack('!QQ', value >> 64, value & (2 ** 64 - 1))
+        return socket.inet_ntop(socket.AF_INET6, packed)
+    return socket.inet_ntop(socket.AF_INET, struct.pack('!L', value))
+
+
+def cidr_to_range(cidr):
+    """
+    Returns the (version, first, last) integers of the addresses in a
+    prefix such as 10.0.0.0/24, host bits of the address are ignored
+    """
+    address, _sep, length = cidr.partition('/')
+    version = ip_version(address)
+    bits = 128 if version == 6 else 32
+    length = int(length) if length else bits
+    if not 0 <= length <= bits:
+        raise ValueError(_("Invalid prefix length in %s") % cidr)
+    hostmask = (1 << (bits - length)) - 1
+    first = ip_to_int(address) & ~hostmask
+    return version, first, first | hostmask
+
+
 def isotime(at=None):
     if not at:
         at = datetime.datetime.utcnow()
@@ -37,6 +37,14 @@ _ENGINE = None
 _MAKER = None
 BASE = model_base.BASE
 
+# Filters of the v1 API applied in SQL by network_list and port_list
+NETWORK_FILTERS = ('name', 'op-status', 'port-op-status', 'port-state',
+                   'has-attachment', 'attachment', 'port')
+PORT_FILTERS = ('state', 'op-status', 'has-attachment', 'attachment')
+
+# Number of ids looked up by one IN clause
+FETCH_BATCH_SIZE = 500
+
 
 class MySQLPingListener(object):
 
@@ -141,16 +149,72 @@ def network_create(tenant_id, name, op_status=OperationalStatus.UNKNOWN):
         return net
 
 
+def _port_op_status_clause(op_status):
+    # NOTE(jkoelker) The plugins report the ports which are not ACTIVE as
+    #                DOWN, whatever their op_status column says.
+    if op_status == OperationalStatus.DOWN:
+        return sql.or_(models.Port.state != 'ACTIVE',
+                       models.Port.op_status == op_status)
+    return sql.and_(models.Port.state == 'ACTIVE',
+                    models.Port.op_status == op_status)
+
+
+def _port_filter_clause(name, value):
+    if name == 'state':
+        return models.Port.state == value
+    elif name == 'op-status':
+        return _port_op_status_clause(value)
+    elif name == 'has-attachment':
+        if value.lower() == 'true':
+            return models.Port.interface_id != sql.null()
+        return models.Port.interface_id == sql.null()
+    elif name == 'attachment':
+        return models.Port.interface_id == value
+
+
+def _network_filter_clause(name, value):
+    if name == 'name':
+        return models.Network.name == value
+    elif name == 'op-status':
+        return models.Network.op_status == value
+    elif name == 'port-op-status':
+        return models.Network.ports.any(_port_op_status_clause(value))
+    elif name == 'port-state':
+        return models.Network.ports.any(models.Port.state == value)
+    elif name == 'has-attachment':
+        attached = models.Network.ports.any(
+            models.Port.interface_id != sql.null())
+        if value.lower() == 'true':
+            return attached
+        return ~attached
+    elif name == 'attachment':
+        return models.Network.ports.any(models.Port.interface_id == value)
+    elif name == 'port':
+        return models.Network.ports.any(models.Port.uuid == value)
+
+
+def _apply_filters(query, filter_clause, filter_opts):
+    for name, value in (filter_opts or {}).iteritems():
+        clause = filter_clause(name, value)
+        if clause is not None:
+            query = query.filter(clause)
+    return query
+
+
 def network_all_tenant_list():
     session = get_session()
     return session.query(models.Network).all()
 
 
-def network_list(tenant_id):
+def network_list(tenant_id, filter_opts=None):
+    """
+    Returns the networks of tenant_id matching the NETWORK_FILTERS in
+    filter_opts. Other options are ignored.
+    """
     session = get_session()
-    return (session.query(models.Network).
-            filter_by(tenant_id=tenant_id).
-            all())
+    query = (session.query(models.Network).
+             filter_by(tenant_id=tenant_id))
+    return _apply_filters(query, _network_filter_clause, filter_opts).all()
 
 
 def network_get(net_id):
@@ -173,22 +237,24 @@ def network_update(net_id, tenant_id, **kwargs):
     return net
 
 
-def network_destroy(net_id):
-    session = get_session()
+def network_destroy(net_id, session=None):
+    if not session:
+        session = get_session()
     try:
-        net = (session.query(models.Network).
-               filter_by(uuid=net_id).
-               one())
-
-        ports = (session.query(models.Port).
-                 filter_by(network_id=net_id).
-                 all())
-        for p in ports:
-            session.delete(p)
-
-        session.delete(net)
-        session.flush()
-        return net
+        with session.begin(subtransactions=True):
+            net = (session.query(models.Network).
+                   filter_by(uuid=net_id).
+                   one())
+
+            ports = (session.query(models.Port).
+                     filter_by(network_id=net_id).
+                     all())
+            for p in ports:
+                session.delete(p)
+
+            session.delete(net)
+            session.flush()
+            return net
     except exc.NoResultFound:
         raise q_exc.NetworkNotFound(net_id=net_id)
 
@@ -204,12 +270,14 @@ def validate_network_ownership(tenant_id, net_id):
         raise q_exc.NetworkNotFound(net_id=net_id)
 
 
-def port_create(net_id, state=None, op_status=OperationalStatus.UNKNOWN):
+def port_create(net_id, state=None, op_status=OperationalStatus.UNKNOWN,
+                session=None):
     # confirm network exists
     network_get(net_id)
 
-    session = get_session()
-    with session.begin():
+    if not session:
+        session = get_session()
+    with session.begin(subtransactions=True):
         port = models.Port(net_id, op_status)
         if state is None:
             state = 'DOWN'
@@ -221,13 +289,17 @@ def port_create(net_id, state=None, op_status=OperationalStatus.UNKNOWN):
         return port
 
 
-def port_list(net_id):
+def port_list(net_id, filter_opts=None):
+    """
+    Returns the ports of net_id matching the PORT_FILTERS in filter_opts.
+    Other options are ignored.
+    """
     # confirm network exists
     network_get(net_id)
     session = get_session()
-    return (session.query(models.Port).
-            filter_by(network_id=net_id).
-            all())
+    query = (session.query(models.Port).
+             filter_by(network_id=net_id))
+    return _apply_filters(query, _port_filter_clause, filter_opts).all()
 
 
 def port_get(port_id, net_id, session=None):
@@ -244,27 +316,50 @@ def port_get(port_id, net_id, session=None):
         raise q_exc.PortNotFound(net_id=net_id, port_id=port_id)
 
 
-def port_update(port_id, net_id, **kwargs):
+def ports_get(port_ids, net_id):
+    """Returns the ports port_ids of net_id, in the order of port_ids."""
     # confirm network exists
     network_get(net_id)
-    port = port_get(port_id, net_id)
     session = get_session()
+    port_ids = list(port_ids)
+    ports = {}
+    for i in xrange(0, len(port_ids), FETCH_BATCH_SIZE):
+        batch = port_ids[i:i + FETCH_BATCH_SIZE]
+        query = (session.query(models.Port).
+                 filter_by(network_id=net_id).
+                 filter(models.Port.uuid.in_(batch)))
+        for port in query:
+            ports[port.uuid] = port
+    for port_id in port_ids:
+        if port_id not in ports:
+            raise q_exc.PortNotFound(net_id=net_id, port_id=port_id)
+    return [ports[port_id] for port_id in port_ids]
+
+
+def port_update(port_id, net_id, session=None, **kwargs):
+    # confirm network exists
+    network_get(net_id)
+    if not session:
+        session = get_session()
+    port = port_get(port_id, net_id, session)
     for key in kwargs:
         if key == "state":
             if kwargs[key] not in ('ACTIVE', 'DOWN'):
                 raise q_exc.StateInvalid(port_state=kwargs[key])
         port[key] = kwargs[key]
-    session.merge(port)
-    session.flush()
+    with session.begin(subtransactions=True):
+        session.merge(port)
+        session.flush()
     return port
 
 
-def port_set_attachment(port_id, net_id, new_interface_id):
+def port_set_attachment(port_id, net_id, new_interface_id, session=None):
     # confirm network exists
     network_get(net_id)
 
-    session = get_session()
-    port = port_get(port_id, net_id)
+    if not session:
+        session = get_session()
+    port = port_get(port_id, net_id, session)
 
     if new_interface_id != "":
         # We are setting, not clearing, the attachment-id
@@ -284,8 +379,9 @@ def port_set_attachment(port_id, net_id, new_interface_id):
             # this is what should happen
             pass
     port.interface_id = new_interface_id
-    session.merge(port)
-    session.flush()
+    with session.begin(subtransactions=True):
+        session.merge(port)
+        session.flush()
     return port
 
 
@@ -300,22 +396,24 @@ def port_unset_attachment(port_id, net_id):
     session.flush()
 
 
-def port_destroy(port_id, net_id):
+def port_destroy(port_id, net_id, session=None):
     # confirm network exists
     network_get(net_id)
 
-    session = get_session()
+    if not session:
+        session = get_session()
     try:
-        port = (session.query(models.Port).
-                filter_by(uuid=port_id).
-                filter_by(network_id=net_id).
-                one())
-        if port['interface_id']:
-            raise q_exc.PortInUse(net_id=net_id, port_id=port_id,
-                                  att_id=port['interface_id'])
-        session.delete(port)
-        session.flush()
-        return port
+        with session.begin(subtransactions=True):
+            port = (session.query(models.Port).
+                    filter_by(uuid=port_id).
+                    filter_by(network_id=net_id).
+                    one())
+            if port['interface_id']:
+                raise q_exc.PortInUse(net_id=net_id, port_id=port_id,
+                                      att_id=port['interface_id'])
+            session.delete(port)
+            session.flush()
+            return port
     except exc.NoResultFound:
         raise q_exc.PortNotFound(port_id=port_id)
 
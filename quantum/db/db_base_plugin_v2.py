@@ -14,18 +14,27 @@
 # limitations under the License.
 
 import logging
+import socket
 
 from sqlalchemy import orm
+from sqlalchemy.orm import attributes
 from sqlalchemy.orm import exc
 
 from quantum import quantum_plugin_base_v2
 from quantum.common import exceptions as q_exc
+from quantum.common import utils
 from quantum.db import api as db
+from quantum.db import mac_allocator
+from quantum.db import model_base
 from quantum.db import models_v2
 
 
 LOG = logging.getLogger(__name__)
 
+# NOTE(jkoelker) Keep IN clauses below the bound parameter limits of
+#                the backends (sqlite defaults to 999)
+IN_BATCH_SIZE = 500
+
 
 class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
     """ A class that implements the v2 Quantum plugin interface
@@ -36,6 +45,10 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         certain events.
     """
 
+    # NOTE(jkoelker) Shared by every plugin instance in the process, the
+    #                blocks of MAC addresses are reserved per process
+    _mac_allocator = mac_allocator.MacAllocator()
+
     def __init__(self):
         # NOTE(jkoelker) This is an incomlete implementation. Subclasses
         #                must override __init__ and setup the database
@@ -65,21 +78,47 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
 
         return query
 
-    def _get_by_id(self, context, model, id, joins=(), verbose=None):
+    def _fields_options(self, model, fields):
+        """Returns query options that only load the requested fields
+
+        Columns not in fields are deferred and relationships not in
+        fields are never loaded, so the SELECT only carries what will
+        be returned. The primary key is always loaded.
+        """
+        if not fields:
+            return []
+
+        options = []
+        for prop in orm.class_mapper(model).iterate_properties:
+            if prop.key in fields or prop.key == 'id':
+                continue
+            if isinstance(prop, orm.properties.RelationshipProperty):
+                options.append(orm.noload(prop.key))
+            else:
+                options.append(orm.defer(prop.key))
+        return options
+
+    def _get_by_id(self, context, model, id, joins=(), verbose=None,
+                   fields=None):
         query = self._model_query(context, model)
+        options = self._fields_options(model, fields)
+        if fields:
+            joins = [join for join in joins if join in fields]
         if verbose:
             if verbose and isinstance(verbose, list):
-                options = [orm.joinedload(join) for join in joins
-                           if join in verbose]
+                options.extend([orm.joinedload(join) for join in joins
+                                if join in verbose])
             else:
-                options = [orm.joinedload(join) for join in joins]
+                options.extend([orm.joinedload(join) for join in joins])
+        if options:
             query = query.options(*options)
         return query.filter_by(id=id).one()
 
-    def _get_network(self, context, id, verbose=None):
+    def _get_network(self, context, id, verbose=None, fields=None):
         try:
             network = self._get_by_id(context, models_v2.Network, id,
-                                      joins=('subnets',), verbose=verbose)
+                                      joins=('subnets',), verbose=verbose,
+                                      fields=fields)
         except exc.NoResultFound:
             raise q_exc.NetworkNotFound(net_id=id)
         except exc.MultipleResultsFound:
@@ -87,10 +126,10 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             raise q_exc.NetworkNotFound(net_id=id)
         return network
 
-    def _get_subnet(self, context, id, verbose=None):
+    def _get_subnet(self, context, id, verbose=None, fields=None):
         try:
             subnet = self._get_by_id(context, models_v2.Subnet, id,
-                                     verbose=verbose)
+                                     verbose=verbose, fields=fields)
         except exc.NoResultFound:
             raise q_exc.SubnetNotFound(subnet_id=id)
         except exc.MultipleResultsFound:
@@ -98,10 +137,10 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             raise q_exc.SubnetNotFound(subnet_id=id)
         return subnet
 
-    def _get_port(self, context, id, verbose=None):
+    def _get_port(self, context, id, verbose=None, fields=None):
         try:
             port = self._get_by_id(context, models_v2.Port, id,
-                                   verbose=verbose)
+                                   verbose=verbose, fields=fields)
         except exc.NoResultFound:
             # NOTE(jkoelker) The PortNotFound exceptions requires net_id
             #                kwarg in order to set the message correctly
@@ -111,66 +150,298 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             raise q_exc.PortNotFound(port_id=id)
         return port
 
-    def _fields(self, resource, fields):
-        if fields:
-            return dict(((key, item) for key, item in resource.iteritems()
-                         if key in fields))
-        return resource
+    def _wants(self, key, fields):
+        return not fields or key in fields
+
+    def _fields(self, resource, keys, fields):
+        # NOTE(jkoelker) Only touch the attributes that were asked for,
+        #                anything else may be deferred and would be
+        #                lazy loaded one row at a time
+        return dict((key, resource[key]) for key in keys
+                    if self._wants(key, fields))
+
+    def _load_joins(self, context, model, items, joins):
+        """Batch loads one-to-many relationships for a list of items
+
+        Rather than lazy loading the relationship once per item, the
+        related rows for all the items are fetched with a single IN
+        query keyed by the item ids and attached to each item.
+        """
+        if not items:
+            return
+
+        ids = [item['id'] for item in items]
+        mapper = orm.class_mapper(model)
+        for join in joins:
+            prop = mapper.get_property(join)
+            local, remote = prop.local_remote_pairs[0]
+            related = dict((id, []) for id in ids)
+
+            query = context.session.query(prop.mapper.class_)
+            for start in xrange(0, len(ids), IN_BATCH_SIZE):
+                chunk = ids[start:start + IN_BATCH_SIZE]
+                for obj in query.filter(remote.in_(chunk)):
+                    related[obj[remote.key]].append(obj)
+
+            for item in items:
+                attributes.set_committed_value(item, join,
+                                               related[item['id']])
 
     def _get_collection(self, context, model, dict_func, filters=None,
-                        fields=None, verbose=None):
+                        fields=None, verbose=None, limit=None, marker=None,
+                        joins=()):
         collection = self._model_query(context, model)
+        joins = [join for join in joins if self._wants(join, fields)]
+        options = self._fields_options(model, fields)
+        options.extend([orm.noload(join) for join in joins])
+        if options:
+            collection = collection.options(*options)
         if filters:
             for key, value in filters.iteritems():
                 column = getattr(model, key, None)
                 if column:
                     collection = collection.filter(column.in_(value))
-        return [dict_func(c, fields) for c in collection.all()]
 
-    def _make_network_dict(self, network, fields=None):
-        res = {'id': network['id'],
-               'name': network['name'],
-               'tenant_id': network['tenant_id'],
-               'admin_state_up': network['admin_state_up'],
-               'op_status': network['op_status'],
-               'subnets': [subnet['id']
-                            for subnet in network['subnets']]}
+        # NOTE(jkoelker) Keyset pagination, the marker is the id of the
+        #                last item of the previous page so each page is
+        #                an index range scan rather than an OFFSET
+        if limit or marker:
+            collection = collection.order_by(model.id)
+            if marker:
+                collection = collection.filter(model.id > marker)
+            if limit:
+                collection = collection.limit(limit)
 
-        return self._fields(res, fields)
+        items = collection.all()
+        self._load_joins(context, model, items, joins)
+        return [dict_func(c, fields) for c in items]
+
+    def _make_network_dict(self, network, fields=None):
+        res = self._fields(network, ('id', 'name', 'tenant_id',
+                                     'admin_state_up', 'op_status'),
+                           fields)
+        if self._wants('subnets', fields):
+            res['subnets'] = [subnet['id'] for subnet in network['subnets']]
+        return res
 
     def _make_subnet_dict(self, subnet, fields=None):
-        res = {'id': subnet['id'],
-               'network_id': subnet['network_id'],
-               'tenant_id': subnet['tenant_id'],
-               'ip_version': subnet['ip_version'],
-               'prefix': subnet['prefix'],
-               'gateway_ip': subnet['gateway_ip']}
-        return self._fields(res, fields)
+        return self._fields(subnet, ('id', 'network_id', 'tenant_id',
+                                     'ip_version', 'prefix', 'gateway_ip'),
+                            fields)
 
     def _make_port_dict(self, port, fields=None):
-        res = {"id": port["id"],
-               "network_id": port["network_id"],
-               'tenant_id': port['tenant_id'],
-               "mac_address": port["mac_address"],
-               "admin_state_up": port["admin_state_up"],
-               "op_status": port["op_status"],
-               "fixed_ips": [ip["address"] for ip in port["fixed_ips"]],
-               "device_id": port["device_id"]}
-        return self._fields(res, fields)
+        res = self._fields(port, ('id', 'network_id', 'tenant_id',
+                                  'mac_address', 'admin_state_up',
+                                  'op_status', 'device_id'),
+                           fields)
+        if self._wants('fixed_ips', fields):
+            res['fixed_ips'] = [ip['address'] for ip in port['fixed_ips']]
+        return res
+
+    def _ip_key(self, value):
+        """Sortable representation of an address for availability ranges"""
+        return '%032x' % value
+
+    def _make_availability_ranges(self, subnet, allocated=()):
+        """Builds the free ranges of a subnet
+
+        The network and broadcast addresses of IPv4 subnets, the gateway
+        and the addresses in allocated are left out of the ranges.
+        """
+        version, first, last = utils.cidr_to_range(subnet['prefix'])
+        if version == 4 and last - first > 1:
+            first, last = first + 1, last - 1
+
+        excluded = set(utils.ip_to_int(address) for address in allocated)
+        if subnet['gateway_ip']:
+            excluded.add(utils.ip_to_int(subnet['gateway_ip']))
+
+        ranges = []
+        for address in sorted(excluded):
+            if address < first or address > last:
+                continue
+            if address > first:
+                ranges.append((first, address - 1))
+            first = address + 1
+        if first <= last:
+            ranges.append((first, last))
+
+        return [models_v2.IPAvailabilityRange(id=model_base.str_uuid(),
+                                              subnet_id=subnet['id'],
+                                              first_ip=self._ip_key(start),
+                                              last_ip=self._ip_key(end))
+                for start, end in ranges]
+
+    def _range_query(self, context, subnet_id):
+        # NOTE(jkoelker) SELECT ... FOR UPDATE on the range rows serializes
+        #                concurrent allocations from the same subnet
+        query = context.session.query(models_v2.IPAvailabilityRange)
+        return query.filter_by(subnet_id=subnet_id).with_lockmode('update')
+
+    def _generate_ips(self, context, subnet, count=1):
+        """Allocates count addresses from the head of the free ranges
+
+        At most count range rows are read, regardless of how full the
+        subnet is.
+        """
+        Range = models_v2.IPAvailabilityRange
+        query = self._range_query(context, subnet['id'])
+        ranges = query.order_by(Range.first_ip).limit(count).all()
+
+        ips = []
+        for free in ranges:
+            first, last = int(free.first_ip, 16), int(free.last_ip, 16)
+            taken = min(count - len(ips), last - first + 1)
+            ips.extend(xrange(first, first + taken))
+            if first + taken > last:
+                context.session.delete(free)
+            else:
+                free.first_ip = self._ip_key(first + taken)
+            if len(ips) == count:
+                break
+
+        if len(ips) < count:
+            raise q_exc.IpAddressGenerationFailure(subnet_id=subnet['id'])
+        return [utils.int_to_ip(ip, subnet['ip_version']) for ip in ips]
+
+    def _allocate_specific_ip(self, context, subnet, address):
+        """Removes a requested address from the free ranges"""
+        Range = models_v2.IPAvailabilityRange
+        try:
+            ip = utils.ip_to_int(address)
+        except (ValueError, socket.error):
+            raise q_exc.FixedIPNotAvailable(ip=address,
+                                            network_uuid=subnet['network_id'])
+        key = self._ip_key(ip)
+
+        query = self._range_query(context, subnet['id'])
+        query = query.filter(Range.first_ip <= key)
+        free = query.order_by(Range.first_ip.desc()).first()
+        if not free or free.last_ip < key:
+            raise q_exc.FixedIPNotAvailable(ip=address,
+                                            network_uuid=subnet['network_id'])
+
+        first, last = int(free.first_ip, 16), int(free.last_ip, 16)
+        if first == last:
+            context.session.delete(free)
+        elif ip == first:
+            free.first_ip = self._ip_key(ip + 1)
+        elif ip == last:
+            free.last_ip = self._ip_key(ip - 1)
+        else:
+            context.session.add(Range(id=model_base.str_uuid(),
+                                      subnet_id=subnet['id'],
+                                      first_ip=self._ip_key(ip + 1),
+                                      last_ip=free.last_ip))
+            free.last_ip = self._ip_key(ip - 1)
+
+    def _release_ip(self, context, subnet_id, address):
+        """Returns an address to the free ranges of its subnet
+
+        The address is merged into the adjacent ranges when there are
+        any, so releasing keeps the range table compact.
+        """
+        ip = utils.ip_to_int(address)
+        query = self._range_query(context, subnet_id)
+        before = query.filter_by(last_ip=self._ip_key(ip - 1)).first()
+        after = query.filter_by(first_ip=self._ip_key(ip + 1)).first()
+
+        if before and after:
+            before.last_ip = after.last_ip
+            context.session.delete(after)
+        elif before:
+            before.last_ip = self._ip_key(ip)
+        elif after:
+            after.first_ip = self._ip_key(ip)
+        else:
+            Range = models_v2.IPAvailabilityRange
+            context.session.add(Range(id=model_base.str_uuid(),
+                                      subnet_id=subnet_id,
+                                      first_ip=self._ip_key(ip),
+                                      last_ip=self._ip_key(ip)))
+
+    def _allocate_ips(self, context, ports, prts):
+        """Allocates the fixed_ips for a list of new ports
+
+        Ports without fixed_ips get one address from the first v4 and
+        the first v6 subnet of their network. Addresses that are not
+        requested explicitly are allocated in a single pass per subnet.
+        """
+        network_ids = set(port['network_id'] for port in ports)
+        subnets_qry = context.session.query(models_v2.Subnet)
+        subnets_qry = subnets_qry.filter(
+            models_v2.Subnet.network_id.in_(network_ids))
+        # NOTE(jkoelker) Keep the query order so the same network always
+        #                gives the same default subnets
+        subnets_list = subnets_qry.all()
+        subnets = dict((subnet['id'], subnet) for subnet in subnets_list)
+
+        network_subnets = dict((network_id, []) for network_id in network_ids)
+        for subnet in subnets_list:
+            network_subnets[subnet['network_id']].append(subnet)
+
+        requests = []
+        for port, p in zip(ports, prts):
+            fixed_ips = p.get('fixed_ips')
+            if not fixed_ips:
+                versions = set()
+                fixed_ips = []
+                for subnet in network_subnets[port['network_id']]:
+                    if subnet['ip_version'] not in versions:
+                        versions.add(subnet['ip_version'])
+                        fixed_ips.append({'subnet': subnet['id']})
+
+            for fixed_ip in fixed_ips:
+                subnet = subnets.get(fixed_ip.get('subnet'))
+                if not subnet or subnet['network_id'] != port['network_id']:
+                    raise q_exc.SubnetNotFound(
+                        subnet_id=fixed_ip.get('subnet'))
+                requests.append((port, subnet, fixed_ip.get('address')))
+
+        generate = {}
+        for port, subnet, address in requests:
+            if address:
+                self._allocate_specific_ip(context, subnet, address)
+            else:
+                generate[subnet['id']] = generate.get(subnet['id'], 0) + 1
+
+        generated = {}
+        for subnet_id, count in generate.iteritems():
+            ips = self._generate_ips(context, subnets[subnet_id], count)
+            generated[subnet_id] = iter(ips)
+
+        for port, subnet, address in requests:
+            if not address:
+                address = generated[subnet['id']].next()
+            allocation = models_v2.IPAllocation(id=model_base.str_uuid(),
+                                                port_id=port['id'],
+                                                subnet_id=subnet['id'],
+                                                address=address,
+                                                allocated=True)
+            port.fixed_ips.append(allocation)
 
     def create_network(self, context, network):
-        n = network['network']
+        return self.create_network_bulk(context, {'networks': [network]})[0]
+
+    def create_network_bulk(self, context, networks):
+        nets = [n['network'] for n in networks['networks']]
 
         # NOTE(jkoelker) Get the tenant_id outside of the session to avoid
         #                unneeded db action if the operation raises
-        tenant_id = self._get_tenant_id_for_create(context, n)
+        tenant_ids = [self._get_tenant_id_for_create(context, n)
+                      for n in nets]
         with context.session.begin():
-            network = models_v2.Network(tenant_id=tenant_id,
-                                        name=n['name'],
-                                        admin_state_up=n['admin_state_up'],
-                                        op_status="ACTIVE")
-            context.session.add(network)
-        return self._make_network_dict(network)
+            # NOTE(jkoelker) Assigning the ids up front lets the session
+            #                flush all the rows as a single executemany
+            networks = [models_v2.Network(id=model_base.str_uuid(),
+                                          tenant_id=tenant_id,
+                                          name=n['name'],
+                                          admin_state_up=n['admin_state_up'],
+                                          op_status="ACTIVE",
+                                          subnets=[])
+                        for n, tenant_id in zip(nets, tenant_ids)]
+            context.session.add_all(networks)
+        return [self._make_network_dict(network) for network in networks]
 
     def update_network(self, context, id, network):
         n = network['network']
@@ -184,6 +455,14 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             network = self._get_network(context, id)
 
             # TODO(anyone) Delegation?
+            subnet_ids = [subnet.id for subnet in network.subnets]
+            if subnet_ids:
+                for model in (models_v2.IPAllocation,
+                              models_v2.IPAvailabilityRange):
+                    qry = context.session.query(model)
+                    qry = qry.filter(model.subnet_id.in_(subnet_ids))
+                    qry.delete(synchronize_session=False)
+
             ports_qry = context.session.query(models_v2.Port)
             ports_qry.filter_by(network_id=id).delete()
 
@@ -193,35 +472,63 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             context.session.delete(network)
 
     def get_network(self, context, id, fields=None, verbose=None):
-        network = self._get_network(context, id, verbose=verbose)
+        network = self._get_network(context, id, verbose=verbose,
+                                    fields=fields)
         return self._make_network_dict(network, fields)
 
-    def get_networks(self, context, filters=None, fields=None, verbose=None):
+    def get_networks(self, context, filters=None, fields=None, verbose=None,
+                     limit=None, marker=None):
         return self._get_collection(context, models_v2.Network,
                                     self._make_network_dict,
                                     filters=filters, fields=fields,
-                                    verbose=verbose)
+                                    verbose=verbose, limit=limit,
+                                    marker=marker, joins=('subnets',))
 
     def create_subnet(self, context, subnet):
-        s = subnet['subnet']
+        return self.create_subnet_bulk(context, {'subnets': [subnet]})[0]
+
+    def create_subnet_bulk(self, context, subnets):
+        subs = [s['subnet'] for s in subnets['subnets']]
+
         # NOTE(jkoelker) Get the tenant_id outside of the session to avoid
         #                unneeded db action if the operation raises
-        tenant_id = self._get_tenant_id_for_create(context, s)
+        tenant_ids = [self._get_tenant_id_for_create(context, s)
+                      for s in subs]
         with context.session.begin():
-            subnet = models_v2.Subnet(tenant_id=tenant_id,
-                                      network_id=s['network_id'],
-                                      ip_version=s['ip_version'],
-                                      prefix=s['prefix'],
-                                      gateway_ip=s['gateway_ip'])
-
-            context.session.add(subnet)
-        return self._make_subnet_dict(subnet)
+            subnets = [models_v2.Subnet(id=model_base.str_uuid(),
+                                        tenant_id=tenant_id,
+                                        network_id=s['network_id'],
+                                        ip_version=s['ip_version'],
+                                        prefix=s['prefix'],
+                                        gateway_ip=s['gateway_ip'])
+                       for s, tenant_id in zip(subs, tenant_ids)]
+            context.session.add_all(subnets)
+
+            for subnet in subnets:
+                context.session.add_all(
+                    self._make_availability_ranges(subnet))
+        return [self._make_subnet_dict(subnet) for subnet in subnets]
 
     def update_subnet(self, context, id, subnet):
         s = subnet['subnet']
         with context.session.begin():
             subnet = self._get_subnet(context, id)
+            rebuild = (subnet['prefix'] != s.get('prefix', subnet['prefix'])
+                       or subnet['gateway_ip'] != s.get('gateway_ip',
+                                                        subnet['gateway_ip']))
             subnet.update(s)
+
+            if rebuild:
+                ranges_qry = context.session.query(
+                    models_v2.IPAvailabilityRange)
+                ranges_qry.filter_by(subnet_id=id).delete()
+
+                allocations_qry = context.session.query(
+                    models_v2.IPAllocation.address)
+                allocated = [a.address for a in
+                             allocations_qry.filter_by(subnet_id=id)]
+                context.session.add_all(
+                    self._make_availability_ranges(subnet, allocated))
         return self._make_subnet_dict(subnet)
 
     def delete_subnet(self, context, id):
@@ -231,42 +538,93 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
             allocations_qry = context.session.query(models_v2.IPAllocation)
             allocations_qry.filter_by(subnet_id=id).delete()
 
+            ranges_qry = context.session.query(models_v2.IPAvailabilityRange)
+            ranges_qry.filter_by(subnet_id=id).delete()
+
             context.session.delete(subnet)
 
     def get_subnet(self, context, id, fields=None, verbose=None):
-        subnet = self._get_subnet(context, id, verbose=verbose)
+        subnet = self._get_subnet(context, id, verbose=verbose, fields=fields)
         return self._make_subnet_dict(subnet, fields)
 
-    def get_subnets(self, context, filters=None, fields=None, verbose=None):
+    def get_subnets(self, context, filters=None, fields=None, verbose=None,
+                    limit=None, marker=None):
         return self._get_collection(context, models_v2.Subnet,
                                     self._make_subnet_dict,
                                     filters=filters, fields=fields,
-                                    verbose=verbose)
+                                    verbose=verbose, limit=limit,
+                                    marker=marker)
+
+    def _check_macs_in_use(self, context, prts):
+        """Raises MacAddressInUse if a requested MAC is already taken"""
+        requested = set()
+        for p in prts:
+            if p.get('mac_address'):
+                key = (p['network_id'], p['mac_address'])
+                if key in requested:
+                    raise q_exc.MacAddressInUse(net_id=key[0], mac=key[1])
+                requested.add(key)
+
+        macs = set(mac for net_id, mac in requested)
+        Port = models_v2.Port
+        query = context.session.query(Port.network_id, Port.mac_address)
+        query = query.filter(Port.mac_address.in_(macs))
+        for network_id, mac_address in query:
+            if (network_id, mac_address) in requested:
+                raise q_exc.MacAddressInUse(net_id=network_id,
+                                            mac=mac_address)
 
     def create_port(self, context, port):
-        p = port['port']
+        return self.create_port_bulk(context, {'ports': [port]})[0]
+
+    def create_port_bulk(self, context, ports):
+        prts = [p['port'] for p in ports['ports']]
+
         # NOTE(jkoelker) Get the tenant_id outside of the session to avoid
         #                unneeded db action if the operation raises
-        tenant_id = self._get_tenant_id_for_create(context, p)
+        tenant_ids = [self._get_tenant_id_for_create(context, p)
+                      for p in prts]
+
+        # NOTE(jkoelker) Reserving MAC blocks commits in a session of its
+        #                own, so do it before the port transaction
+        requested_macs = [p['mac_address'] for p in prts
+                          if p.get('mac_address')]
+        # NOTE(jkoelker) A requested MAC inside the allocator's range could
+        #                later be handed out again on the same network
+        for p in prts:
+            if p.get('mac_address') and \
+                    self._mac_allocator.owns(p['mac_address']):
+                raise q_exc.MacAddressReserved(net_id=p['network_id'],
+                                               mac=p['mac_address'])
+        macs = iter(self._mac_allocator.allocate(
+            len(prts) - len(requested_macs), net_id=prts[0]['network_id']))
 
-        #FIXME(danwent): allocate MAC
-        mac_address = p.get('mac_address', 'ca:fe:de:ad:be:ef')
         with context.session.begin():
-            network = self._get_network(context, p["network_id"])
-
-            port = models_v2.Port(tenant_id=tenant_id,
-                                  network_id=p['network_id'],
-                                  mac_address=mac_address,
-                                  admin_state_up=p['admin_state_up'],
-                                  op_status="ACTIVE",
-                                  device_id=p['device_id'])
-            context.session.add(port)
-
-            # TODO(anyone) ip allocation
-            #for subnet in network["subnets"]:
-            #    pass
-
-        return self._make_port_dict(port)
+            network_ids = set(p['network_id'] for p in prts)
+            query = self._model_query(context, models_v2.Network)
+            query = query.filter(models_v2.Network.id.in_(network_ids))
+            missing = network_ids - set(network.id for network in query)
+            if missing:
+                raise q_exc.NetworkNotFound(net_id=missing.pop())
+
+            if requested_macs:
+                self._check_macs_in_use(context, prts)
+
+            ports = []
+            for p, tenant_id in zip(prts, tenant_ids):
+                mac_address = p.get('mac_address') or macs.next()
+                ports.append(models_v2.Port(id=model_base.str_uuid(),
+                                            tenant_id=tenant_id,
+                                            network_id=p['network_id'],
+                                            mac_address=mac_address,
+                                            admin_state_up=p['admin_state_up'],
+                                            op_status="ACTIVE",
+                                            device_id=p['device_id'],
+                                            fixed_ips=[]))
+            context.session.add_all(ports)
+            self._allocate_ips(context, ports, prts)
+
+        return [self._make_port_dict(port) for port in ports]
 
     def update_port(self, context, id, port):
         p = port['port']
@@ -279,17 +637,21 @@ class QuantumDbPluginV2(quantum_plugin_base_v2.QuantumPluginBaseV2):
         with context.session.begin():
             port = self._get_port(context, id)
 
-            allocations_qry = context.session.query(models_v2.IPAllocation)
-            allocations_qry.filter_by(port_id=id).delete()
+            for allocation in port.fixed_ips:
+                self._release_ip(context, allocation.subnet_id,
+                                 allocation.address)
+                context.session.delete(allocation)
 
             context.session.delete(port)
 
     def get_port(self, context, id, fields=None, verbose=None):
-        port = self._get_port(context, id, verbose=verbose)
+        port = self._get_port(context, id, verbose=verbose, fields=fields)
         return self._make_port_dict(port, fields)
 
-    def get_ports(self, context, filters=None, fields=None, verbose=None):
+    def get_ports(self, context, filters=None, fields=None, verbose=None,
+                  limit=None, marker=None):
         return self._get_collection(context, models_v2.Port,
                                     self._make_port_dict,
                                     filters=filters, fields=fields,
-                                    verbose=verbose)
+                                    verbose=verbose, limit=limit,
+                                    marker=marker, joins=('fixed_ips',))
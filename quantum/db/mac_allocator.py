@@ -0,0 +1,117 @@
+# Copyright (c) 2012 OpenStack, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or
+# implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+
+from sqlalchemy import exc as sql_exc
+
+from quantum.common import exceptions as q_exc
+from quantum.db import api as db
+from quantum.db import model_base
+from quantum.db import models_v2
+
+
+LOG = logging.getLogger(__name__)
+
+# NOTE(jkoelker) Same locally administered prefix as utils.generate_mac
+BASE_MAC = '02:16:3e:00:00:00'
+BLOCK_SIZE = 256
+
+
+class MacAllocator(object):
+    """Hands out MAC addresses from blocks reserved in the database
+
+    Each server process reserves a block of BLOCK_SIZE addresses at a
+    time by bumping a counter row, and then serves allocations from
+    memory until the block runs out. Blocks never overlap, so the
+    addresses are unique without a database round trip per port and
+    without retrying on conflicts.
+    """
+
+    def __init__(self, base_mac=BASE_MAC, block_size=BLOCK_SIZE):
+        self.base_mac = base_mac
+        self.block_size = block_size
+        self._base = int(base_mac.replace(':', ''), 16)
+        self._prefix_len = self._prefix_length(base_mac)
+        self._free = []
+        self._lock = threading.Lock()
+
+    def _prefix_length(self, base_mac):
+        """Number of leading bits of base_mac that are fixed"""
+        octets = base_mac.split(':')
+        suffix = 0
+        for octet in reversed(octets):
+            if octet != '00':
+                break
+            suffix += 8
+        return len(octets) * 8 - suffix
+
+    def _format(self, value):
+        mac = '%012x' % value
+        return ':'.join(mac[i:i + 2] for i in xrange(0, 12, 2))
+
+    def _reserve_block(self):
+        """Reserves the next block of addresses
+
+        The reservation is committed in its own session so that a
+        rolled back port create can never hand the block to another
+        process while this one still holds it in memory.
+        """
+        session = db.get_session()
+        with session.begin():
+            query = session.query(models_v2.MacAddressBlock)
+            query = query.filter_by(base_mac=self.base_mac)
+            counter = query.with_lockmode('update').first()
+            if not counter:
+                counter = models_v2.MacAddressBlock(
+                    id=model_base.str_uuid(), base_mac=self.base_mac,
+                    next_block=0)
+                session.add(counter)
+            block = counter.next_block
+            counter.next_block = block + 1
+
+        start = block * self.block_size
+        if start + self.block_size > 2 ** (48 - self._prefix_len):
+            return False
+
+        LOG.debug(_("Reserved MAC address block %s") % block)
+        self._free.extend(reversed(xrange(self._base + start,
+                                          self._base + start +
+                                          self.block_size)))
+        return True
+
+    def owns(self, mac):
+        """Whether mac lies in the range addresses are allocated from"""
+        try:
+            value = int(mac.replace(':', ''), 16)
+        except ValueError:
+            return False
+        shift = 48 - self._prefix_len
+        return value >> shift == self._base >> shift
+
+    def allocate(self, count=1, net_id=None):
+        """Returns count unique MAC addresses"""
+        with self._lock:
+            while len(self._free) < count:
+                try:
+                    reserved = self._reserve_block()
+                except sql_exc.IntegrityError:
+                    # NOTE(jkoelker) Another process created the counter
+                    #                row first, it exists now
+                    reserved = self._reserve_block()
+                if not reserved:
+                    raise q_exc.MacAddressGenerationFailure(net_id=net_id)
+            return [self._format(self._free.pop()) for i in xrange(count)]
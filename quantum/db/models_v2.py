@@ -30,12 +30,44 @@ class IPAllocation(model_base.BASEV2):
        subnet
     """
     port_id = sa.Column(sa.String(36), sa.ForeignKey('ports.id'))
-    address = sa.Column(sa.String(16), nullable=False, primary_key=True)
+    address = sa.Column(sa.String(64), nullable=False, primary_key=True)
     subnet_id = sa.Column(sa.String(36), sa.ForeignKey('subnets.id'),
                             primary_key=True)
     allocated = sa.Column(sa.Boolean(), nullable=False)
 
 
+class IPAvailabilityRange(model_base.BASEV2):
+    """Internal representation of a range of free IP addresses in a
+       Quantum subnet
+
+       Allocations are taken from the head of a range and released
+       addresses extend a neighbouring range, so the number of rows
+       tracks the fragmentation of the subnet and not the number of
+       allocations. The addresses are stored as fixed width hex strings
+       so that they sort numerically.
+    """
+    subnet_id = sa.Column(sa.String(36), sa.ForeignKey('subnets.id'),
+                          nullable=False)
+    first_ip = sa.Column(sa.String(32), nullable=False)
+    last_ip = sa.Column(sa.String(32), nullable=False)
+
+    __table_args__ = (sa.Index('ipavailabilityranges_first_ip',
+                               'subnet_id', 'first_ip'),
+                      sa.Index('ipavailabilityranges_last_ip',
+                               'subnet_id', 'last_ip'))
+
+
+class MacAddressBlock(model_base.BASEV2):
+    """Internal representation of the MAC address blocks handed out to
+       Quantum server processes
+
+       next_block is the index of the next unreserved block of MAC
+       addresses after base_mac.
+    """
+    base_mac = sa.Column(sa.String(32), nullable=False, unique=True)
+    next_block = sa.Column(sa.Integer, nullable=False)
+
+
 class Port(model_base.BASEV2, HasTenant):
     """Represents a port on a quantum v2 network"""
     network_id = sa.Column(sa.String(36), sa.ForeignKey("networks.id"),
@@ -46,6 +78,8 @@ class Port(model_base.BASEV2, HasTenant):
     op_status = sa.Column(sa.String(16), nullable=False)
     device_id = sa.Column(sa.String(255), nullable=False)
 
+    __table_args__ = (sa.UniqueConstraint('network_id', 'mac_address'),)
+
 
 class Subnet(model_base.BASEV2, HasTenant):
     """Represents a quantum subnet"""
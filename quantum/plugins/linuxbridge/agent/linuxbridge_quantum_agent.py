@@ -22,6 +22,7 @@
 # Quantum OpenVSwitch Plugin.
 # @author: Sumit Naiksatam, Cisco Systems, Inc.
 
+import contextlib
 import logging
 from optparse import OptionParser
 import os
@@ -31,10 +32,12 @@ import subprocess
 import sys
 import time
 
+import sqlalchemy as sql
 from sqlalchemy.ext.sqlsoup import SqlSoup
 
 from quantum.plugins.linuxbridge.common import config
 
+from quantum.agent import stats
 from quantum.agent.linux import utils
 
 logging.basicConfig()
@@ -43,35 +46,117 @@ LOG = logging.getLogger(__name__)
 BRIDGE_NAME_PREFIX = "brq"
 GATEWAY_INTERFACE_PREFIX = "gw-"
 TAP_INTERFACE_PREFIX = "tap"
-BRIDGE_FS = "/sys/devices/virtual/net/"
-BRIDGE_NAME_PLACEHOLDER = "bridge_name"
-BRIDGE_INTERFACES_FS = BRIDGE_FS + BRIDGE_NAME_PLACEHOLDER + "/brif/"
+NET_FS = "/sys/class/net/"
 PORT_OPSTATUS_UPDATESQL = "UPDATE ports SET op_status = '%s' WHERE uuid = '%s'"
-DEVICE_NAME_PLACEHOLDER = "device_name"
-BRIDGE_PORT_FS_FOR_DEVICE = BRIDGE_FS + DEVICE_NAME_PLACEHOLDER + "/brport"
 VLAN_BINDINGS = "vlan_bindings"
 PORT_BINDINGS = "port_bindings"
 OP_STATUS_UP = "UP"
 OP_STATUS_DOWN = "DOWN"
+# Phases of the deferred tap device attachments
+DETACH = 0
+ATTACH = 1
 # Default inteval values
 DEFAULT_POLLING_INTERVAL = 2
 DEFAULT_RECONNECT_INTERVAL = 2
 
 
+class DeviceInventory:
+    """
+    Snapshot of the network devices on this host and of the interfaces
+    enslaved to each bridge, read from sysfs. Reading sysfs needs neither
+    root nor a fork. The device to bridge map is built in the same pass so
+    looking up the bridge of a device does not walk every bridge.
+    """
+    def __init__(self, net_fs=NET_FS):
+        self.devices = set(os.listdir(net_fs))
+        self.bridges = {}
+        self.device_bridges = {}
+        for device in self.devices:
+            brif_path = os.path.join(net_fs, device, "brif")
+            if os.path.isdir(brif_path):
+                interfaces = os.listdir(brif_path)
+                self.bridges[device] = interfaces
+                for interface in interfaces:
+                    self.device_bridges[interface] = device
+
+    def device_exists(self, device):
+        return device in self.devices
+
+    def get_prefixed_devices(self, prefix):
+        return [device for device in self.devices if device.startswith(prefix)]
+
+    def get_prefixed_bridges(self, prefix):
+        return [bridge for bridge in self.bridges if bridge.startswith(prefix)]
+
+    def get_interfaces_on_bridge(self, bridge_name):
+        if bridge_name in self.bridges:
+            return list(self.bridges[bridge_name])
+
+    def get_bridge_for_device(self, device_name):
+        return self.device_bridges.get(device_name)
+
+
 class LinuxBridge:
     def __init__(self, br_name_prefix, physical_interface, root_helper):
         self.br_name_prefix = br_name_prefix
         self.physical_interface = physical_interface
         self.root_helper = root_helper
+        self._devices = None
+        self._attach_ops = None
+
+    def get_devices(self):
+        """Return the device inventory, reading sysfs if it is stale."""
+        if self._devices is None:
+            self._devices = DeviceInventory()
+        return self._devices
+
+    def refresh_devices(self):
+        """
+        Drop the device inventory so the next lookup sees the current
+        state. Called at the start of every cycle and after every command
+        that adds, removes or re-parents a device.
+        """
+        self._devices = None
 
     def device_exists(self, device):
         """Check if ethernet device exists."""
-        retval = utils.execute(['ip', 'link', 'show',
-                                'dev', device], root_wrapper=self.root_helper)
-        if retval:
-            return True
-        else:
-            return False
+        return self.get_devices().device_exists(device)
+
+    def _execute(self, cmd):
+        """Run a command that changes devices and invalidate the inventory."""
+        try:
+            return utils.execute(cmd, root_helper=self.root_helper)
+        finally:
+            self.refresh_devices()
+
+    def _execute_attach(self, phase, cmd):
+        """Run a brctl delif/addif, deferring it inside deferred_attach"""
+        if self._attach_ops is None:
+            return self._execute(cmd)
+        self._attach_ops[phase].append(cmd)
+
+    @contextlib.contextmanager
+    def deferred_attach(self):
+        """
+        Collect the tap device moves requested in the block and run them
+        concurrently when it exits, first every detach then every attach.
+        The bridges themselves are still created as they are needed.
+        """
+        if self._attach_ops is not None:
+            yield
+            return
+        self._attach_ops = {DETACH: [], ATTACH: []}
+        try:
+            yield
+        finally:
+            ops, self._attach_ops = self._attach_ops, None
+            try:
+                for phase in (DETACH, ATTACH):
+                    if ops[phase]:
+                        utils.execute_many(ops[phase],
+                                           root_helper=self.root_helper)
+            finally:
+                self.refresh_devices()
 
     def get_bridge_name(self, network_id):
         if not network_id:
@@ -95,69 +180,29 @@ class LinuxBridge:
         return tap_device_name
 
     def get_all_quantum_bridges(self):
-        quantum_bridge_list = []
-        bridge_list = os.listdir(BRIDGE_FS)
-        for bridge in bridge_list:
-            if bridge.startswith(BRIDGE_NAME_PREFIX):
-                quantum_bridge_list.append(bridge)
-        return quantum_bridge_list
+        return self.get_devices().get_prefixed_bridges(BRIDGE_NAME_PREFIX)
 
     def get_interfaces_on_bridge(self, bridge_name):
-        if self.device_exists(bridge_name):
-            bridge_interface_path = BRIDGE_INTERFACES_FS.replace(
-                BRIDGE_NAME_PLACEHOLDER, bridge_name)
-            return os.listdir(bridge_interface_path)
-
-    def _get_prefixed_ip_link_devices(self, prefix):
-        prefixed_devices = []
-        retval = utils.execute(['ip', 'link'], root_wrapper=self.root_helper)
-        rows = retval.split('\n')
-        for row in rows:
-            values = row.split(':')
-            if (len(values) > 2):
-                value = values[1].strip(' ')
-                if (value.startswith(prefix)):
-                    prefixed_devices.append(value)
-        return prefixed_devices
-
-    def _get_prefixed_tap_devices(self, prefix):
-        prefixed_devices = []
-        retval = utils.execute(['ip', 'tuntap'], root_wrapper=self.root_helper)
-        rows = retval.split('\n')
-        for row in rows:
-            split_row = row.split(':')
-            if split_row[0].startswith(prefix):
-                prefixed_devices.append(split_row[0])
-        return prefixed_devices
+        return self.get_devices().get_interfaces_on_bridge(bridge_name)
 
     def get_all_tap_devices(self):
-        try:
-            return self._get_prefixed_tap_devices(TAP_INTERFACE_PREFIX)
-        except RuntimeError:
-            return self._get_prefixed_ip_link_devices(TAP_INTERFACE_PREFIX)
+        return self.get_devices().get_prefixed_devices(TAP_INTERFACE_PREFIX)
 
     def get_all_gateway_devices(self):
-        try:
-            return self._get_prefixed_tap_devices(GATEWAY_INTERFACE_PREFIX)
-        except RuntimeError:
-            return self._get_prefixed_ip_link_devices(GATEWAY_INTERFACE_PREFIX)
+        return self.get_devices().get_prefixed_devices(
+            GATEWAY_INTERFACE_PREFIX)
 
     def get_bridge_for_tap_device(self, tap_device_name):
-        bridges = self.get_all_quantum_bridges()
-        for bridge in bridges:
-            interfaces = self.get_interfaces_on_bridge(bridge)
-            if tap_device_name in interfaces:
-                return bridge
-
-        return None
+        bridge = self.get_devices().get_bridge_for_device(tap_device_name)
+        if bridge and bridge.startswith(BRIDGE_NAME_PREFIX):
+            return bridge
 
     def is_device_on_bridge(self, device_name):
         if not device_name:
             return False
         else:
-            bridge_port_path = BRIDGE_PORT_FS_FOR_DEVICE.replace(
-                DEVICE_NAME_PLACEHOLDER, device_name)
-            return os.path.exists(bridge_port_path)
+            devices = self.get_devices()
+            return devices.get_bridge_for_device(device_name) is not None
 
     def ensure_vlan_bridge(self, network_id, vlan_id):
         """Create a vlan and bridge unless they already exist."""
@@ -172,13 +217,11 @@ class LinuxBridge:
         if not self.device_exists(interface):
             LOG.debug("Creating subinterface %s for VLAN %s on interface %s" %
                       (interface, vlan_id, self.physical_interface))
-            if utils.execute(['ip', 'link', 'add', 'link',
-                             self.physical_interface,
-                             'name', interface, 'type', 'vlan', 'id',
-                             vlan_id], root_wrapper=self.root_helper):
+            if self._execute(['ip', 'link', 'add', 'link',
+                              self.physical_interface, 'name', interface,
+                              'type', 'vlan', 'id', vlan_id]):
                 return
-            if utils.execute(['ip', 'link', 'set',
-                             interface, 'up'], root_wrapper=self.root_helper):
+            if self._execute(['ip', 'link', 'set', interface, 'up']):
                 return
             LOG.debug("Done creating subinterface %s" % interface)
         return interface
@@ -190,23 +233,18 @@ class LinuxBridge:
         if not self.device_exists(bridge_name):
             LOG.debug("Starting bridge %s for subinterface %s" % (bridge_name,
                                                                   interface))
-            if utils.execute(['brctl', 'addbr', bridge_name],
-                             root_wrapper=self.root_helper):
+            if self._execute(['brctl', 'addbr', bridge_name]):
                 return
-            if utils.execute(['brctl', 'setfd', bridge_name,
-                             str(0)], root_wrapper=self.root_helper):
+            if self._execute(['brctl', 'setfd', bridge_name, str(0)]):
                 return
-            if utils.execute(['brctl', 'stp', bridge_name,
-                             'off'], root_wrapper=self.root_helper):
+            if self._execute(['brctl', 'stp', bridge_name, 'off']):
                 return
-            if utils.execute(['ip', 'link', 'set', bridge_name,
-                             'up'], root_wrapper=self.root_helper):
+            if self._execute(['ip', 'link', 'set', bridge_name, 'up']):
                 return
             LOG.debug("Done starting bridge %s for subinterface %s" %
                       (bridge_name, interface))
 
-        utils.execute(['brctl', 'addif', bridge_name, interface],
-                      root_wrapper=self.root_helper)
+        self._execute(['brctl', 'addif', bridge_name, interface])
 
     def add_tap_interface(self, network_id, vlan_id, tap_device_name):
         """
@@ -228,13 +266,14 @@ class LinuxBridge:
         LOG.debug("Adding device %s to bridge %s" % (tap_device_name,
                                                      bridge_name))
         if current_bridge_name:
-            if utils.execute(['brctl', 'delif', current_bridge_name,
-                             tap_device_name], root_wrapper=self.root_helper):
+            if self._execute_attach(DETACH, ['brctl', 'delif',
+                                             current_bridge_name,
+                                             tap_device_name]):
                 return False
 
         self.ensure_vlan_bridge(network_id, vlan_id)
-        if utils.execute(['brctl', 'addif', bridge_name, tap_device_name],
-                         root_wrapper=self.root_helper):
+        if self._execute_attach(ATTACH, ['brctl', 'addif', bridge_name,
+                                         tap_device_name]):
             return False
         LOG.debug("Done adding device %s to bridge %s" % (tap_device_name,
                                                           bridge_name))
@@ -262,11 +301,9 @@ class LinuxBridge:
                     self.delete_vlan(interface)
 
             LOG.debug("Deleting bridge %s" % bridge_name)
-            if utils.execute(['ip', 'link', 'set', bridge_name, 'down'],
-                             root_wrapper=self.root_helper):
+            if self._execute(['ip', 'link', 'set', bridge_name, 'down']):
                 return
-            if utils.execute(['brctl', 'delbr', bridge_name],
-                             root_wrapper=self.root_helper):
+            if self._execute(['brctl', 'delbr', bridge_name]):
                 return
             LOG.debug("Done deleting bridge %s" % bridge_name)
 
@@ -279,8 +316,7 @@ class LinuxBridge:
                 return True
             LOG.debug("Removing device %s from bridge %s" %
                       (interface_name, bridge_name))
-            if utils.execute(['brctl', 'delif', bridge_name, interface_name],
-                             root_wrapper=self.root_helper):
+            if self._execute(['brctl', 'delif', bridge_name, interface_name]):
                 return False
             LOG.debug("Done removing device %s from bridge %s" %
                       (interface_name, bridge_name))
@@ -293,11 +329,9 @@ class LinuxBridge:
     def delete_vlan(self, interface):
         if self.device_exists(interface):
             LOG.debug("Deleting subinterface %s for vlan" % interface)
-            if utils.execute(['ip', 'link', 'set', interface, 'down'],
-                             root_wrapper=self.root_helper):
+            if self._execute(['ip', 'link', 'set', interface, 'down']):
                 return
-            if utils.execute(['ip', 'link', 'delete', interface],
-                             root_wrapper=self.root_helper):
+            if self._execute(['ip', 'link', 'delete', interface]):
                 return
             LOG.debug("Done deleting subinterface %s" % interface)
 
@@ -305,12 +339,14 @@ class LinuxBridge:
 class LinuxBridgeQuantumAgent:
 
     def __init__(self, br_name_prefix, physical_interface, polling_interval,
-                 reconnect_interval, root_helper):
+                 reconnect_interval, root_helper, cycle_stats=None):
         self.polling_interval = polling_interval
         self.reconnect_interval = reconnect_interval
         self.root_helper = root_helper
+        self.stats = cycle_stats or stats.CycleStats(polling_interval)
         self.setup_linux_bridge(br_name_prefix, physical_interface)
         self.db_connected = False
+        self.unplug_state = None
 
     def setup_linux_bridge(self, br_name_prefix, physical_interface):
         self.linux_br = LinuxBridge(br_name_prefix, physical_interface,
@@ -320,28 +356,34 @@ class LinuxBridgeQuantumAgent:
                              vlan_id):
         return self.linux_br.add_interface(network_id, vlan_id, interface_id)
 
-    def process_unplugged_interfaces(self, plugged_interfaces):
+    def process_unplugged_interfaces(self, plugged_interfaces,
+                                     tap_devices=None, gateway_devices=None):
         """
         If there are any tap devices that are not corresponding to the
         list of attached VIFs, then those are corresponding to recently
         unplugged VIFs, so we need to remove those tap devices from their
         current bridge association
         """
-        plugged_tap_device_names = []
-        plugged_gateway_device_names = []
+        if tap_devices is None:
+            tap_devices = self.linux_br.get_all_tap_devices()
+        if gateway_devices is None:
+            gateway_devices = self.linux_br.get_all_gateway_devices()
+
+        plugged_tap_device_names = set()
+        plugged_gateway_device_names = set()
         for interface in plugged_interfaces:
             if interface.startswith(GATEWAY_INTERFACE_PREFIX):
                 """
                 The name for the gateway devices is set by the linux net
                 driver, hence we use the name as is
                 """
-                plugged_gateway_device_names.append(interface)
+                plugged_gateway_device_names.add(interface)
             else:
                 tap_device_name = self.linux_br.get_tap_device_name(interface)
-                plugged_tap_device_names.append(tap_device_name)
+                plugged_tap_device_names.add(tap_device_name)
 
         LOG.debug("plugged tap device names %s" % plugged_tap_device_names)
-        for tap_device in self.linux_br.get_all_tap_devices():
+        for tap_device in tap_devices:
             if tap_device not in plugged_tap_device_names:
                 current_bridge_name = (
                     self.linux_br.get_bridge_for_tap_device(tap_device))
@@ -349,7 +391,7 @@ class LinuxBridgeQuantumAgent:
                     self.linux_br.remove_interface(current_bridge_name,
                                                    tap_device)
 
-        for gw_device in self.linux_br.get_all_gateway_devices():
+        for gw_device in gateway_devices:
             if gw_device not in plugged_gateway_device_names:
                 current_bridge_name = (
                     self.linux_br.get_bridge_for_tap_device(gw_device))
@@ -358,38 +400,73 @@ class LinuxBridgeQuantumAgent:
                                                    gw_device)
 
     def process_deleted_networks(self, vlan_bindings):
-        current_quantum_networks = vlan_bindings.keys()
-        current_quantum_bridge_names = []
-        for network in current_quantum_networks:
-            bridge_name = self.linux_br.get_bridge_name(network)
-            current_quantum_bridge_names.append(bridge_name)
+        current_quantum_bridge_names = set(
+            self.linux_br.get_bridge_name(network_id)
+            for network_id in vlan_bindings)
 
         quantum_bridges_on_this_host = self.linux_br.get_all_quantum_bridges()
         for bridge in quantum_bridges_on_this_host:
             if bridge not in current_quantum_bridge_names:
                 self.linux_br.delete_vlan_bridge(bridge)
 
+    def get_local_port_bindings(self, db, tap_devices, gateway_devices):
+        """
+        Return the ACTIVE ports whose VIF is plugged into this host, i.e.
+        whose tap or gateway device is in the given device lists
+        """
+        ports = db.ports
+        # NOTE(jkoelker) Tap devices are named after the first 11
+        #                characters of the interface id, gateway devices
+        #                after the whole id.
+        tap_prefix_len = len(TAP_INTERFACE_PREFIX)
+        clauses = [ports.interface_id.startswith(tap[tap_prefix_len:])
+                   for tap in tap_devices]
+        if gateway_devices:
+            clauses.append(ports.interface_id.in_(list(gateway_devices)))
+        if not clauses:
+            return []
+
+        local_ports = []
+        query = ports.filter(ports.state == 'ACTIVE').filter(sql.or_(*clauses))
+        for port in query.all():
+            interface_id = port.interface_id
+            if (interface_id in gateway_devices or
+                self.linux_br.get_tap_device_name(interface_id) in
+                    tap_devices):
+                local_ports.append(port)
+        return local_ports
+
+    def get_local_vlan_bindings(self, db, network_ids):
+        """
+        Return the vlan bindings for the given networks and for every
+        quantum bridge present on this host
+        """
+        vlan_bindings = db.vlan_bindings
+        prefix_len = len(self.linux_br.br_name_prefix)
+        clauses = [vlan_bindings.network_id.startswith(bridge[prefix_len:])
+                   for bridge in self.linux_br.get_all_quantum_bridges()]
+        if network_ids:
+            clauses.append(vlan_bindings.network_id.in_(network_ids))
+        if not clauses:
+            return []
+        return vlan_bindings.filter(sql.or_(*clauses)).all()
+
     def manage_networks_on_host(self, db,
                                 old_vlan_bindings,
                                 old_port_bindings):
-        vlan_bindings = {}
-        try:
-            vlan_binds = db.vlan_bindings.all()
-        except Exception as e:
-            LOG.info("Unable to get vlan bindings! Exception: %s" % e)
-            self.db_connected = False
-            return {VLAN_BINDINGS: {},
-                    PORT_BINDINGS: []}
-
-        vlans_string = ""
-        for bind in vlan_binds:
-            entry = {'network_id': bind.network_id, 'vlan_id': bind.vlan_id}
-            vlan_bindings[bind.network_id] = entry
-            vlans_string = "%s %s" % (vlans_string, entry)
+        # NOTE(jkoelker) Only look up the bindings for VIFs that are
+        #                plugged into this host so the work done each cycle
+        #                scales with the number of local VMs.
+        with self.stats.phase('inspect'):
+            self.linux_br.refresh_devices()
+            tap_devices = set(self.linux_br.get_all_tap_devices())
+            gateway_devices = set(self.linux_br.get_all_gateway_devices())
 
         port_bindings = []
         try:
-            port_binds = db.ports.all()
+            with self.stats.phase('db'):
+                port_binds = self.get_local_port_bindings(db, tap_devices,
+                                                          gateway_devices)
         except Exception as e:
             LOG.info("Unable to get port bindings! Exception: %s" % e)
             self.db_connected = False
@@ -402,39 +479,76 @@ class LinuxBridgeQuantumAgent:
             entry = {'network_id': bind.network_id, 'state': bind.state,
                      'op_status': bind.op_status, 'uuid': bind.uuid,
                      'interface_id': bind.interface_id}
-            if bind.state == 'ACTIVE':
-                port_bindings.append(entry)
+            port_bindings.append(entry)
+
+        vlan_bindings = {}
+        try:
+            network_ids = list(set(pb['network_id'] for pb in port_bindings))
+            with self.stats.phase('db'):
+                vlan_binds = self.get_local_vlan_bindings(db, network_ids)
+        except Exception as e:
+            LOG.info("Unable to get vlan bindings! Exception: %s" % e)
+            self.db_connected = False
+            return {VLAN_BINDINGS: {},
+                    PORT_BINDINGS: []}
+
+        vlans_string = ""
+        for bind in vlan_binds:
+            entry = {'network_id': bind.network_id, 'vlan_id': bind.vlan_id}
+            vlan_bindings[bind.network_id] = entry
+            vlans_string = "%s %s" % (vlans_string, entry)
 
         plugged_interfaces = []
         ports_string = ""
-        for pb in port_bindings:
-            ports_string = "%s %s" % (ports_string, pb)
-            if pb['interface_id']:
-                vlan_id = str(vlan_bindings[pb['network_id']]['vlan_id'])
-                if self.process_port_binding(pb['uuid'],
-                                             pb['network_id'],
-                                             pb['interface_id'],
-                                             vlan_id):
-                    all_bindings[pb['uuid']].op_status = OP_STATUS_UP
-                plugged_interfaces.append(pb['interface_id'])
+        # NOTE(jkoelker) The tap devices of different ports are independent,
+        #                so they are moved to their bridges concurrently.
+        with contextlib.nested(self.stats.phase('wire'),
+                               self.linux_br.deferred_attach()):
+            for pb in port_bindings:
+                ports_string = "%s %s" % (ports_string, pb)
+                if pb['interface_id']:
+                    vlan_id = str(vlan_bindings[pb['network_id']]['vlan_id'])
+                    if self.process_port_binding(pb['uuid'],
+                                                 pb['network_id'],
+                                                 pb['interface_id'],
+                                                 vlan_id):
+                        all_bindings[pb['uuid']].op_status = OP_STATUS_UP
+                        self.stats.count('changed')
+                    plugged_interfaces.append(pb['interface_id'])
 
         if old_port_bindings != port_bindings:
             LOG.debug("Port-bindings: %s" % ports_string)
 
-        self.process_unplugged_interfaces(plugged_interfaces)
+        # NOTE(jkoelker) Nothing can have been unplugged if neither the
+        #                attached VIFs nor the local devices changed since
+        #                the last sweep.
+        unplug_state = (frozenset(plugged_interfaces),
+                        frozenset(tap_devices), frozenset(gateway_devices))
+        old_plugged = self.unplug_state and self.unplug_state[0] or frozenset()
+        self.stats.count('added', len(unplug_state[0] - old_plugged))
+        self.stats.count('removed', len(old_plugged - unplug_state[0]))
+        if unplug_state != self.unplug_state:
+            with self.stats.phase('wire'):
+                self.process_unplugged_interfaces(plugged_interfaces,
+                                                  tap_devices,
+                                                  gateway_devices)
+            self.unplug_state = unplug_state
 
         if old_vlan_bindings != vlan_bindings:
             LOG.debug("VLAN-bindings: %s" % vlans_string)
 
-        self.process_deleted_networks(vlan_bindings)
+        with self.stats.phase('wire'):
+            self.process_deleted_networks(vlan_bindings)
 
         try:
-            db.commit()
+            with self.stats.phase('db'):
+                db.commit()
         except Exception as e:
             LOG.info("Unable to update database! Exception: %s" % e)
             db.rollback()
             vlan_bindings = {}
             port_bindings = []
+            self.unplug_state = None
 
         return {VLAN_BINDINGS: vlan_bindings,
                 PORT_BINDINGS: port_bindings}
@@ -451,11 +565,13 @@ class LinuxBridgeQuantumAgent:
                 self.db_connected = True
                 LOG.info("Connecting to database \"%s\" on %s" %
                          (db.engine.url.database, db.engine.url.host))
+            self.stats.start()
             bindings = self.manage_networks_on_host(db,
                                                     old_vlan_bindings,
                                                     old_port_bindings)
             old_vlan_bindings = bindings[VLAN_BINDINGS]
             old_port_bindings = bindings[PORT_BINDINGS]
+            self.stats.finish()
             time.sleep(self.polling_interval)
 
 
@@ -483,13 +599,17 @@ def main():
     polling_interval = conf.AGENT.polling_interval
     reconnect_interval = conf.DATABASE.reconnect_interval
     root_helper = conf.AGENT.root_helper
+    cycle_stats = stats.create_stats('linuxbridge', polling_interval,
+                                     conf.AGENT.stats_interval,
+                                     conf.AGENT.statsd_host,
+                                     conf.AGENT.statsd_port)
     'Establish database connection and load models'
     db_connection_url = conf.DATABASE.sql_connection
     LOG.info("Connecting to %s" % (db_connection_url))
 
     plugin = LinuxBridgeQuantumAgent(br_name_prefix, physical_interface,
                                      polling_interval, reconnect_interval,
-                                     root_helper)
+                                     root_helper, cycle_stats)
     LOG.info("Agent initialized successfully, now running... ")
     plugin.daemon_loop(db_connection_url)
 
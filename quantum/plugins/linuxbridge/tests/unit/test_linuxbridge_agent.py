@@ -0,0 +1,237 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+#
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+import sqlalchemy as sql
+from sqlalchemy.ext.sqlsoup import SqlSoup
+
+from quantum.agent.linux import utils
+from quantum.plugins.linuxbridge.agent import (
+    linuxbridge_quantum_agent as linux_agent,
+    )
+
+
+LOCAL_NET = 'aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa'
+REMOTE_NET = 'bbbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbb'
+STALE_NET = 'cccccccc-cccc-cccc-cccc-cccccccccccc'
+LOCAL_VIF = '11111111-1111-1111-1111-111111111111'
+REMOTE_VIF = '22222222-2222-2222-2222-222222222222'
+DOWN_VIF = '33333333-3333-3333-3333-333333333333'
+GW_DEVICE = 'gw-aaaaaaaa-aa'
+
+
+class LinuxBridgeAgentTest(unittest.TestCase):
+
+    def setUp(self):
+        engine = sql.create_engine('sqlite://')
+        metadata = sql.MetaData()
+        sql.Table('ports', metadata,
+                  sql.Column('uuid', sql.String(255), primary_key=True),
+                  sql.Column('network_id', sql.String(255)),
+                  sql.Column('interface_id', sql.String(255)),
+                  sql.Column('state', sql.String(8)),
+                  sql.Column('op_status', sql.String(16)))
+        sql.Table('vlan_bindings', metadata,
+                  sql.Column('vlan_id', sql.Integer, primary_key=True),
+                  sql.Column('network_id', sql.String(255)))
+        metadata.create_all(engine)
+        self.db = SqlSoup(engine)
+
+        self.db.vlan_bindings.insert(vlan_id=10, network_id=LOCAL_NET)
+        self.db.vlan_bindings.insert(vlan_id=20, network_id=REMOTE_NET)
+        self.db.vlan_bindings.insert(vlan_id=30, network_id=STALE_NET)
+        for uuid, net, iface, state in (('p1', LOCAL_NET, LOCAL_VIF, 'ACTIVE'),
+                                        ('p2', REMOTE_NET, REMOTE_VIF,
+                                         'ACTIVE'),
+                                        ('p3', LOCAL_NET, DOWN_VIF, 'DOWN'),
+                                        ('p4', LOCAL_NET, GW_DEVICE,
+                                         'ACTIVE')):
+            self.db.ports.insert(uuid=uuid, network_id=net,
+                                 interface_id=iface, state=state,
+                                 op_status='DOWN')
+        self.db.commit()
+
+        self.agent = linux_agent.LinuxBridgeQuantumAgent(
+            linux_agent.BRIDGE_NAME_PREFIX, 'eth1', 2, 2, 'sudo')
+        self.linux_br = mock.Mock()
+        self.linux_br.deferred_attach.return_value = mock.MagicMock()
+        self.linux_br.br_name_prefix = linux_agent.BRIDGE_NAME_PREFIX
+        self.linux_br.get_tap_device_name.side_effect = (
+            lambda iface: linux_agent.TAP_INTERFACE_PREFIX + iface[0:11])
+        self.linux_br.get_all_tap_devices.return_value = [
+            'tap' + LOCAL_VIF[0:11], 'tap' + DOWN_VIF[0:11]]
+        self.linux_br.get_all_gateway_devices.return_value = [GW_DEVICE]
+        self.linux_br.get_all_quantum_bridges.return_value = [
+            'brq' + STALE_NET[0:11]]
+        self.agent.linux_br = self.linux_br
+
+    def tearDown(self):
+        self.db.rollback()
+
+    def test_get_local_port_bindings(self):
+        ports = self.agent.get_local_port_bindings(
+            self.db, set(self.linux_br.get_all_tap_devices()),
+            set([GW_DEVICE]))
+        self.assertEqual(sorted(p.uuid for p in ports), ['p1', 'p4'])
+
+    def test_get_local_port_bindings_no_devices(self):
+        self.assertEqual(
+            self.agent.get_local_port_bindings(self.db, set(), set()), [])
+
+    def test_manage_networks_only_binds_local_ports(self):
+        self.agent.process_port_binding = mock.Mock(return_value=True)
+        bindings = self.agent.manage_networks_on_host(self.db, {}, [])
+
+        bound = sorted(call[0][2] for call in
+                       self.agent.process_port_binding.call_args_list)
+        self.assertEqual(bound, sorted([LOCAL_VIF, GW_DEVICE]))
+        self.assertEqual(sorted(bindings[linux_agent.VLAN_BINDINGS]),
+                         [LOCAL_NET, STALE_NET])
+        self.assertEqual(self.db.ports.get('p1').op_status,
+                         linux_agent.OP_STATUS_UP)
+        self.assertEqual(self.db.ports.get('p2').op_status, 'DOWN')
+        self.assertEqual(self.agent.stats.counters,
+                         {'added': 2, 'removed': 0, 'changed': 2})
+        self.assertEqual(sorted(self.agent.stats.timers),
+                         ['db', 'inspect', 'wire'])
+
+    def test_unplug_sweep_skipped_when_unchanged(self):
+        self.agent.process_port_binding = mock.Mock(return_value=False)
+        self.agent.process_unplugged_interfaces = mock.Mock()
+        self.agent.manage_networks_on_host(self.db, {}, [])
+        self.agent.manage_networks_on_host(self.db, {}, [])
+        self.assertEqual(self.agent.process_unplugged_interfaces.call_count,
+                         1)
+
+        self.linux_br.get_all_tap_devices.return_value = [
+            'tap' + LOCAL_VIF[0:11]]
+        self.agent.manage_networks_on_host(self.db, {}, [])
+        self.assertEqual(self.agent.process_unplugged_interfaces.call_count,
+                         2)
+
+    def test_process_unplugged_interfaces(self):
+        local_tap = 'tap' + LOCAL_VIF[0:11]
+        stale_tap = 'tap' + DOWN_VIF[0:11]
+        self.linux_br.get_bridge_for_tap_device.return_value = 'brq1234'
+        self.agent.process_unplugged_interfaces(
+            [LOCAL_VIF], set([local_tap, stale_tap]), set([GW_DEVICE]))
+        self.linux_br.get_bridge_for_tap_device.assert_has_calls(
+            [mock.call(stale_tap), mock.call(GW_DEVICE)])
+        self.assertEqual(self.linux_br.remove_interface.call_args_list,
+                         [mock.call('brq1234', stale_tap),
+                          mock.call('brq1234', GW_DEVICE)])
+
+
+class DeviceInventoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.net_fs = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.net_fs)
+        for device in ('eth1', 'eth1.10', 'tap1111', 'tap2222', 'gw-aaaa',
+                       'virbr0', 'brq1234'):
+            os.mkdir(os.path.join(self.net_fs, device))
+        self._enslave('brq1234', 'eth1.10', 'tap1111')
+        self._enslave('virbr0', 'tap2222')
+
+        self.linux_br = linux_agent.LinuxBridge(
+            linux_agent.BRIDGE_NAME_PREFIX, 'eth1', 'sudo')
+        self.linux_br.get_devices = lambda: linux_agent.DeviceInventory(
+            self.net_fs)
+
+    def _enslave(self, bridge, *interfaces):
+        brif = os.path.join(self.net_fs, bridge, 'brif')
+        if not os.path.isdir(brif):
+            os.mkdir(brif)
+        for interface in interfaces:
+            os.mkdir(os.path.join(brif, interface))
+
+    def test_lookups(self):
+        self.assertTrue(self.linux_br.device_exists('tap1111'))
+        self.assertFalse(self.linux_br.device_exists('tap3333'))
+        self.assertEqual(sorted(self.linux_br.get_all_tap_devices()),
+                         ['tap1111', 'tap2222'])
+        self.assertEqual(self.linux_br.get_all_gateway_devices(),
+                         ['gw-aaaa'])
+        self.assertEqual(self.linux_br.get_all_quantum_bridges(),
+                         ['brq1234'])
+        self.assertEqual(
+            sorted(self.linux_br.get_interfaces_on_bridge('brq1234')),
+            ['eth1.10', 'tap1111'])
+        self.assertEqual(self.linux_br.get_interfaces_on_bridge('brq9999'),
+                         None)
+
+    def test_bridge_membership(self):
+        self.assertEqual(self.linux_br.get_bridge_for_tap_device('tap1111'),
+                         'brq1234')
+        # NOTE(jkoelker) Only quantum bridges are reported.
+        self.assertEqual(self.linux_br.get_bridge_for_tap_device('tap2222'),
+                         None)
+        self.assertTrue(self.linux_br.is_device_on_bridge('tap2222'))
+        self.assertFalse(self.linux_br.is_device_on_bridge('gw-aaaa'))
+
+    def test_device_bridge_map(self):
+        devices = linux_agent.DeviceInventory(self.net_fs)
+        self.assertEqual(devices.device_bridges,
+                         {'eth1.10': 'brq1234', 'tap1111': 'brq1234',
+                          'tap2222': 'virbr0'})
+
+    def test_lookups_do_not_fork(self):
+        with mock.patch.object(utils, 'execute') as execute:
+            self.linux_br.add_tap_interface('1234', '10', 'tap3333')
+            self.linux_br.get_all_tap_devices()
+            self.linux_br.get_bridge_for_tap_device('tap1111')
+        self.assertFalse(execute.called)
+
+    def test_inventory_refreshed_after_change(self):
+        linux_br = linux_agent.LinuxBridge(
+            linux_agent.BRIDGE_NAME_PREFIX, 'eth1', 'sudo')
+        with mock.patch.object(linux_agent, 'DeviceInventory') as inventory:
+            linux_br.device_exists('tap1111')
+            linux_br.device_exists('tap1111')
+            self.assertEqual(inventory.call_count, 1)
+            with mock.patch.object(utils, 'execute') as execute:
+                execute.return_value = ''
+                linux_br.delete_vlan('eth1.10')
+                self.assertEqual(execute.call_count, 2)
+            linux_br.device_exists('eth1.10')
+            self.assertEqual(inventory.call_count, 2)
+
+    def test_deferred_attach(self):
+        with mock.patch.object(utils, 'execute_many') as execute_many:
+            with mock.patch.object(utils, 'execute') as execute:
+                execute.return_value = ''
+                with self.linux_br.deferred_attach():
+                    self.assertTrue(self.linux_br.add_tap_interface(
+                        '5678', '20', 'tap1111'))
+                    self.assertTrue(self.linux_br.add_tap_interface(
+                        '5678', '20', 'tap2222'))
+                    self.assertFalse(execute_many.called)
+        self.assertEqual(execute_many.call_args_list, [
+            mock.call([['brctl', 'delif', 'brq1234', 'tap1111']],
+                      root_helper='sudo'),
+            mock.call([['brctl', 'addif', 'brq5678', 'tap1111'],
+                       ['brctl', 'addif', 'brq5678', 'tap2222']],
+                      root_helper='sudo')])
+        # NOTE(jkoelker) Only the vlan and bridge are created right away.
+        self.assertFalse([c for c in execute.call_args_list
+                          if c[0][0][1] in ('delif', 'addif') and
+                          c[0][0][3].startswith('tap')])
@@ -101,9 +101,21 @@ def parse_config(config):
     except ConfigParser.NoOptionError, e:
         concurrent_connections = str(DEFAULT_CONCURRENT_CONNECTIONS)
 
+    try:
+        tenant_cache_size = config.get('NVP', 'tenant_cache_size')
+    except ConfigParser.NoOptionError, e:
+        tenant_cache_size = str(nvplib.DEFAULT_TENANT_CACHE_SIZE)
+
+    try:
+        tenant_cache_ttl = config.get('NVP', 'tenant_cache_ttl')
+    except ConfigParser.NoOptionError, e:
+        tenant_cache_ttl = str(nvplib.DEFAULT_TENANT_CACHE_TTL)
+
     plugin_config = {
         'failover_time': failover_time,
         'concurrent_connections': concurrent_connections,
+        'tenant_cache_size': tenant_cache_size,
+        'tenant_cache_ttl': tenant_cache_ttl,
         }
     LOG.info('parse_config(): plugin_config == "%s"' % plugin_config)
 
@@ -154,6 +166,7 @@ class NVPCluster(object):
         self._name = name
         self.controllers = []
         self.api_client = None
+        self.tenant_cache = None
 
     def __repr__(self):
         ss = ['{ "NVPCluster": [']
@@ -268,6 +281,10 @@ class NvpPlugin(object):
 
         c.api_client.login()
 
+        c.tenant_cache = nvplib.TenantCache(
+            size=int(self.plugin_config['tenant_cache_size']),
+            ttl=int(self.plugin_config['tenant_cache_ttl']))
+
         # For testing..
         self.api_client = self.controller.api_client
 
@@ -352,9 +369,9 @@ class NvpPlugin(object):
         :raises: exception.NetworkNotFound
         :raises: exception.QuantumException
         """
-        if not nvplib.check_tenant(self.controller, netw_id, tenant_id):
+        owner, net_name = nvplib.get_network_owner(self.controller, netw_id)
+        if owner != tenant_id:
             raise exception.NetworkNotFound(net_id=netw_id)
-        result = None
         remote_vifs = []
         switch = netw_id
         lports = nvplib.query_ports(self.controller, switch,
@@ -366,13 +383,10 @@ class NvpPlugin(object):
             if "vif_uuid" in vic:
                 remote_vifs.append(vic["vif_uuid"])
 
-        if not result:
-            result = nvplib.get_network(self.controller, switch)
-
         d = {
             "net-id": netw_id,
             "net-ifaces": remote_vifs,
-            "net-name": result["display_name"],
+            "net-name": net_name,
             "net-op-status": "UP",
             }
         LOG.debug("get_network_details() completed for tenant %s: %s" %
@@ -530,24 +544,55 @@ class NvpPlugin(object):
         if not nvplib.check_tenant(self.controller, netw_id, tenant_id):
             raise exception.NetworkNotFound(net_id=netw_id)
         port = nvplib.get_port(self.controller, netw_id, portw_id,
-          "LogicalPortAttachment")
-        state = "ACTIVE" if port["admin_status_enabled"] else "DOWN"
-        op_status = nvplib.get_port_status(self.controller, netw_id, portw_id)
+          "LogicalPortAttachment,LogicalPortStatus")
+        d = self._make_port_dict(netw_id, portw_id, port)
+        LOG.debug("Port details for tenant %s: %s" % (tenant_id, d))
+        return d
 
+    def get_ports_details(self, tenant_id, netw_id, portw_ids):
+        """
+        Retrieves the details of several ports of the specified Virtual
+        Network with a single query of the logical switch.
+
+        :returns: a list of the mapping sequences get_port_details
+                  returns, in the order of portw_ids
+        :raises: exception.PortNotFound
+        :raises: exception.NetworkNotFound
+        """
+        if not nvplib.check_tenant(self.controller, netw_id, tenant_id):
+            raise exception.NetworkNotFound(net_id=netw_id)
+        lports = nvplib.query_ports(
+            self.controller, netw_id,
+            relations="LogicalPortAttachment,LogicalPortStatus")
+        wanted = set(portw_ids)
+        ports = dict((port["uuid"], port) for port in lports
+                     if port["uuid"] in wanted)
+        result = []
+        for portw_id in portw_ids:
+            if portw_id not in ports:
+                raise exception.PortNotFound(net_id=netw_id,
+                                             port_id=portw_id)
+            result.append(self._make_port_dict(netw_id, portw_id,
+                                               ports[portw_id]))
+        LOG.debug("Ports details for tenant %s: %s" % (tenant_id, result))
+        return result
+
+    def _make_port_dict(self, netw_id, portw_id, port):
+        state = "ACTIVE" if port["admin_status_enabled"] else "DOWN"
         relation = port["_relations"]
+        link_status_up = relation["LogicalPortStatus"]["link_status_up"]
+        op_status = "UP" if link_status_up is True else "DOWN"
         attach_type = relation["LogicalPortAttachment"]["type"]
 
         vif_uuid = "None"
         if attach_type == "VifAttachment":
             vif_uuid = relation["LogicalPortAttachment"]["vif_uuid"]
 
-        d = {
+        return {
             "port-id": portw_id, "attachment": vif_uuid,
             "net-id": netw_id, "port-state": state,
             "port-op-status": op_status,
             }
-        LOG.debug("Port details for tenant %s: %s" % (tenant_id, d))
-        return d
 
     def plug_interface(self, tenant_id, netw_id, portw_id,
                        remote_interface_id):
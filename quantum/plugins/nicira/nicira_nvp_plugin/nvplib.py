@@ -15,15 +15,115 @@
 # @author: Brad Hall, Nicira Networks, Inc.
 
 import logging
+import threading
+import time
+
+from eventlet import semaphore
 
 from quantum.common import exceptions as exception
 from quantum.openstack.common import jsonutils
+from quantum.plugins.nicira.nicira_nvp_plugin.api_client import (
+    request_eventlet,
+    )
 from quantum.plugins.nicira.nicira_nvp_plugin import NvpApiClient
 
 
 LOG = logging.getLogger("nvplib")
 LOG.setLevel(logging.INFO)
 
+DEFAULT_TENANT_CACHE_SIZE = 1000
+DEFAULT_TENANT_CACHE_TTL = 60
+# Number of objects fetched by each request of a paged query
+DEFAULT_PAGE_LENGTH = 1000
+# Number of requests do_multi_request keeps in flight at once
+DEFAULT_MAX_IN_FLIGHT = 20
+
+
+class TenantCache(object):
+    """Bounded LRU cache of lswitch uuid -> (tenant id, display name).
+
+    Entries expire ttl seconds after they were fetched from the controller,
+    so ownership changes made by other quantum servers are picked up.
+    """
+    # NOTE(jkoelker) Each link is [prev, next, net_id, entry, expires], the
+    #                root link sits between the most and least recently
+    #                used ones. Python 2.6 has no OrderedDict.
+    PREV, NEXT, KEY, ENTRY, EXPIRES = range(5)
+
+    def __init__(self, size=DEFAULT_TENANT_CACHE_SIZE,
+                 ttl=DEFAULT_TENANT_CACHE_TTL, timer=time.time):
+        self.size = size
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.clear()
+
+    def __len__(self):
+        return len(self._links)
+
+    def clear(self):
+        with self._lock:
+            self._links = {}
+            self._root = []
+            self._root[:] = [self._root, self._root, None, None, None]
+
+    def _unlink(self, link):
+        link[self.PREV][self.NEXT] = link[self.NEXT]
+        link[self.NEXT][self.PREV] = link[self.PREV]
+
+    def _link(self, link):
+        last = self._root[self.PREV]
+        link[self.PREV] = last
+        link[self.NEXT] = self._root
+        last[self.NEXT] = self._root[self.PREV] = link
+
+    def get(self, net_id):
+        """Return the (tenant id, display name) of net_id or None."""
+        with self._lock:
+            link = self._links.get(net_id)
+            if link is not None and link[self.EXPIRES] <= self.timer():
+                self._unlink(link)
+                del self._links[net_id]
+                link = None
+            if link is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._unlink(link)
+            self._link(link)
+            return link[self.ENTRY]
+
+    def set(self, net_id, tenant_id, name):
+        if not self.size:
+            return
+        with self._lock:
+            link = self._links.pop(net_id, None)
+            if link is not None:
+                self._unlink(link)
+            elif len(self._links) >= self.size:
+                oldest = self._root[self.NEXT]
+                self._unlink(oldest)
+                del self._links[oldest[self.KEY]]
+            link = [None, None, net_id, (tenant_id, name),
+                    self.timer() + self.ttl]
+            self._link(link)
+            self._links[net_id] = link
+
+    def invalidate(self, net_id):
+        with self._lock:
+            link = self._links.pop(net_id, None)
+            if link is not None:
+                self._unlink(link)
+
+    def stats(self):
+        return {'size': len(self), 'hits': self.hits, 'misses': self.misses}
+
+
+def _get_tenant_cache(controller):
+    return getattr(controller, "tenant_cache", None)
+
 
 def do_single_request(*args, **kwargs):
     """Issue a request to a specified controller if specified via kwargs
@@ -33,6 +133,69 @@ def do_single_request(*args, **kwargs):
     return controller.api_client.request(*args)
 
 
+def do_multi_request(requests, **kwargs):
+    """Issue the requests, each a tuple of do_single_request arguments,
+       concurrently on the eventlet request pool, with at most
+       max_in_flight (kwargs) of them outstanding.
+
+    :returns: a list of (response, error) tuples in the order of requests,
+        error is the exception raised by a failed request and None
+        otherwise.
+    """
+    controller = kwargs["controller"]
+    max_in_flight = kwargs.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT)
+    slots = semaphore.Semaphore(max_in_flight)
+    results = [None] * len(requests)
+
+    def _request(index, args):
+        try:
+            results[index] = (do_single_request(*args,
+                                                controller=controller),
+                              None)
+        except Exception as e:
+            results[index] = (None, e)
+        finally:
+            slots.release()
+
+    threads = []
+    for index, args in enumerate(requests):
+        slots.acquire()
+        threads.append(
+            request_eventlet.NvpApiRequestEventlet.API_REQUEST_POOL.spawn(
+                _request, index, args))
+    for thread in threads:
+        thread.wait()
+    return results
+
+
+def query_pages(controller, uri, page_length=DEFAULT_PAGE_LENGTH):
+    """Issue the GET query uri one page at a time, following the page
+       cursor returned by the controller, and yield the results of each
+       page as soon as it arrives."""
+    sep = "&" if "?" in uri else "?"
+    uri += "%s_page_length=%d" % (sep, page_length)
+    cursor = None
+    while True:
+        page_uri = uri
+        if cursor:
+            page_uri += "&_page_cursor=%s" % cursor
+        resp_obj = do_single_request("GET", page_uri, controller=controller)
+        if not resp_obj:
+            return
+        page = jsonutils.loads(resp_obj)
+        yield page["results"]
+        cursor = page.get("page_cursor")
+        if not cursor:
+            return
+
+
+def query_results(controller, uri, page_length=DEFAULT_PAGE_LENGTH):
+    """Yield the results of the paged query uri one by one."""
+    for results in query_pages(controller, uri, page_length):
+        for result in results:
+            yield result
+
+
 def check_default_transport_zone(c):
     """Make sure the default transport zone specified in the config exists"""
     msg = []
@@ -52,11 +215,26 @@ def check_default_transport_zone(c):
 
 def check_tenant(controller, net_id, tenant_id):
     """Return true if the tenant "owns" this network"""
+    return get_network_owner(controller, net_id)[0] == tenant_id
+
+
+def get_network_owner(controller, net_id):
+    """Return the (tenant id, display name) of the network, from the
+       tenant cache of the controller when possible."""
+    cache = _get_tenant_cache(controller)
+    if cache is not None:
+        entry = cache.get(net_id)
+        if entry is not None:
+            return entry
     net = get_network(controller, net_id)
+    tenant_id = None
     for t in net["tags"]:
-        if t["scope"] == "os_tid" and t["tag"] == tenant_id:
-            return True
-    return False
+        if t["scope"] == "os_tid":
+            tenant_id = t["tag"]
+            break
+    if cache is not None:
+        cache.set(net_id, tenant_id, net["display_name"])
+    return tenant_id, net["display_name"]
 
 # -------------------------------------------------------------------
 # Network functions
@@ -95,6 +273,9 @@ def create_lswitch(controller, lswitch_obj):
     d = {}
     d["net-id"] = r["uuid"]
     d["net-name"] = r["display_name"]
+    cache = _get_tenant_cache(controller)
+    if cache is not None:
+        cache.invalidate(r["uuid"])
     LOG.debug("Created logical switch: %s" % d["net-id"])
     return d
 
@@ -116,6 +297,9 @@ def update_network(controller, network, **kwargs):
         raise exception.QuantumException()
 
     obj = jsonutils.loads(resp_obj)
+    cache = _get_tenant_cache(controller)
+    if cache is not None:
+        cache.invalidate(network)
     return obj
 
 
@@ -123,38 +307,33 @@ def get_all_networks(controller, tenant_id, networks):
     """Append the quantum network uuids we can find in the given controller to
        "networks"
        """
-    uri = "/ws.v1/lswitch?fields=*&tag=%s&tag_scope=os_tid" % tenant_id
+    uri = ("/ws.v1/lswitch?fields=uuid,display_name&tag=%s&tag_scope=os_tid"
+           % tenant_id)
+    seen = set(x["net-id"] for x in networks)
     try:
-        resp_obj = do_single_request("GET", uri, controller=controller)
+        for lswitch in query_results(controller, uri):
+            net_id = lswitch["uuid"]
+            if net_id not in seen:
+                seen.add(net_id)
+                networks.append({"net-id": net_id,
+                                 "net-name": lswitch["display_name"]})
     except NvpApiClient.NvpApiException as e:
         raise exception.QuantumException()
-    if not resp_obj:
-        return []
-    lswitches = jsonutils.loads(resp_obj)["results"]
-    for lswitch in lswitches:
-        net_id = lswitch["uuid"]
-        if net_id not in [x["net-id"] for x in networks]:
-            networks.append({"net-id": net_id,
-                             "net-name": lswitch["display_name"]})
     return networks
 
 
 def query_networks(controller, tenant_id, fields="*", tags=None):
+    """Yield the networks matching tags, one page at a time."""
     uri = "/ws.v1/lswitch?fields=%s" % fields
     if tags:
         for t in tags:
             uri += "&tag=%s&tag_scope=%s" % (t[0], t[1])
     try:
-        resp_obj = do_single_request("GET", uri, controller=controller)
+        for lswitch in query_results(controller, uri):
+            yield {'net-id': lswitch["uuid"],
+                   'net-name': lswitch["display_name"]}
     except NvpApiClient.NvpApiException as e:
         raise exception.QuantumException()
-    if not resp_obj:
-        return []
-    lswitches = jsonutils.loads(resp_obj)["results"]
-    nets = [{'net-id': lswitch["uuid"],
-             'net-name': lswitch["display_name"]}
-            for lswitch in lswitches]
-    return nets
 
 
 def delete_network(controller, network):
@@ -162,16 +341,21 @@ def delete_network(controller, network):
 
 
 def delete_networks(controller, networks):
-    for network in networks:
-        path = "/ws.v1/lswitch/%s" % network
-
-        try:
-            do_single_request("DELETE", path, controller=controller)
-        except NvpApiClient.ResourceNotFound as e:
-            LOG.error("Network not found, Error: %s" % str(e))
+    cache = _get_tenant_cache(controller)
+    if cache is not None:
+        for network in networks:
+            cache.invalidate(network)
+    results = do_multi_request(
+        [("DELETE", "/ws.v1/lswitch/%s" % network) for network in networks],
+        controller=controller)
+    for network, (_resp, error) in zip(networks, results):
+        if isinstance(error, NvpApiClient.ResourceNotFound):
+            LOG.error("Network not found, Error: %s" % str(error))
             raise exception.NetworkNotFound(net_id=network)
-        except NvpApiClient.NvpApiException as e:
+        elif isinstance(error, NvpApiClient.NvpApiException):
             raise exception.QuantumException()
+        elif error is not None:
+            raise error
 
 
 def create_network(tenant_id, net_name, **kwargs):
@@ -200,16 +384,26 @@ def create_network(tenant_id, net_name, **kwargs):
 #---------------------------------------------------------------------
 
 
-def get_port_stats(controller, network_id, port_id):
-    try:
-        do_single_request("GET", "/ws.v1/lswitch/%s" % (network_id),
-                          controller=controller)
-    except NvpApiClient.ResourceNotFound as e:
-        LOG.error("Network not found, Error: %s" % str(e))
+def _get_port_resource(controller, network_id, path):
+    """GET path together with the lswitch of the port, which must exist
+       first."""
+    (_net, net_error), (resp, error) = do_multi_request(
+        [("GET", "/ws.v1/lswitch/%s" % network_id), ("GET", path)],
+        controller=controller)
+    if isinstance(net_error, NvpApiClient.ResourceNotFound):
+        LOG.error("Network not found, Error: %s" % str(net_error))
         raise exception.NetworkNotFound(net_id=network_id)
+    elif net_error is not None:
+        raise net_error
+    if error is not None:
+        raise error
+    return resp
+
+
+def get_port_stats(controller, network_id, port_id):
     try:
         path = "/ws.v1/lswitch/%s/lport/%s/statistic" % (network_id, port_id)
-        resp = do_single_request("GET", path, controller=controller)
+        resp = _get_port_resource(controller, network_id, path)
         stats = jsonutils.loads(resp)
     except NvpApiClient.ResourceNotFound as e:
         LOG.error("Port not found, Error: %s" % str(e))
@@ -230,6 +424,7 @@ def check_port_state(state):
 
 
 def query_ports(controller, network, relations=None, fields="*", filters=None):
+    """Yield the ports of the network, one page at a time."""
     uri = "/ws.v1/lswitch/" + network + "/lport?"
     if relations:
         uri += "relations=%s" % relations
@@ -237,14 +432,13 @@ def query_ports(controller, network, relations=None, fields="*", filters=None):
     if filters and "attachment" in filters:
         uri += "&attachment_vif_uuid=%s" % filters["attachment"]
     try:
-        resp_obj = do_single_request("GET", uri,
-          controller=controller)
+        for port in query_results(controller, uri):
+            yield port
     except NvpApiClient.ResourceNotFound as e:
         LOG.error("Network not found, Error: %s" % str(e))
         raise exception.NetworkNotFound(net_id=network)
     except NvpApiClient.NvpApiException as e:
         raise exception.QuantumException()
-    return jsonutils.loads(resp_obj)["results"]
 
 
 def delete_port(controller, network, port):
@@ -259,15 +453,17 @@ def delete_port(controller, network, port):
 
 
 def delete_all_ports(controller, ls_uuid):
-    res = do_single_request("GET",
-      "/ws.v1/lswitch/%s/lport?fields=uuid" % ls_uuid,
-      controller=controller)
-    res = jsonutils.loads(res)
-    for r in res["results"]:
-        do_single_request(
-            "DELETE",
-            "/ws.v1/lswitch/%s/lport/%s" % (ls_uuid, r["uuid"]),
-            controller=controller)
+    # NOTE(jkoelker) Deleting ports while paging through them would move
+    #                the page cursor, only collect the uuids first.
+    uuids = [r["uuid"] for r in query_results(
+        controller, "/ws.v1/lswitch/%s/lport?fields=uuid" % ls_uuid)]
+    results = do_multi_request(
+        [("DELETE", "/ws.v1/lswitch/%s/lport/%s" % (ls_uuid, uuid))
+         for uuid in uuids],
+        controller=controller)
+    for _resp, error in results:
+        if error is not None:
+            raise error
 
 
 def get_port(controller, network, port, relations=None):
@@ -394,20 +590,10 @@ def create_port(tenant, network, port_init_state, **params):
 
 def get_port_status(controller, lswitch_id, port_id):
     """Retrieve the operational status of the port"""
-    # Make sure the network exists first
-    try:
-        do_single_request("GET", "/ws.v1/lswitch/%s" % (lswitch_id),
-                          controller=controller)
-    except NvpApiClient.ResourceNotFound as e:
-        LOG.error("Network not found, Error: %s" % str(e))
-        raise exception.NetworkNotFound(net_id=lswitch_id)
-    except NvpApiClient.NvpApiException as e:
-        raise exception.QuantumException()
     try:
-        r = do_single_request(
-            "GET",
-            "/ws.v1/lswitch/%s/lport/%s/status" % (lswitch_id, port_id),
-            controller=controller)
+        r = _get_port_resource(
+            controller, lswitch_id,
+            "/ws.v1/lswitch/%s/lport/%s/status" % (lswitch_id, port_id))
         r = jsonutils.loads(r)
     except NvpApiClient.ResourceNotFound as e:
         LOG.error("Port not found, Error: %s" % str(e))
@@ -237,5 +237,20 @@ CONCURRENT_CONNECTIONS = 5
         cluster1, plugin_config = parse_config(cp)
         self.assertTrue(plugin_config['concurrent_connections'] == '5')
 
+    def test_tenant_cache(self):
+        config = StringIO.StringIO("""
+[DEFAULT]
+[NVP]
+DEFAULT_TZ_UUID = <default uuid>
+NVP_CONTROLLER_CONNECTIONS = CONNECTION1
+CONNECTION1 = 10.0.0.1:4242:admin:admin:42:43:44:45
+TENANT_CACHE_SIZE = 5
+""")
+        cp = ConfigParser.ConfigParser()
+        cp.readfp(config)
+        cluster1, plugin_config = parse_config(cp)
+        self.assertEqual(plugin_config['tenant_cache_size'], '5')
+        self.assertEqual(plugin_config['tenant_cache_ttl'], '60')
+
 if __name__ == '__main__':
     unittest.main()
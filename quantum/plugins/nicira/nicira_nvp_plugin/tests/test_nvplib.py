@@ -0,0 +1,197 @@
+# Copyright 2012 Nicira Networks, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest
+
+import eventlet
+import mock
+
+from quantum.common import exceptions as exception
+from quantum.openstack.common import jsonutils
+from quantum.plugins.nicira.nicira_nvp_plugin import NvpApiClient
+from quantum.plugins.nicira.nicira_nvp_plugin import nvplib
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _lswitch(uuid, tenant_id, name="net"):
+    return jsonutils.dumps({"uuid": uuid, "display_name": name,
+                            "tags": [{"scope": "os_tid", "tag": tenant_id}]})
+
+
+class TenantCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.cache = nvplib.TenantCache(size=2, ttl=10, timer=self.timer)
+
+    def test_lru(self):
+        self.cache.set("net1", "t1", "one")
+        self.cache.set("net2", "t2", "two")
+        self.assertEqual(self.cache.get("net1"), ("t1", "one"))
+        self.cache.set("net3", "t3", "three")
+        self.assertEqual(self.cache.get("net2"), None)
+        self.assertEqual(self.cache.get("net1"), ("t1", "one"))
+        self.assertEqual(self.cache.get("net3"), ("t3", "three"))
+        self.assertEqual(self.cache.stats(),
+                         {"size": 2, "hits": 3, "misses": 1})
+
+    def test_ttl(self):
+        self.cache.set("net1", "t1", "one")
+        self.timer.now += 9
+        self.assertEqual(self.cache.get("net1"), ("t1", "one"))
+        self.timer.now += 1
+        self.assertEqual(self.cache.get("net1"), None)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_invalidate(self):
+        self.cache.set("net1", "t1", "one")
+        self.cache.invalidate("net1")
+        self.cache.invalidate("net2")
+        self.assertEqual(self.cache.get("net1"), None)
+
+    def test_disabled(self):
+        cache = nvplib.TenantCache(size=0)
+        cache.set("net1", "t1", "one")
+        self.assertEqual(cache.get("net1"), None)
+
+
+class CheckTenantTest(unittest.TestCase):
+
+    def setUp(self):
+        self.controller = mock.Mock()
+        self.controller.tenant_cache = nvplib.TenantCache()
+        self.request = self.controller.api_client.request
+
+    def test_check_tenant_cached(self):
+        self.request.return_value = _lswitch("net1", "t1")
+        self.assertTrue(nvplib.check_tenant(self.controller, "net1", "t1"))
+        self.assertFalse(nvplib.check_tenant(self.controller, "net1", "t2"))
+        self.assertEqual(self.request.call_count, 1)
+        self.assertEqual(
+            nvplib.get_network_owner(self.controller, "net1"), ("t1", "net"))
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_check_tenant_without_cache(self):
+        self.controller.tenant_cache = None
+        self.request.return_value = _lswitch("net1", "t1")
+        self.assertTrue(nvplib.check_tenant(self.controller, "net1", "t1"))
+        self.assertTrue(nvplib.check_tenant(self.controller, "net1", "t1"))
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_changes_invalidate(self):
+        self.request.return_value = _lswitch("net1", "t1")
+        nvplib.check_tenant(self.controller, "net1", "t1")
+        nvplib.update_network(self.controller, "net1", name="renamed")
+        self.assertEqual(self.controller.tenant_cache.get("net1"), None)
+
+        nvplib.check_tenant(self.controller, "net1", "t1")
+        nvplib.delete_network(self.controller, "net1")
+        self.assertEqual(self.controller.tenant_cache.get("net1"), None)
+
+
+class PagedQueryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.controller = mock.Mock()
+        self.controller.tenant_cache = None
+        self.request = self.controller.api_client.request
+
+    def _pages(self, *pages):
+        resps = []
+        for i, page in enumerate(pages):
+            resp = {"results": [{"uuid": uuid, "display_name": uuid}
+                                for uuid in page]}
+            if i < len(pages) - 1:
+                resp["page_cursor"] = "cursor%d" % i
+            resps.append(jsonutils.dumps(resp))
+        self.request.side_effect = resps
+
+    def test_query_ports_paged(self):
+        self._pages(["p1", "p2"], ["p3"])
+        ports = nvplib.query_ports(self.controller, "net1", fields="uuid")
+        self.assertEqual(ports.next()["uuid"], "p1")
+        self.assertEqual(self.request.call_count, 1)
+        self.assertEqual([p["uuid"] for p in ports], ["p2", "p3"])
+        uris = [c[0][1] for c in self.request.call_args_list]
+        self.assertEqual(uris, [
+            "/ws.v1/lswitch/net1/lport?&fields=uuid&_page_length=1000",
+            "/ws.v1/lswitch/net1/lport?&fields=uuid&_page_length=1000"
+            "&_page_cursor=cursor0"])
+
+    def test_get_all_networks_dedup(self):
+        self._pages(["n1", "n2"], ["n2", "n3"])
+        networks = nvplib.get_all_networks(
+            self.controller, "t1", [{"net-id": "n1", "net-name": "n1"}])
+        self.assertEqual([n["net-id"] for n in networks], ["n1", "n2", "n3"])
+
+    def test_query_networks(self):
+        self._pages(["n1"], [])
+        self.assertEqual(
+            list(nvplib.query_networks(self.controller, "t1")),
+            [{"net-id": "n1", "net-name": "n1"}])
+        self.assertEqual(self.request.call_count, 2)
+
+
+class MultiRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.controller = mock.Mock()
+        self.controller.tenant_cache = None
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.controller.api_client.request.side_effect = self._request
+
+    def _request(self, method, uri, *args):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        eventlet.sleep(0)
+        self.in_flight -= 1
+        if uri.endswith("missing"):
+            raise NvpApiClient.ResourceNotFound()
+        if uri.endswith("status"):
+            return jsonutils.dumps({"link_status_up": True})
+        return uri
+
+    def test_do_multi_request(self):
+        requests = [("GET", "/ws.v1/lswitch/%d" % i) for i in range(10)]
+        requests.append(("GET", "/ws.v1/lswitch/missing"))
+        results = nvplib.do_multi_request(requests,
+                                          controller=self.controller,
+                                          max_in_flight=3)
+        self.assertEqual([r[0] for r in results[:10]],
+                         [uri for _method, uri in requests[:10]])
+        self.assertEqual(results[10][0], None)
+        self.assertTrue(isinstance(results[10][1],
+                                   NvpApiClient.ResourceNotFound))
+        self.assertEqual(self.max_in_flight, 3)
+
+    def test_delete_networks(self):
+        nvplib.delete_networks(self.controller, ["net1", "net2"])
+        self.assertEqual(self.controller.api_client.request.call_count, 2)
+        self.assertRaises(exception.NetworkNotFound, nvplib.delete_networks,
+                          self.controller, ["net1", "missing"])
+
+    def test_get_port_status(self):
+        self.assertEqual(
+            nvplib.get_port_status(self.controller, "net1", "port1"), "UP")
+        self.assertEqual(self.max_in_flight, 2)
+        self.assertRaises(exception.NetworkNotFound, nvplib.get_port_status,
+                          self.controller, "missing", "port1")
@@ -19,13 +19,18 @@
 # @author: Dan Wendlandt, Nicira Networks, Inc.
 # @author: Dave Lapsley, Nicira Networks, Inc.
 
+import contextlib
+import hashlib
 import logging
 from optparse import OptionParser
+import socket
+import struct
 import sys
 import time
 
 from sqlalchemy.ext import sqlsoup
 
+from quantum.agent import stats
 from quantum.agent.linux import ovs_lib
 from quantum.plugins.openvswitch.common import config
 
@@ -43,16 +48,42 @@ DEAD_VLAN_TAG = "4095"
 DEFAULT_POLLING_INTERVAL = 2
 DEFAULT_RECONNECT_INTERVAL = 2
 
+TUNNEL_PORT_PREFIX = "gre-"
+
+
+def get_tunnel_port_name(remote_ip):
+    '''Return the name of the tunnel port to remote_ip.
+
+    The name is derived from the address so it is the same across agent
+    restarts: gre-<address in hex> for IPv4 peers, which fits the 15
+    character limit on interface names.
+
+    :param remote_ip: the address of the peer.'''
+    try:
+        address = struct.unpack("!I", socket.inet_aton(remote_ip))[0]
+        return "%s%08x" % (TUNNEL_PORT_PREFIX, address)
+    except socket.error:
+        return TUNNEL_PORT_PREFIX + hashlib.sha1(remote_ip).hexdigest()[:11]
+
+
+def get_binding_state(local_bindings):
+    '''Returns the (vif_id, state) pairs of the bound ports.
+
+    :param local_bindings: a dict of vif_id to Port, or None if unbound.'''
+    return frozenset((vif_id, port.state)
+                     for vif_id, port in local_bindings.iteritems()
+                     if port is not None)
+
 
 # A class to represent a VIF (i.e., a port that has 'iface-id' and 'vif-mac'
 # attributes set).
-class LocalVLANMapping:
+class LocalVLANMapping(object):
+    __slots__ = ('vlan', 'lsw_id', 'vif_ids')
+
     def __init__(self, vlan, lsw_id, vif_ids=None):
-        if vif_ids is None:
-            vif_ids = []
         self.vlan = vlan
         self.lsw_id = lsw_id
-        self.vif_ids = vif_ids
+        self.vif_ids = set(vif_ids or ())
 
     def __str__(self):
         return "lv-id = %s ls-id = %s" % (self.vlan, self.lsw_id)
@@ -63,6 +94,7 @@ class Port(object):
        so attributes are still available even if a
        row has been deleted.
     '''
+    __slots__ = ('uuid', 'network_id', 'interface_id', 'state', 'op_status')
 
     def __init__(self, p):
         self.uuid = p.uuid
@@ -88,14 +120,196 @@ class Port(object):
         return hash(self.uuid)
 
 
+class BindingCache(object):
+    '''Local copy of the plugin's ports, vlan bindings and tunnel ips.
+
+    The plugin appends an entry to the ovs_changelog table for every row it
+    touches. The first sync reads the tables in full; later syncs only
+    fetch the rows named by newer changelog entries. If the entry we last
+    saw has been pruned, we fall back to a full resync.
+
+    A changelog id is taken when the plugin's transaction inserts its
+    entry, not when it commits, so a newer entry may show up before an
+    older one. The revision only moves over contiguous ids; entries after
+    a missing id are held back until it shows up. An id still missing
+    after GAP_TIMEOUT seconds belongs to a rolled back transaction, it is
+    skipped and the tables are read again in full.
+    '''
+
+    # Maximum number of ids passed in a single IN clause.
+    FETCH_BATCH_SIZE = 500
+
+    # Seconds to wait for a missing changelog id before it is skipped.
+    GAP_TIMEOUT = 10
+
+    def __init__(self, db):
+        self.db = db
+        self.revision = None
+        self.ports = {}
+        self.bindings = {}
+        self.vlan_bindings = {}
+        self.tunnel_ips = set()
+        # Missing changelog ids, mapped to when they were first missed.
+        self.gaps = {}
+
+    def sync(self):
+        '''Bring the cache up to date with the database.'''
+        if self.revision is None:
+            return self.full_sync()
+
+        changelog = self.db.ovs_changelog
+        changes = (changelog.filter(changelog.id >= self.revision).
+                   order_by(changelog.id).all())
+        if self.revision:
+            if not changes or changes[0].id != self.revision:
+                LOG.info("Changelog revision %s no longer available, "
+                         "resyncing" % self.revision)
+                self.revision = None
+                return self.full_sync()
+            changes = changes[1:]
+
+        contiguous, expired = self._contiguous(changes)
+        if expired:
+            LOG.info("Changelog entries %s never committed, resyncing" %
+                     sorted(expired))
+            self.revision = contiguous[-1].id
+            return self.full_sync()
+
+        if contiguous:
+            self.apply_changes(contiguous)
+            self.revision = contiguous[-1].id
+
+    def full_sync(self):
+        '''Reload every table.
+
+        The revision is kept unless it is unset or has been pruned, in
+        which case the oldest changelog entry still around is used.
+        '''
+        # NOTE(jkoelker) Read the changelog before the tables so anything
+        #                committed while we are reading is replayed on the
+        #                next pass.
+        changelog = self.db.ovs_changelog
+        query = changelog
+        if self.revision:
+            query = changelog.filter(changelog.id >= self.revision)
+        changes = query.order_by(changelog.id).all()
+        if not self.revision or not changes or \
+                changes[0].id != self.revision:
+            self.gaps = {}
+            self.revision = changes[0].id if changes else 0
+        changes = changes[1:]
+
+        contiguous, _expired = self._contiguous(changes)
+        if contiguous:
+            self.revision = contiguous[-1].id
+
+        self.ports = {}
+        self.bindings = {}
+        for port in self.db.ports.all():
+            self._set_port(port.uuid, port)
+        self.vlan_bindings = dict((bind.network_id, bind.vlan_id)
+                                  for bind in self.db.vlan_bindings.all())
+        self.tunnel_ips = set(x.ip_address for x in self.db.tunnel_ips.all())
+
+    def _contiguous(self, changes):
+        '''Split off the changes that directly follow the revision.
+
+        Returns the contiguous changes and the missing ids that expired
+        on the way, which are skipped. Every other missing id is
+        remembered in self.gaps and stops the contiguous run.
+        '''
+        now = time.time()
+        expected = self.revision + 1
+        for change in changes:
+            for missing in xrange(expected, change.id):
+                self.gaps.setdefault(missing, now)
+            expected = change.id + 1
+
+        contiguous = []
+        expired = set()
+        expected = self.revision + 1
+        for change in changes:
+            for missing in xrange(expected, change.id):
+                if now - self.gaps[missing] < self.GAP_TIMEOUT:
+                    return contiguous, expired
+                del self.gaps[missing]
+                expired.add(missing)
+            self.gaps.pop(change.id, None)
+            contiguous.append(change)
+            expected = change.id + 1
+        return contiguous, expired
+
+    def apply_changes(self, changes):
+        changed = {}
+        for change in changes:
+            changed.setdefault(change.resource, set()).add(change.resource_id)
+
+        port_ids = changed.get('port', ())
+        rows = self._fetch(self.db.ports, 'uuid', port_ids)
+        for port_id in port_ids:
+            self._set_port(port_id, rows.get(port_id))
+
+        net_ids = changed.get('vlan_binding', ())
+        rows = self._fetch(self.db.vlan_bindings, 'network_id', net_ids)
+        for net_id in net_ids:
+            if net_id in rows:
+                self.vlan_bindings[net_id] = rows[net_id].vlan_id
+            else:
+                self.vlan_bindings.pop(net_id, None)
+
+        ips = changed.get('tunnel_ip', ())
+        rows = self._fetch(self.db.tunnel_ips, 'ip_address', ips)
+        for ip in ips:
+            if ip in rows:
+                self.tunnel_ips.add(ip)
+            else:
+                self.tunnel_ips.discard(ip)
+
+    def _fetch(self, table, key, ids):
+        ids = list(ids)
+        column = getattr(table, key)
+        rows = {}
+        for i in xrange(0, len(ids), self.FETCH_BATCH_SIZE):
+            batch = ids[i:i + self.FETCH_BATCH_SIZE]
+            for row in table.filter(column.in_(batch)).all():
+                rows[getattr(row, key)] = row
+        return rows
+
+    def _set_port(self, port_id, row):
+        old = self.ports.pop(port_id, None)
+        if old is not None and self.bindings.get(old.interface_id) is old:
+            del self.bindings[old.interface_id]
+        if row is None:
+            return
+        port = Port(row)
+        self.ports[port_id] = port
+        if port.interface_id:
+            self.bindings[port.interface_id] = port
+
+    def set_op_status(self, port, op_status):
+        '''Record the operational status the agent observed for a port.'''
+        port.op_status = op_status
+        self.db.ports.filter_by(uuid=port.uuid).update(
+            {'op_status': op_status}, synchronize_session=False)
+
+    def add_tunnel_ip(self, ip_address):
+        self.db.tunnel_ips.insert(ip_address=ip_address)
+        self.db.ovs_changelog.insert(resource='tunnel_ip',
+                                     resource_id=ip_address)
+        self.tunnel_ips.add(ip_address)
+
+
 class OVSQuantumAgent(object):
 
     def __init__(self, integ_br, root_helper,
-                 polling_interval, reconnect_interval):
+                 polling_interval, reconnect_interval, warm_restart=False,
+                 cycle_stats=None):
         self.root_helper = root_helper
+        self.warm_restart = warm_restart
         self.setup_integration_br(integ_br)
         self.polling_interval = polling_interval
         self.reconnect_interval = reconnect_interval
+        self.stats = cycle_stats or stats.CycleStats(polling_interval)
 
     def port_bound(self, port, vlan_id):
         self.int_br.set_db_attribute("Port", port.port_name,
@@ -108,10 +322,35 @@ class OVSQuantumAgent(object):
 
     def setup_integration_br(self, integ_br):
         self.int_br = ovs_lib.OVSBridge(integ_br, self.root_helper)
-        self.int_br.remove_all_flows()
+        if not self.warm_restart:
+            self.int_br.remove_all_flows()
         # switch all traffic using L2 learning
         self.int_br.add_flow(priority=1, actions="normal")
 
+    def recover_local_bindings(self, vif_ports, all_bindings, vlan_bindings):
+        '''Find the ports a previous run already bound.
+
+        A port is considered bound when its tag is the vlan of its
+        network, those ports are not touched again.
+
+        :param vif_ports: the ovs_lib.VifPort objects on the bridge.
+        :param all_bindings: the Port objects by interface id.
+        :param vlan_bindings: the vlan ids by network id.
+        :returns: a (local_bindings, vif_ports) tuple for the bound ports.'''
+        tags = self.int_br.get_port_tags()
+        local_bindings = {}
+        bound_vif_ports = {}
+        for port in vif_ports:
+            if port.vif_id not in all_bindings:
+                continue
+            net_id = all_bindings[port.vif_id].network_id
+            if (net_id in vlan_bindings and
+                    tags.get(port.port_name) == vlan_bindings[net_id]):
+                local_bindings[port.vif_id] = net_id
+                bound_vif_ports[port.vif_id] = port
+        LOG.info("Recovered bindings of %s ports" % len(local_bindings))
+        return local_bindings, bound_vif_ports
+
     def daemon_loop(self, db_connection_url):
         '''Main processing loop for Non-Tunneling Agent.
 
@@ -121,6 +360,7 @@ class OVSQuantumAgent(object):
         old_local_bindings = {}
         old_vif_ports = {}
         db_connected = False
+        recover = self.warm_restart
 
         while True:
             if not db_connected:
@@ -129,86 +369,99 @@ class OVSQuantumAgent(object):
                 db_connected = True
                 LOG.info("Connecting to database \"%s\" on %s" %
                          (db.engine.url.database, db.engine.url.host))
+                cache = BindingCache(db)
 
-            all_bindings = {}
+            self.stats.start()
             try:
-                ports = db.ports.all()
+                with self.stats.phase('db'):
+                    cache.sync()
             except Exception as e:
                 LOG.info("Unable to get port bindings! Exception: %s" % e)
                 db_connected = False
                 continue
 
-            for port in ports:
-                all_bindings[port.interface_id] = port
-
-            vlan_bindings = {}
-            try:
-                vlan_binds = db.vlan_bindings.all()
-            except Exception as e:
-                LOG.info("Unable to get vlan bindings! Exception: %s" % e)
-                db_connected = False
-                continue
-
-            for bind in vlan_binds:
-                vlan_bindings[bind.network_id] = bind.vlan_id
+            all_bindings = cache.bindings
+            vlan_bindings = cache.vlan_bindings
 
             new_vif_ports = {}
             new_local_bindings = {}
-            vif_ports = self.int_br.get_vif_ports()
-            for p in vif_ports:
-                new_vif_ports[p.vif_id] = p
-                if p.vif_id in all_bindings:
-                    net_id = all_bindings[p.vif_id].network_id
-                    new_local_bindings[p.vif_id] = net_id
-                else:
-                    # no binding, put him on the 'dead vlan'
-                    self.int_br.set_db_attribute("Port", p.port_name, "tag",
-                                                 DEAD_VLAN_TAG)
-                    self.int_br.add_flow(priority=2,
-                                         in_port=p.ofport,
-                                         actions="drop")
-
-                old_b = old_local_bindings.get(p.vif_id, None)
-                new_b = new_local_bindings.get(p.vif_id, None)
-
-                if old_b != new_b:
-                    if old_b is not None:
-                        LOG.info("Removing binding to net-id = %s for %s"
-                          % (old_b, str(p)))
-                        self.port_unbound(p, True)
-                        if p.vif_id in all_bindings:
-                            all_bindings[p.vif_id].op_status = OP_STATUS_DOWN
-                    if new_b is not None:
-                        # If we don't have a binding we have to stick it on
-                        # the dead vlan
+            with self.stats.phase('inspect'):
+                vif_ports = self.int_br.get_vif_ports()
+            if recover:
+                old_local_bindings, old_vif_ports = (
+                    self.recover_local_bindings(vif_ports, all_bindings,
+                                                vlan_bindings))
+                recover = False
+            # Port tags and flows are written with one ovs-vsctl and one
+            # ovs-ofctl call per kind of flow change once all ports have
+            # been wired. Tags are flushed before flows.
+            with contextlib.nested(self.stats.phase('wire'),
+                                   self.int_br.deferred_flows(),
+                                   self.int_br.vsctl_transaction()):
+                for p in vif_ports:
+                    new_vif_ports[p.vif_id] = p
+                    if p.vif_id not in old_vif_ports:
+                        self.stats.count('added')
+                    if p.vif_id in all_bindings:
                         net_id = all_bindings[p.vif_id].network_id
-                        vlan_id = vlan_bindings.get(net_id, DEAD_VLAN_TAG)
-                        self.port_bound(p, vlan_id)
-                        if p.vif_id in all_bindings:
-                            all_bindings[p.vif_id].op_status = OP_STATUS_UP
-                        LOG.info(("Adding binding to net-id = %s "
-                                  "for %s on vlan %s") %
-                                 (new_b, str(p), vlan_id))
-
-            for vif_id in old_vif_ports:
-                if vif_id not in new_vif_ports:
-                    LOG.info("Port Disappeared: %s" % vif_id)
-                    if vif_id in old_local_bindings:
-                        old_b = old_local_bindings[vif_id]
-                        self.port_unbound(old_vif_ports[vif_id], False)
-                    if vif_id in all_bindings:
-                        all_bindings[vif_id].op_status = OP_STATUS_DOWN
+                        new_local_bindings[p.vif_id] = net_id
+                    else:
+                        # no binding, put him on the 'dead vlan'
+                        self.int_br.set_db_attribute("Port", p.port_name,
+                                                     "tag", DEAD_VLAN_TAG)
+                        self.int_br.add_flow(priority=2,
+                                             in_port=p.ofport,
+                                             actions="drop")
+
+                    old_b = old_local_bindings.get(p.vif_id, None)
+                    new_b = new_local_bindings.get(p.vif_id, None)
+
+                    if old_b != new_b:
+                        self.stats.count('changed')
+                        if old_b is not None:
+                            LOG.info("Removing binding to net-id = %s for %s"
+                              % (old_b, str(p)))
+                            self.port_unbound(p, True)
+                            if p.vif_id in all_bindings:
+                                cache.set_op_status(all_bindings[p.vif_id],
+                                                    OP_STATUS_DOWN)
+                        if new_b is not None:
+                            # If we don't have a binding we have to stick it
+                            # on the dead vlan
+                            net_id = all_bindings[p.vif_id].network_id
+                            vlan_id = vlan_bindings.get(net_id,
+                                                        DEAD_VLAN_TAG)
+                            self.port_bound(p, vlan_id)
+                            if p.vif_id in all_bindings:
+                                cache.set_op_status(all_bindings[p.vif_id],
+                                                    OP_STATUS_UP)
+                            LOG.info(("Adding binding to net-id = %s "
+                                      "for %s on vlan %s") %
+                                     (new_b, str(p), vlan_id))
+
+                for vif_id in old_vif_ports:
+                    if vif_id not in new_vif_ports:
+                        LOG.info("Port Disappeared: %s" % vif_id)
+                        self.stats.count('removed')
+                        if vif_id in old_local_bindings:
+                            old_b = old_local_bindings[vif_id]
+                            self.port_unbound(old_vif_ports[vif_id], False)
+                        if vif_id in all_bindings:
+                            cache.set_op_status(all_bindings[vif_id],
+                                                OP_STATUS_DOWN)
 
             old_vif_ports = new_vif_ports
             old_local_bindings = new_local_bindings
             try:
-                db.commit()
+                with self.stats.phase('db'):
+                    db.commit()
             except Exception as e:
                 LOG.info("Unable to commit to database! Exception: %s" % e)
                 db.rollback()
                 old_local_bindings = {}
                 old_vif_ports = {}
 
+            self.stats.finish()
             time.sleep(self.polling_interval)
 
 
@@ -237,7 +490,8 @@ class OVSQuantumTunnelAgent(object):
     MAX_VLAN_TAG = 4094
 
     def __init__(self, integ_br, tun_br, local_ip, root_helper,
-                 polling_interval, reconnect_interval):
+                 polling_interval, reconnect_interval, warm_restart=False,
+                 cycle_stats=None):
         '''Constructor.
 
         :param integ_br: name of the integration bridge.
@@ -245,8 +499,13 @@ class OVSQuantumTunnelAgent(object):
         :param local_ip: local IP address of this hypervisor.
         :param root_helper: utility to use when running shell cmds.
         :param polling_interval: interval (secs) to poll DB.
-        :param reconnect_internal: retry interval (secs) on DB error.'''
+        :param reconnect_internal: retry interval (secs) on DB error.
+        :param warm_restart: keep the flows and ports left by a previous
+            run and reconcile them instead of starting from scratch.
+        :param cycle_stats: the stats.CycleStats the polling cycles are
+            recorded in.'''
         self.root_helper = root_helper
+        self.warm_restart = warm_restart
         self.available_local_vlans = set(
             xrange(OVSQuantumTunnelAgent.MIN_VLAN_TAG,
                    OVSQuantumTunnelAgent.MAX_VLAN_TAG))
@@ -255,9 +514,10 @@ class OVSQuantumTunnelAgent(object):
 
         self.polling_interval = polling_interval
         self.reconnect_interval = reconnect_interval
+        self.stats = cycle_stats or stats.CycleStats(polling_interval)
 
         self.local_ip = local_ip
-        self.tunnel_count = 0
+        self.tunnel_ports = {}
         self.setup_tunnel_br(tun_br)
 
     def provision_local_vlan(self, net_uuid, lsw_id):
@@ -303,7 +563,7 @@ class OVSQuantumTunnelAgent(object):
         if net_uuid not in self.local_vlan_map:
             self.provision_local_vlan(net_uuid, lsw_id)
         lvm = self.local_vlan_map[net_uuid]
-        lvm.vif_ids.append(port.vif_id)
+        lvm.vif_ids.add(port.vif_id)
 
         self.int_br.set_db_attribute("Port", port.port_name, "tag",
                                      str(lvm.vlan))
@@ -324,7 +584,7 @@ class OVSQuantumTunnelAgent(object):
         lvm = self.local_vlan_map[net_uuid]
 
         if port.vif_id in lvm.vif_ids:
-            lvm.vif_ids.remove(port.vif_id)
+            lvm.vif_ids.discard(port.vif_id)
         else:
             LOG.info('port_unbound: vid_id %s not in list' % port.vif_id)
 
@@ -346,40 +606,139 @@ class OVSQuantumTunnelAgent(object):
 
         :param integ_br: the name of the integration bridge.'''
         self.int_br = ovs_lib.OVSBridge(integ_br, self.root_helper)
-        self.int_br.delete_port("patch-tun")
-        self.patch_tun_ofport = self.int_br.add_patch_port("patch-tun",
-                                                           "patch-int")
-        self.int_br.remove_all_flows()
+        self.patch_tun_ofport = self.setup_patch_port(self.int_br,
+                                                      "patch-tun",
+                                                      "patch-int")
+        if not self.warm_restart:
+            self.int_br.remove_all_flows()
         # switch all traffic using L2 learning
         self.int_br.add_flow(priority=1, actions="normal")
 
     def setup_tunnel_br(self, tun_br):
         '''Setup the tunnel bridge.
 
-        Creates tunnel bridge, and links it to the integration bridge
-        using a patch port.
+        Creates tunnel bridge unless it exists, links it to the integration
+        bridge using a patch port and loads the existing tunnel ports.
 
         :param tun_br: the name of the tunnel bridge.'''
         self.tun_br = ovs_lib.OVSBridge(tun_br, self.root_helper)
-        self.tun_br.reset_bridge()
-        self.patch_int_ofport = self.tun_br.add_patch_port("patch-int",
-                                                           "patch-tun")
-        self.tun_br.remove_all_flows()
+        self.tun_br.create_bridge()
+        self.patch_int_ofport = self.setup_patch_port(self.tun_br,
+                                                      "patch-int",
+                                                      "patch-tun")
+        self.tunnel_ports = self.tun_br.get_tunnel_ports()
+        if not self.warm_restart:
+            self.tun_br.remove_all_flows()
         self.tun_br.add_flow(priority=1, actions="drop")
 
-    def manage_tunnels(self, tunnel_ips, old_tunnel_ips, db):
+    def setup_patch_port(self, br, local_name, remote_name):
+        '''(Re)create a patch port, keeping it on a warm restart.
+
+        :param br: the ovs_lib.OVSBridge to add the port to.
+        :param local_name: the name of the patch port.
+        :param remote_name: the name of its peer.
+        :returns: the ofport of the patch port.'''
+        if self.warm_restart:
+            try:
+                ofport = br.get_port_ofport(local_name)
+                if ofport and ofport != "[]":
+                    return ofport
+            except RuntimeError:
+                pass
+        br.delete_port(local_name)
+        return br.add_patch_port(local_name, remote_name)
+
+    def recover_local_vlans(self, vif_ports, all_bindings, lsw_id_bindings):
+        '''Rebuild local_vlan_map from the state left by a previous run.
+
+        The local vlan of each network is read back from the inbound
+        flows on the tunnel bridge and the ports whose tag is the local
+        vlan of their network are considered bound. Mappings for unknown
+        networks or without any bound port are reclaimed.
+
+        :param vif_ports: the ovs_lib.VifPort objects on br-int.
+        :param all_bindings: the Port objects by interface id.
+        :param lsw_id_bindings: the logical switch ids by network id.
+        :returns: a (local_bindings, vif_ports) tuple for the bound ports.'''
+        lsw_nets = dict((lsw_id, net_uuid)
+                        for net_uuid, lsw_id in lsw_id_bindings.iteritems())
+        stale = []
+        for match, actions in self.tun_br.dump_flows():
+            if (match.get("tun_id") is None or
+                    not actions.startswith("mod_vlan_vid:")):
+                continue
+            lsw_id = int(match["tun_id"], 0)
+            lvid = int(actions.split(",")[0].split(":")[1])
+            net_uuid = lsw_nets.get(lsw_id)
+            if (net_uuid is None or net_uuid in self.local_vlan_map or
+                    lvid not in self.available_local_vlans):
+                stale.append(LocalVLANMapping(lvid, lsw_id))
+                continue
+            self.available_local_vlans.remove(lvid)
+            self.local_vlan_map[net_uuid] = LocalVLANMapping(lvid, lsw_id)
+
+        tags = self.int_br.get_port_tags()
+        local_bindings = {}
+        bound_vif_ports = {}
+        for port in vif_ports:
+            binding = all_bindings.get(port.vif_id)
+            if binding is None:
+                continue
+            lvm = self.local_vlan_map.get(binding.network_id)
+            if lvm is not None and tags.get(port.port_name) == lvm.vlan:
+                lvm.vif_ids.add(port.vif_id)
+                local_bindings[port.vif_id] = binding
+                bound_vif_ports[port.vif_id] = port
+
+        for net_uuid, lvm in self.local_vlan_map.items():
+            if not lvm.vif_ids:
+                self.reclaim_local_vlan(net_uuid, lvm)
+        for lvm in stale:
+            LOG.info("removing flows of stale ls-id = %s" % lvm.lsw_id)
+            self.tun_br.delete_flows(tun_id=lvm.lsw_id)
+            if lvm.vlan in self.available_local_vlans:
+                self.tun_br.delete_flows(dl_vlan=lvm.vlan)
+
+        LOG.info("Recovered %s local vlans and the bindings of %s ports" %
+                 (len(self.local_vlan_map), len(local_bindings)))
+        return local_bindings, bound_vif_ports
+
+    def manage_tunnels(self, tunnel_ips, old_tunnel_ips, cache):
+        '''Reconcile the tunnel ports with the tunnel ips.
+
+        Adds a tunnel to every new peer and removes the tunnels to peers
+        that are gone, with one ovs-vsctl call for all of them. Nothing is
+        done when the peers did not change since the last pass.
+
+        :param tunnel_ips: the addresses of every hypervisor.
+        :param old_tunnel_ips: tunnel_ips as of the last pass, None on the
+            first pass so the tunnels found in OVS are always reconciled.
+        :param cache: the BindingCache used to register the local ip.'''
         if self.local_ip in tunnel_ips:
             tunnel_ips.remove(self.local_ip)
         else:
-            db.tunnel_ips.insert(ip_address=self.local_ip)
+            cache.add_tunnel_ip(self.local_ip)
+
+        if tunnel_ips == old_tunnel_ips:
+            return
+
+        current_tunnel_ips = set(self.tunnel_ports)
+        new_tunnel_ips = tunnel_ips - current_tunnel_ips
+        stale_tunnel_ips = current_tunnel_ips - tunnel_ips
+        if not new_tunnel_ips and not stale_tunnel_ips:
+            return
 
-        new_tunnel_ips = tunnel_ips - old_tunnel_ips
-        if new_tunnel_ips:
-            LOG.info("adding tunnels to: %s" % new_tunnel_ips)
-            for ip in new_tunnel_ips:
-                tun_name = "gre-" + str(self.tunnel_count)
-                self.tun_br.add_tunnel_port(tun_name, ip)
-                self.tunnel_count += 1
+        with self.tun_br.vsctl_transaction():
+            if new_tunnel_ips:
+                LOG.info("adding tunnels to: %s" % new_tunnel_ips)
+                for ip in new_tunnel_ips:
+                    self.tun_br.queue_tunnel_port(get_tunnel_port_name(ip),
+                                                  ip)
+            if stale_tunnel_ips:
+                LOG.info("removing tunnels to: %s" % stale_tunnel_ips)
+                for ip in stale_tunnel_ips:
+                    self.tun_br.delete_port(self.tunnel_ports[ip][0])
+        self.tunnel_ports = self.tun_br.get_tunnel_ports()
 
     def rollback_until_success(self, db):
         while True:
@@ -396,26 +755,38 @@ class OVSQuantumTunnelAgent(object):
         :param options: database information - in the event need to reconnect
         '''
         old_local_bindings = {}
+        old_binding_state = frozenset()
         old_vif_ports = {}
-        old_tunnel_ips = set()
+        old_tunnel_ips = None
+        recover = self.warm_restart
 
         db = sqlsoup.SqlSoup(db_connection_url)
         LOG.info("Connecting to database \"%s\" on %s" %
                  (db.engine.url.database, db.engine.url.host))
+        cache = BindingCache(db)
 
         while True:
+            self.stats.start()
             try:
-                all_bindings = dict((p.interface_id, Port(p))
-                                    for p in db.ports.all())
+                with self.stats.phase('db'):
+                    cache.sync()
+                all_bindings = cache.bindings
                 all_bindings_vif_port_ids = set(all_bindings)
-                lsw_id_bindings = dict((bind.network_id, bind.vlan_id)
-                                       for bind in db.vlan_bindings.all())
+                lsw_id_bindings = cache.vlan_bindings
 
-                tunnel_ips = set(x.ip_address for x in db.tunnel_ips.all())
-                self.manage_tunnels(tunnel_ips, old_tunnel_ips, db)
+                tunnel_ips = set(cache.tunnel_ips)
+                with self.stats.phase('tunnels'):
+                    self.manage_tunnels(tunnel_ips, old_tunnel_ips, cache)
 
                 # Get bindings from OVS bridge.
-                vif_ports = self.int_br.get_vif_ports()
+                with self.stats.phase('inspect'):
+                    vif_ports = self.int_br.get_vif_ports()
+                if recover:
+                    old_local_bindings, old_vif_ports = (
+                        self.recover_local_vlans(vif_ports, all_bindings,
+                                                 lsw_id_bindings))
+                    old_binding_state = get_binding_state(old_local_bindings)
+                    recover = False
                 new_vif_ports = dict([(p.vif_id, p) for p in vif_ports])
                 new_vif_ports_ids = set(new_vif_ports.keys())
 
@@ -429,11 +800,16 @@ class OVSQuantumTunnelAgent(object):
                                           intersection(new_vif_ports_ids))
                 new_local_bindings = dict([(p, all_bindings.get(p))
                                            for p in new_vif_ports_ids])
-                new_bindings = set(
+                # NOTE(jkoelker) Bindings are diffed as (vif_id, state)
+                #                tuples so unchanged ports cost a set
+                #                lookup instead of a Port comparison.
+                new_binding_state = get_binding_state(new_local_bindings)
+                changed_ids = new_vif_ports_ids.intersection(
+                    vif_id for vif_id, _state in
+                    new_binding_state.symmetric_difference(old_binding_state))
+                changed_bindings = set(
                     (p, old_local_bindings.get(p),
-                     new_local_bindings.get(p)) for p in new_vif_ports_ids)
-                changed_bindings = set([b for b in new_bindings
-                                        if b[2] != b[1]])
+                     new_local_bindings.get(p)) for p in changed_ids)
 
                 LOG.debug('all_bindings: %s', all_bindings)
                 LOG.debug('lsw_id_bindings: %s', lsw_id_bindings)
@@ -443,63 +819,82 @@ class OVSQuantumTunnelAgent(object):
                 LOG.debug('new_local_bindings_ids: %s',
                           new_local_bindings_ids)
                 LOG.debug('new_local_bindings: %s', new_local_bindings)
-                LOG.debug('new_bindings: %s', new_bindings)
                 LOG.debug('changed_bindings: %s', changed_bindings)
-
-                # Take action.
-                for p in dead_vif_ports:
-                    LOG.info("No quantum binding for port " + str(p)
-                             + "putting on dead vlan")
-                    self.port_dead(p)
-
-                for b in changed_bindings:
-                    port_id, old_port, new_port = b
-                    p = new_vif_ports[port_id]
-                    if old_port:
-                        old_net_uuid = old_port.network_id
-                        LOG.info("Removing binding to net-id = " +
-                                 old_net_uuid + " for " + str(p)
-                                 + " added to dead vlan")
-                        self.port_unbound(p, old_net_uuid)
-                        all_bindings[p.vif_id].op_status = OP_STATUS_DOWN
-                        if not new_port:
-                            self.port_dead(p)
-
-                    if new_port:
-                        new_net_uuid = new_port.network_id
-                        if new_net_uuid not in lsw_id_bindings:
-                            LOG.warn("No ls-id binding found for net-id '%s'" %
-                                     new_net_uuid)
-                            continue
-
-                        lsw_id = lsw_id_bindings[new_net_uuid]
-                        self.port_bound(p, new_net_uuid, lsw_id)
-                        all_bindings[p.vif_id].op_status = OP_STATUS_UP
-                        LOG.info("Port " + str(p) + " on net-id = "
-                                 + new_net_uuid + " bound to " +
-                                 str(self.local_vlan_map[new_net_uuid]))
-
-                for vif_id in disappeared_vif_ports_ids:
-                    LOG.info("Port Disappeared: " + vif_id)
-                    if vif_id in all_bindings:
-                        all_bindings[vif_id].op_status = OP_STATUS_DOWN
-                    old_port = old_local_bindings.get(vif_id)
-                    if old_port:
-                        self.port_unbound(old_vif_ports[vif_id],
-                                          old_port.network_id)
+                self.stats.count('added',
+                                 len(new_vif_ports_ids - old_vif_ports_ids))
+                self.stats.count('removed', len(disappeared_vif_ports_ids))
+                self.stats.count('changed', len(changed_bindings))
+
+                # Take action. Port tags and flows are written with one
+                # ovs-vsctl and one ovs-ofctl call per kind of flow change
+                # once all ports have been wired. Tags are flushed before
+                # flows.
+                with contextlib.nested(self.stats.phase('wire'),
+                                       self.tun_br.deferred_flows(),
+                                       self.int_br.deferred_flows(),
+                                       self.int_br.vsctl_transaction()):
+                    for p in dead_vif_ports:
+                        LOG.info("No quantum binding for port " + str(p)
+                                 + "putting on dead vlan")
+                        self.port_dead(p)
+
+                    for b in changed_bindings:
+                        port_id, old_port, new_port = b
+                        p = new_vif_ports[port_id]
+                        if old_port:
+                            old_net_uuid = old_port.network_id
+                            LOG.info("Removing binding to net-id = " +
+                                     old_net_uuid + " for " + str(p)
+                                     + " added to dead vlan")
+                            self.port_unbound(p, old_net_uuid)
+                            cache.set_op_status(all_bindings[p.vif_id],
+                                                OP_STATUS_DOWN)
+                            if not new_port:
+                                self.port_dead(p)
+
+                        if new_port:
+                            new_net_uuid = new_port.network_id
+                            if new_net_uuid not in lsw_id_bindings:
+                                LOG.warn("No ls-id binding found for "
+                                         "net-id '%s'" % new_net_uuid)
+                                continue
+
+                            lsw_id = lsw_id_bindings[new_net_uuid]
+                            self.port_bound(p, new_net_uuid, lsw_id)
+                            cache.set_op_status(all_bindings[p.vif_id],
+                                                OP_STATUS_UP)
+                            LOG.info("Port " + str(p) + " on net-id = "
+                                     + new_net_uuid + " bound to " +
+                                     str(self.local_vlan_map[new_net_uuid]))
+
+                    for vif_id in disappeared_vif_ports_ids:
+                        LOG.info("Port Disappeared: " + vif_id)
+                        if vif_id in all_bindings:
+                            cache.set_op_status(all_bindings[vif_id],
+                                                OP_STATUS_DOWN)
+                        old_port = old_local_bindings.get(vif_id)
+                        if old_port:
+                            self.port_unbound(old_vif_ports[vif_id],
+                                              old_port.network_id)
                 # commit any DB changes and expire
                 # data loaded from the database
-                db.commit()
+                with self.stats.phase('db'):
+                    db.commit()
+                self.stats.finish()
 
                 # sleep and re-initialize state for next pass
                 time.sleep(self.polling_interval)
                 old_tunnel_ips = tunnel_ips
                 old_vif_ports = new_vif_ports
                 old_local_bindings = new_local_bindings
+                old_binding_state = new_binding_state
 
             except:
                 LOG.exception("Main-loop Exception:")
                 self.rollback_until_success(db)
+                # NOTE(jkoelker) Anything we wrote was rolled back, so start
+                #                over from a full sync.
+                cache = BindingCache(db)
 
 
 def main():
@@ -529,6 +924,11 @@ def main():
     polling_interval = conf.AGENT.polling_interval
     reconnect_interval = conf.DATABASE.reconnect_interval
     root_helper = conf.AGENT.root_helper
+    warm_restart = conf.AGENT.warm_restart
+    cycle_stats = stats.create_stats('ovs', polling_interval,
+                                     conf.AGENT.stats_interval,
+                                     conf.AGENT.statsd_host,
+                                     conf.AGENT.statsd_port)
 
     if enable_tunneling:
         # Get parameters for OVSQuantumTunnelAgent
@@ -536,11 +936,13 @@ def main():
         # Mandatory parameter.
         local_ip = conf.OVS.local_ip
         plugin = OVSQuantumTunnelAgent(integ_br, tun_br, local_ip, root_helper,
-                                       polling_interval, reconnect_interval)
+                                       polling_interval, reconnect_interval,
+                                       warm_restart, cycle_stats)
     else:
         # Get parameters for OVSQuantumAgent.
         plugin = OVSQuantumAgent(integ_br, root_helper,
-                                 polling_interval, reconnect_interval)
+                                 polling_interval, reconnect_interval,
+                                 warm_restart, cycle_stats)
 
     # Start everything.
     plugin.daemon_loop(db_connection_url)
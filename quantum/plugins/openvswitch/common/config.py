@@ -32,6 +32,10 @@ ovs_opts = [
 agent_opts = [
     cfg.IntOpt('polling_interval', default=2),
     cfg.StrOpt('root_helper', default='sudo'),
+    cfg.BoolOpt('warm_restart', default=False),
+    cfg.IntOpt('stats_interval', default=60),
+    cfg.StrOpt('statsd_host', default=None),
+    cfg.IntOpt('statsd_port', default=8125),
 ]
 
 
@@ -23,6 +23,19 @@ import quantum.db.api as db
 from quantum.plugins.openvswitch import ovs_models
 
 
+# Resource names used in the changelog.
+PORT = 'port'
+VLAN_BINDING = 'vlan_binding'
+TUNNEL_IP = 'tunnel_ip'
+
+# Number of changelog entries kept around. Agents that fall further behind
+# than this see a gap and fall back to a full resync.
+CHANGELOG_RETENTION = 10000
+
+# Old changelog entries are pruned once every this many entries.
+CHANGELOG_PRUNE_INTERVAL = 100
+
+
 def get_vlans():
     session = db.get_session()
     try:
@@ -36,21 +49,47 @@ def get_vlans():
     return res
 
 
-def add_vlan_binding(vlanid, netid):
-    session = db.get_session()
-    binding = ovs_models.VlanBinding(vlanid, netid)
-    session.add(binding)
-    session.flush()
+def add_vlan_binding(vlanid, netid, session=None):
+    if not session:
+        session = db.get_session()
+    with session.begin(subtransactions=True):
+        binding = ovs_models.VlanBinding(vlanid, netid)
+        session.add(binding)
+        session.flush()
+        record_change(VLAN_BINDING, netid, session)
     return binding.vlan_id
 
 
-def remove_vlan_binding(netid):
-    session = db.get_session()
-    try:
-        binding = (session.query(ovs_models.VlanBinding).
-                   filter_by(network_id=netid).
-                   one())
-        session.delete(binding)
-    except exc.NoResultFound:
-            pass
-    session.flush()
+def remove_vlan_binding(netid, session=None):
+    if not session:
+        session = db.get_session()
+    with session.begin(subtransactions=True):
+        try:
+            binding = (session.query(ovs_models.VlanBinding).
+                       filter_by(network_id=netid).
+                       one())
+            session.delete(binding)
+        except exc.NoResultFound:
+                pass
+        session.flush()
+        record_change(VLAN_BINDING, netid, session)
+
+
+def record_change(resource, resource_id, session=None):
+    """Append an entry to the changelog read by the agents
+
+    Pass the session of the data change so that the entry commits in the
+    same transaction as the change it describes.
+    """
+    if not session:
+        session = db.get_session()
+    with session.begin(subtransactions=True):
+        change = ovs_models.ChangeLog(resource, resource_id)
+        session.add(change)
+        session.flush()
+        if change.id % CHANGELOG_PRUNE_INTERVAL == 0:
+            (session.query(ovs_models.ChangeLog).
+             filter(ovs_models.ChangeLog.id <=
+                    change.id - CHANGELOG_RETENTION).
+             delete(synchronize_session=False))
+    return change.id
@@ -49,3 +49,24 @@ class TunnelIP(BASE):
 
     def __repr__(self):
         return "<TunnelIP(%s)>" % (self.ip_address)
+
+
+class ChangeLog(BASE):
+    """Records a change to a port, vlan binding or tunnel ip
+
+    Agents remember the id of the last entry they have seen and only
+    re-read the rows named by newer entries.
+    """
+    __tablename__ = 'ovs_changelog'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    resource = Column(String(32), nullable=False)
+    resource_id = Column(String(255), nullable=False)
+
+    def __init__(self, resource, resource_id):
+        self.resource = resource
+        self.resource_id = resource_id
+
+    def __repr__(self):
+        return "<ChangeLog(%s,%s,%s)>" % (self.id, self.resource,
+                                          self.resource_id)
@@ -85,6 +85,9 @@ class VlanMap(object):
 
 class OVSQuantumPlugin(QuantumPluginBase):
 
+    supported_network_filters = db.NETWORK_FILTERS
+    supported_port_filters = db.PORT_FILTERS
+
     def __init__(self, configfile=None):
         if configfile is None:
             if os.path.exists(CONF_FILE):
@@ -114,7 +117,7 @@ class OVSQuantumPlugin(QuantumPluginBase):
 
     def get_all_networks(self, tenant_id, **kwargs):
         nets = []
-        for x in db.network_list(tenant_id):
+        for x in db.network_list(tenant_id, kwargs.get('filter_opts')):
             LOG.debug("Adding network: %s" % x.uuid)
             nets.append(self._make_net_dict(str(x.uuid), x.name,
                                             None, x.op_status))
@@ -143,11 +146,17 @@ class OVSQuantumPlugin(QuantumPluginBase):
         net = db.network_get(net_id)
 
         # Verify that no attachments are plugged into the network
+        port_ids = []
         for port in db.port_list(net_id):
             if port.interface_id:
                 raise q_exc.NetworkInUse(net_id=net_id)
-        net = db.network_destroy(net_id)
-        ovs_db.remove_vlan_binding(net_id)
+            port_ids.append(port.uuid)
+        session = db.get_session()
+        with session.begin():
+            net = db.network_destroy(net_id, session)
+            for port_id in port_ids:
+                ovs_db.record_change(ovs_db.PORT, port_id, session)
+            ovs_db.remove_vlan_binding(net_id, session)
         self.vmap.release(net_id)
         return self._make_net_dict(str(net.uuid), net.name, [], net.op_status)
 
@@ -181,20 +190,26 @@ class OVSQuantumPlugin(QuantumPluginBase):
     def get_all_ports(self, tenant_id, net_id, **kwargs):
         ids = []
         db.validate_network_ownership(tenant_id, net_id)
-        ports = db.port_list(net_id)
-        # This plugin does not perform filtering at the moment
+        ports = db.port_list(net_id, kwargs.get('filter_opts'))
         return [{'port-id': str(p.uuid)} for p in ports]
 
     def create_port(self, tenant_id, net_id, port_state=None, **kwargs):
         LOG.debug("Creating port with network_id: %s" % net_id)
         db.validate_network_ownership(tenant_id, net_id)
-        port = db.port_create(net_id, port_state,
-                              op_status=OperationalStatus.DOWN)
+        session = db.get_session()
+        with session.begin():
+            port = db.port_create(net_id, port_state,
+                                  op_status=OperationalStatus.DOWN,
+                                  session=session)
+            ovs_db.record_change(ovs_db.PORT, port.uuid, session)
         return self._make_port_dict(port)
 
     def delete_port(self, tenant_id, net_id, port_id):
         db.validate_port_ownership(tenant_id, net_id, port_id)
-        port = db.port_destroy(port_id, net_id)
+        session = db.get_session()
+        with session.begin():
+            port = db.port_destroy(port_id, net_id, session)
+            ovs_db.record_change(ovs_db.PORT, port_id, session)
         return self._make_port_dict(port)
 
     def update_port(self, tenant_id, net_id, port_id, **kwargs):
@@ -202,8 +217,10 @@ class OVSQuantumPlugin(QuantumPluginBase):
         Updates the state of a port on the specified Virtual Network.
         """
         db.validate_port_ownership(tenant_id, net_id, port_id)
-        port = db.port_get(port_id, net_id)
-        db.port_update(port_id, net_id, **kwargs)
+        session = db.get_session()
+        with session.begin():
+            port = db.port_update(port_id, net_id, session=session, **kwargs)
+            ovs_db.record_change(ovs_db.PORT, port_id, session)
         return self._make_port_dict(port)
 
     def get_port_details(self, tenant_id, net_id, port_id):
@@ -211,14 +228,26 @@ class OVSQuantumPlugin(QuantumPluginBase):
         port = db.port_get(port_id, net_id)
         return self._make_port_dict(port)
 
+    def get_ports_details(self, tenant_id, net_id, port_ids):
+        db.validate_network_ownership(tenant_id, net_id)
+        return [self._make_port_dict(port)
+                for port in db.ports_get(port_ids, net_id)]
+
     def plug_interface(self, tenant_id, net_id, port_id, remote_iface_id):
         db.validate_port_ownership(tenant_id, net_id, port_id)
-        db.port_set_attachment(port_id, net_id, remote_iface_id)
+        session = db.get_session()
+        with session.begin():
+            db.port_set_attachment(port_id, net_id, remote_iface_id, session)
+            ovs_db.record_change(ovs_db.PORT, port_id, session)
 
     def unplug_interface(self, tenant_id, net_id, port_id):
         db.validate_port_ownership(tenant_id, net_id, port_id)
-        db.port_set_attachment(port_id, net_id, "")
-        db.port_update(port_id, net_id, op_status=OperationalStatus.DOWN)
+        session = db.get_session()
+        with session.begin():
+            db.port_set_attachment(port_id, net_id, "", session)
+            db.port_update(port_id, net_id, session=session,
+                           op_status=OperationalStatus.DOWN)
+            ovs_db.record_change(ovs_db.PORT, port_id, session)
 
     def get_interface_details(self, tenant_id, net_id, port_id):
         db.validate_port_ownership(tenant_id, net_id, port_id)
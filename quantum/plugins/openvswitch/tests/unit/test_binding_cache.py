@@ -0,0 +1,227 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+import unittest
+
+from sqlalchemy import event
+from sqlalchemy.ext import sqlsoup
+
+import quantum.db.api as db
+from quantum.plugins.openvswitch.agent import ovs_quantum_agent
+from quantum.plugins.openvswitch import ovs_db
+from quantum.plugins.openvswitch import ovs_models
+
+
+class BindingCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        db.register_models()
+        self.engine = db.get_session().bind
+        self.soup = sqlsoup.SqlSoup(self.engine)
+        self.cache = ovs_quantum_agent.BindingCache(self.soup)
+        self.net = db.network_create('tenant', 'net1')
+        ovs_db.add_vlan_binding(10, self.net.uuid)
+        self._capture = None
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+
+    def tearDown(self):
+        self._capture = None
+        self.soup.rollback()
+        db.clear_db()
+
+    def _record(self, conn, cursor, statement, parameters, context,
+                executemany):
+        if self._capture is not None:
+            self._capture.append(statement)
+
+    @contextlib.contextmanager
+    def statements(self):
+        self._capture = []
+        try:
+            yield self._capture
+        finally:
+            self._capture = None
+
+    def _sync(self):
+        self.soup.commit()
+        self.cache.sync()
+
+    def _plug(self, interface_id):
+        port = db.port_create(self.net.uuid)
+        db.port_set_attachment(port.uuid, self.net.uuid, interface_id)
+        ovs_db.record_change(ovs_db.PORT, port.uuid)
+        return port
+
+    def test_full_sync_on_startup(self):
+        port = self._plug('vif1')
+        self._sync()
+        self.assertEqual(self.cache.bindings['vif1'].uuid, port.uuid)
+        self.assertEqual(self.cache.vlan_bindings, {self.net.uuid: 10})
+        self.assertEqual(self.cache.revision, 2)
+
+    def test_incremental_sync_skips_table_scans(self):
+        self._sync()
+        for i in range(5):
+            self._plug('vif%d' % i)
+        with self.statements() as statements:
+            self._sync()
+        self.assertEqual(len(self.cache.bindings), 5)
+        self.assertFalse([s for s in statements
+                          if 'FROM ports' in s and 'IN' not in s])
+        self.assertFalse([s for s in statements if 'FROM vlan_bindings' in s])
+
+    def test_idle_sync_reads_only_changelog(self):
+        self._plug('vif1')
+        self._sync()
+        with self.statements() as statements:
+            self._sync()
+        self.assertEqual(len(statements), 1)
+        self.assertTrue('ovs_changelog' in statements[0])
+
+    def test_incremental_sync_sees_unplug_and_delete(self):
+        port1 = self._plug('vif1')
+        port2 = self._plug('vif2')
+        self._sync()
+        db.port_set_attachment(port1.uuid, self.net.uuid, '')
+        ovs_db.record_change(ovs_db.PORT, port1.uuid)
+        db.port_destroy(port1.uuid, self.net.uuid)
+        ovs_db.record_change(ovs_db.PORT, port1.uuid)
+        self._sync()
+        self.assertEqual(self.cache.bindings.keys(), ['vif2'])
+        self.assertFalse(port1.uuid in self.cache.ports)
+
+    def test_incremental_sync_vlan_bindings(self):
+        self._sync()
+        ovs_db.remove_vlan_binding(self.net.uuid)
+        ovs_db.add_vlan_binding(20, 'net2')
+        self._sync()
+        self.assertEqual(self.cache.vlan_bindings, {'net2': 20})
+
+    def _hide_change(self, change_id):
+        """Removes a changelog entry, as if it had not committed yet"""
+        session = db.get_session()
+        change = (session.query(ovs_models.ChangeLog).
+                  filter_by(id=change_id).one())
+        session.delete(change)
+        session.flush()
+        return change.resource, change.resource_id
+
+    def _commit_change(self, change_id, resource, resource_id):
+        session = db.get_session()
+        change = ovs_models.ChangeLog(resource, resource_id)
+        change.id = change_id
+        session.add(change)
+        session.flush()
+
+    def test_gap_holds_back_later_changes(self):
+        self._sync()
+        revision = self.cache.revision
+        self._plug('vif1')
+        self._plug('vif2')
+        late = self._hide_change(revision + 1)
+        self._sync()
+        self.assertEqual(self.cache.revision, revision)
+        self.assertEqual(self.cache.bindings, {})
+
+        self._commit_change(revision + 1, *late)
+        self._sync()
+        self.assertEqual(sorted(self.cache.bindings), ['vif1', 'vif2'])
+        self.assertEqual(self.cache.revision, revision + 2)
+        self.assertEqual(self.cache.gaps, {})
+
+    def test_expired_gap_forces_full_resync(self):
+        self._sync()
+        revision = self.cache.revision
+        self._plug('vif1')
+        self._plug('vif2')
+        self._hide_change(revision + 1)
+        self._sync()
+        self.assertEqual(self.cache.revision, revision)
+        self.cache.gaps[revision + 1] -= self.cache.GAP_TIMEOUT
+        with self.statements() as statements:
+            self._sync()
+        self.assertTrue([s for s in statements
+                         if 'FROM vlan_bindings' in s])
+        self.assertEqual(sorted(self.cache.bindings), ['vif1', 'vif2'])
+        self.assertEqual(self.cache.revision, revision + 2)
+        self.assertEqual(self.cache.gaps, {})
+
+    def test_full_sync_waits_for_gap(self):
+        self._plug('vif1')
+        self._plug('vif2')
+        late = self._hide_change(2)
+        self._sync()
+        self.assertEqual(self.cache.revision, 1)
+        self.assertEqual(sorted(self.cache.bindings), ['vif1', 'vif2'])
+        self._commit_change(2, *late)
+        self._sync()
+        self.assertEqual(self.cache.revision, 3)
+
+    def test_pruned_revision_forces_full_resync(self):
+        self._sync()
+        revision = self.cache.revision
+        self._plug('vif1')
+        session = db.get_session()
+        (session.query(ovs_models.ChangeLog).
+         filter(ovs_models.ChangeLog.id <= revision).delete())
+        with self.statements() as statements:
+            self._sync()
+        self.assertTrue([s for s in statements
+                         if 'FROM vlan_bindings' in s])
+        self.assertEqual(self.cache.bindings.keys(), ['vif1'])
+
+    def test_record_change_prunes_old_entries(self):
+        retention = ovs_db.CHANGELOG_RETENTION
+        interval = ovs_db.CHANGELOG_PRUNE_INTERVAL
+        ovs_db.CHANGELOG_RETENTION = 3
+        ovs_db.CHANGELOG_PRUNE_INTERVAL = 1
+        try:
+            for i in range(5):
+                last = ovs_db.record_change(ovs_db.PORT, str(i))
+        finally:
+            ovs_db.CHANGELOG_RETENTION = retention
+            ovs_db.CHANGELOG_PRUNE_INTERVAL = interval
+        session = db.get_session()
+        ids = [c.id for c in session.query(ovs_models.ChangeLog)]
+        self.assertEqual(sorted(ids), range(last - 2, last + 1))
+
+    def test_record_change_shares_transaction(self):
+        session = db.get_session()
+        try:
+            with session.begin():
+                port = db.port_create(self.net.uuid, session=session)
+                ovs_db.record_change(ovs_db.PORT, port.uuid, session)
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(db.port_list(self.net.uuid), [])
+        self.assertEqual(db.get_session().query(ovs_models.ChangeLog).
+                         filter_by(resource=ovs_db.PORT).count(), 0)
+
+    def test_add_tunnel_ip(self):
+        self._sync()
+        self.cache.add_tunnel_ip('10.0.0.1')
+        self.soup.commit()
+        cache = ovs_quantum_agent.BindingCache(self.soup)
+        cache.sync()
+        self._plug('vif1')
+        self._sync()
+        cache.sync()
+        self.assertEqual(cache.tunnel_ips, set(['10.0.0.1']))
+        self.assertEqual(self.cache.tunnel_ips, set(['10.0.0.1']))
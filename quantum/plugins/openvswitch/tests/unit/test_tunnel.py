@@ -16,6 +16,7 @@
 #
 # @author: Dave Lapsley, Nicira Networks, Inc.
 
+import contextlib
 import unittest
 
 import mox
@@ -35,6 +36,11 @@ VIF_PORT = ovs_lib.VifPort('port', 'ofport', VIF_ID, VIF_MAC,
                                      'switch')
 
 
+@contextlib.contextmanager
+def dummy_transaction():
+    yield
+
+
 class DummyPort:
     def __init__(self, interface_id):
         self.interface_id = interface_id
@@ -67,9 +73,12 @@ class TunnelTest(unittest.TestCase):
 
         self.mock_tun_bridge = ovs_lib.OVSBridge(self.TUN_BRIDGE,
                                                            'sudo')
-        self.mock_tun_bridge.reset_bridge()
+        self.mock_tun_bridge.create_bridge()
+        self.mock_tun_bridge.delete_port('patch-int')
         self.mock_tun_bridge.add_patch_port(
             'patch-int', 'patch-tun').AndReturn(self.INT_OFPORT)
+        self.mock_tun_bridge.get_tunnel_ports().AndReturn(
+            {'10.0.0.2': ('gre-0', '3'), '10.0.0.3': ('gre-1', '4')})
         self.mock_tun_bridge.remove_all_flows()
         self.mock_tun_bridge.add_flow(priority=1, actions='drop')
 
@@ -161,3 +170,148 @@ class TunnelTest(unittest.TestCase):
         a.local_vlan_map[NET_UUID] = LVM
         a.port_dead(VIF_PORT)
         self.mox.VerifyAll()
+
+    def testTunnelPortName(self):
+        self.assertEqual(ovs_quantum_agent.get_tunnel_port_name('10.0.0.3'),
+                         'gre-0a000003')
+        self.assertEqual(
+            len(ovs_quantum_agent.get_tunnel_port_name('fe80::1')), 15)
+
+    def testBindingState(self):
+        up = DummyPort('vif1')
+        up.state = 'ACTIVE'
+        down = DummyPort('vif2')
+        down.state = 'DOWN'
+        state = ovs_quantum_agent.get_binding_state(
+            {'vif1': up, 'vif2': down, 'vif3': None})
+        self.assertEqual(state, frozenset([('vif1', 'ACTIVE'),
+                                           ('vif2', 'DOWN')]))
+
+    def testManageTunnels(self):
+        self.mock_tun_bridge.vsctl_transaction().AndReturn(
+            dummy_transaction())
+        self.mock_tun_bridge.queue_tunnel_port('gre-0a000004', '10.0.0.4')
+        self.mock_tun_bridge.delete_port('gre-1')
+        tunnel_ports = {'10.0.0.2': ('gre-0', '3'),
+                        '10.0.0.4': ('gre-0a000004', '5')}
+        self.mock_tun_bridge.get_tunnel_ports().AndReturn(tunnel_ports)
+
+        self.mox.ReplayAll()
+        a = ovs_quantum_agent.OVSQuantumTunnelAgent(self.INT_BRIDGE,
+                                                    self.TUN_BRIDGE,
+                                                    '10.0.0.1',
+                                                    'sudo', 2, 2)
+        tunnel_ips = set(['10.0.0.1', '10.0.0.2', '10.0.0.4'])
+        a.manage_tunnels(tunnel_ips, None, None)
+        self.assertEqual(a.tunnel_ports, tunnel_ports)
+        # NOTE(jkoelker) Nothing changed, so OVS is not touched again.
+        a.manage_tunnels(set(['10.0.0.1', '10.0.0.2', '10.0.0.4']),
+                         tunnel_ips, None)
+        self.mox.VerifyAll()
+
+    def testManageTunnelsAfterRestart(self):
+        self.mox.ReplayAll()
+        a = ovs_quantum_agent.OVSQuantumTunnelAgent(self.INT_BRIDGE,
+                                                    self.TUN_BRIDGE,
+                                                    '10.0.0.1',
+                                                    'sudo', 2, 2)
+        a.manage_tunnels(set(['10.0.0.1', '10.0.0.2', '10.0.0.3']), None,
+                         None)
+        self.mox.VerifyAll()
+
+    def testManageTunnelsAfterRestartWithoutPeers(self):
+        self.mock_tun_bridge.vsctl_transaction().AndReturn(
+            dummy_transaction())
+        self.mock_tun_bridge.delete_port('gre-0').InAnyOrder()
+        self.mock_tun_bridge.delete_port('gre-1').InAnyOrder()
+        self.mock_tun_bridge.get_tunnel_ports().AndReturn({})
+
+        self.mox.ReplayAll()
+        a = ovs_quantum_agent.OVSQuantumTunnelAgent(self.INT_BRIDGE,
+                                                    self.TUN_BRIDGE,
+                                                    '10.0.0.1',
+                                                    'sudo', 2, 2)
+        a.manage_tunnels(set(['10.0.0.1']), None, None)
+        self.assertEqual(a.tunnel_ports, {})
+        self.mox.VerifyAll()
+
+
+class DummyBinding:
+    def __init__(self, network_id):
+        self.network_id = network_id
+
+
+class WarmRestartTunnelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mox = mox.Mox()
+
+        self.INT_BRIDGE = 'integration_bridge'
+        self.TUN_BRIDGE = 'tunnel_bridge'
+
+        self.mox.StubOutClassWithMocks(ovs_lib, 'OVSBridge')
+        self.mock_int_bridge = ovs_lib.OVSBridge(self.INT_BRIDGE, 'sudo')
+        self.mock_int_bridge.get_port_ofport('patch-tun').AndReturn('1')
+        self.mock_int_bridge.add_flow(priority=1, actions='normal')
+
+        self.mock_tun_bridge = ovs_lib.OVSBridge(self.TUN_BRIDGE, 'sudo')
+        self.mock_tun_bridge.create_bridge()
+        self.mock_tun_bridge.get_port_ofport('patch-int').AndRaise(
+            RuntimeError())
+        self.mock_tun_bridge.delete_port('patch-int')
+        self.mock_tun_bridge.add_patch_port(
+            'patch-int', 'patch-tun').AndReturn('1')
+        self.mock_tun_bridge.get_tunnel_ports().AndReturn({})
+        self.mock_tun_bridge.add_flow(priority=1, actions='drop')
+
+    def tearDown(self):
+        self.mox.UnsetStubs()
+
+    def testConstruct(self):
+        self.mox.ReplayAll()
+        ovs_quantum_agent.OVSQuantumTunnelAgent(self.INT_BRIDGE,
+                                                self.TUN_BRIDGE,
+                                                '10.0.0.1', 'sudo', 2, 2,
+                                                warm_restart=True)
+        self.mox.VerifyAll()
+
+    def testRecoverLocalVlans(self):
+        self.mock_tun_bridge.dump_flows().AndReturn([
+            ({'priority': '4', 'in_port': '1', 'dl_vlan': str(LV_ID)},
+             'strip_vlan,set_tunnel:0x2a,NORMAL'),
+            ({'priority': '3', 'tun_id': '0x2a'},
+             'mod_vlan_vid:%s,output:1' % LV_ID),
+            ({'priority': '3', 'tun_id': '0x2b'}, 'mod_vlan_vid:43,output:1'),
+            ({'priority': '3', 'tun_id': '0x2c'}, 'mod_vlan_vid:44,output:1'),
+            ])
+        self.mock_int_bridge.get_port_tags().AndReturn(
+            {'tap1': LV_ID, 'tap2': 1, 'tap3': 44})
+        # NOTE(jkoelker) 0x2b is not bound to any network anymore and the
+        #                network of 0x2c has no port tagged for it.
+        self.mock_tun_bridge.delete_flows(tun_id=44)
+        self.mock_tun_bridge.delete_flows(dl_vlan=44)
+        self.mock_tun_bridge.delete_flows(tun_id=43)
+        self.mock_tun_bridge.delete_flows(dl_vlan=43)
+
+        self.mox.ReplayAll()
+        a = ovs_quantum_agent.OVSQuantumTunnelAgent(self.INT_BRIDGE,
+                                                    self.TUN_BRIDGE,
+                                                    '10.0.0.1', 'sudo', 2, 2,
+                                                    warm_restart=True)
+        vif_ports = [ovs_lib.VifPort('tap1', '2', 'vif1', 'mac1', None),
+                     ovs_lib.VifPort('tap2', '3', 'vif2', 'mac2', None),
+                     ovs_lib.VifPort('tap3', '4', 'vif3', 'mac3', None)]
+        all_bindings = {'vif1': DummyBinding('net1'),
+                        'vif2': DummyBinding('net1'),
+                        'vif3': DummyBinding('net2')}
+        bindings, ports = a.recover_local_vlans(
+            vif_ports, all_bindings, {'net1': 42, 'net3': 44})
+
+        self.assertEqual(bindings, {'vif1': all_bindings['vif1']})
+        self.assertEqual(ports.keys(), ['vif1'])
+        self.assertEqual(a.local_vlan_map.keys(), ['net1'])
+        self.assertEqual(a.local_vlan_map['net1'].vif_ids, set(['vif1']))
+        self.assertFalse(LV_ID in a.available_local_vlans)
+        self.assertTrue(43 in a.available_local_vlans)
+        self.assertTrue(44 in a.available_local_vlans)
+        self.mox.VerifyAll()
@@ -33,37 +33,18 @@ from ryu.app import rest_nw_id
 from ryu.app.client import OFPClient
 from sqlalchemy.ext.sqlsoup import SqlSoup
 
-from quantum.agent.linux import utils
+from quantum.agent import stats
+from quantum.agent.linux import ovs_lib
 
 OP_STATUS_UP = "UP"
 OP_STATUS_DOWN = "DOWN"
 
+POLLING_INTERVAL = 2
 
-class VifPort:
-    """
-    A class to represent a VIF (i.e., a port that has 'iface-id' and 'vif-mac'
-    attributes set).
-    """
-    def __init__(self, port_name, ofport, vif_id, vif_mac, switch):
-        self.port_name = port_name
-        self.ofport = ofport
-        self.vif_id = vif_id
-        self.vif_mac = vif_mac
-        self.switch = switch
-
-    def __str__(self):
-        return ("iface-id=%s, vif_mac=%s, port_name=%s, ofport=%s, "
-                "bridge name = %s" % (self.vif_id,
-                                      self.vif_mac,
-                                      self.port_name,
-                                      self.ofport,
-                                      self.switch.br_name))
-
-
-class OVSBridge:
+
+class OVSBridge(ovs_lib.OVSBridge):
     def __init__(self, br_name, root_helper):
-        self.br_name = br_name
-        self.root_helper = root_helper
+        ovs_lib.OVSBridge.__init__(self, br_name, root_helper)
         self.datapath_id = None
 
     def find_datapath_id(self):
@@ -74,88 +55,17 @@ class OVSBridge:
         dp_id = res.strip().strip('"')
         self.datapath_id = dp_id
 
-    def run_vsctl(self, args):
-        full_args = ["ovs-vsctl", "--timeout=2"] + args
-        return utils.execute(full_args, root_helper=self.root_helper)
-
     def set_controller(self, target):
         methods = ("ssl", "tcp", "unix", "pssl", "ptcp", "punix")
         args = target.split(":")
         if not args[0] in methods:
             target = "tcp:" + target
-        self.run_vsctl(["set-controller", self.br_name, target])
-
-    def db_get_map(self, table, record, column):
-        str_ = self.run_vsctl(["get", table, record, column]).rstrip("\n\r")
-        return self.db_str_to_map(str_)
-
-    def db_get_val(self, table, record, column):
-        return self.run_vsctl(["get", table, record, column]).rstrip("\n\r")
-
-    @staticmethod
-    def db_str_to_map(full_str):
-        list = full_str.strip("{}").split(", ")
-        ret = {}
-        for elem in list:
-            if elem.find("=") == -1:
-                continue
-            arr = elem.split("=")
-            ret[arr[0]] = arr[1].strip("\"")
-        return ret
-
-    def get_port_name_list(self):
-        res = self.run_vsctl(["list-ports", self.br_name])
-        return res.split("\n")[:-1]
-
-    def get_xapi_iface_id(self, xs_vif_uuid):
-        return utils.execute(["xe", "vif-param-get",
-                              "param-name=other-config",
-                              "param-key=nicira-iface-id",
-                              "uuid=%s" % xs_vif_uuid],
-                              root_helper=self.root_helper).strip()
-
-    def _vifport(self, name, external_ids):
-        ofport = self.db_get_val("Interface", name, "ofport")
-        return VifPort(name, ofport, external_ids["iface-id"],
-                       external_ids["attached-mac"], self)
-
-    def _get_ports(self, get_port):
-        ports = []
-        port_names = self.get_port_name_list()
-        for name in port_names:
-            port = get_port(name)
-            if port:
-                ports.append(port)
-
-        return ports
-
-    def _get_vif_port(self, name):
-        external_ids = self.db_get_map("Interface", name, "external_ids")
-        if "iface-id" in external_ids and "attached-mac" in external_ids:
-            return self._vifport(name, external_ids)
-        elif ("xs-vif-uuid" in external_ids and
-              "attached-mac" in external_ids):
-            # if this is a xenserver and iface-id is not automatically
-            # synced to OVS from XAPI, we grab it from XAPI directly
-            ofport = self.db_get_val("Interface", name, "ofport")
-            iface_id = self.get_xapi_iface_id(external_ids["xs-vif-uuid"])
-            return VifPort(name, ofport, iface_id,
-                           external_ids["attached-mac"], self)
-
-    def get_vif_ports(self):
-        "returns a VIF object for each VIF port"
-        return self._get_ports(self._get_vif_port)
-
-    def _get_external_port(self, name):
-        external_ids = self.db_get_map("Interface", name, "external_ids")
-        if external_ids:
-            return
-
-        ofport = self.db_get_val("Interface", name, "ofport")
-        return VifPort(name, ofport, None, None, self)
+        self.queue_vsctl(["set-controller", self.br_name, target])
 
     def get_external_ports(self):
-        return self._get_ports(self._get_external_port)
+        return [ovs_lib.VifPort(name, ofport, None, None, self)
+                for name, ofport, external_ids in self.get_interfaces()
+                if not external_ids]
 
 
 def check_ofp_mode(db):
@@ -186,8 +96,9 @@ def check_ofp_mode(db):
 
 
 class OVSQuantumOFPRyuAgent:
-    def __init__(self, integ_br, db, root_helper):
+    def __init__(self, integ_br, db, root_helper, cycle_stats=None):
         self.root_helper = root_helper
+        self.stats = cycle_stats or stats.CycleStats(POLLING_INTERVAL)
         (ofp_controller_addr, ofp_rest_api_addr) = check_ofp_mode(db)
 
         self.nw_id_external = rest_nw_id.NW_ID_EXTERNAL
@@ -229,12 +140,18 @@ class OVSQuantumOFPRyuAgent:
         old_local_bindings = local_bindings
 
         while True:
-            all_bindings = self._all_bindings(db)
+            self.stats.start()
+            with self.stats.phase('db'):
+                all_bindings = self._all_bindings(db)
 
             new_vif_ports = {}
             new_local_bindings = {}
-            for port in self.int_br.get_vif_ports():
+            with self.stats.phase('inspect'):
+                vif_ports = self.int_br.get_vif_ports()
+            for port in vif_ports:
                 new_vif_ports[port.vif_id] = port
+                if port.vif_id not in old_vif_ports:
+                    self.stats.count('added')
                 if port.vif_id in all_bindings:
                     net_id = all_bindings[port.vif_id].network_id
                     new_local_bindings[port.vif_id] = net_id
@@ -243,6 +160,7 @@ class OVSQuantumOFPRyuAgent:
                 new_b = new_local_bindings.get(port.vif_id)
                 if old_b == new_b:
                     continue
+                self.stats.count('changed')
 
                 if not old_b:
                     LOG.info("Removing binding to net-id = %s for %s",
@@ -258,13 +176,16 @@ class OVSQuantumOFPRyuAgent:
             for vif_id in old_vif_ports:
                 if vif_id not in new_vif_ports:
                     LOG.info("Port Disappeared: %s", vif_id)
+                    self.stats.count('removed')
                     if vif_id in all_bindings:
                         all_bindings[vif_id].op_status = OP_STATUS_DOWN
 
             old_vif_ports = new_vif_ports
             old_local_bindings = new_local_bindings
-            db.commit()
-            time.sleep(2)
+            with self.stats.phase('db'):
+                db.commit()
+            self.stats.finish()
+            time.sleep(POLLING_INTERVAL)
 
 
 def main():
@@ -296,12 +217,24 @@ def main():
 
     root_helper = config.get("AGENT", "root_helper")
 
+    stats_interval = stats.DEFAULT_REPORT_INTERVAL
+    if config.has_option("AGENT", "stats_interval"):
+        stats_interval = config.getint("AGENT", "stats_interval")
+    statsd_host = None
+    if config.has_option("AGENT", "statsd_host"):
+        statsd_host = config.get("AGENT", "statsd_host")
+    statsd_port = stats.DEFAULT_STATSD_PORT
+    if config.has_option("AGENT", "statsd_port"):
+        statsd_port = config.getint("AGENT", "statsd_port")
+    cycle_stats = stats.create_stats('ryu', POLLING_INTERVAL, stats_interval,
+                                     statsd_host, statsd_port)
+
     options = {"sql_connection": config.get("DATABASE", "sql_connection")}
     db = SqlSoup(options["sql_connection"])
 
     LOG.info("Connecting to database \"%s\" on %s",
              db.engine.url.database, db.engine.url.host)
-    plugin = OVSQuantumOFPRyuAgent(integ_br, db, root_helper)
+    plugin = OVSQuantumOFPRyuAgent(integ_br, db, root_helper, cycle_stats)
     plugin.daemon_loop(db)
 
     sys.exit(0)
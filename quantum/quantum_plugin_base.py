@@ -30,6 +30,11 @@ class QuantumPluginBase(object):
 
     __metaclass__ = ABCMeta
 
+    # Names of the filter_opts get_all_networks and get_all_ports apply
+    # themselves. The API filters in python on the other ones only.
+    supported_network_filters = ()
+    supported_port_filters = ()
+
     @abstractmethod
     def get_all_networks(self, tenant_id, **kwargs):
         """
@@ -40,7 +45,8 @@ class QuantumPluginBase(object):
             are being retrieved by this method
         :param **kwargs: options to be passed to the plugin. The following
             keywork based-options can be specified:
-            filter_opts - options for filtering network list
+            filter_opts - options for filtering network list, the plugin
+            must apply the ones named in supported_network_filters
         :returns: a list of mapping sequences with the following signature:
                      [ {'net-id': uuid that uniquely identifies
                                       the particular quantum network,
@@ -134,7 +140,8 @@ class QuantumPluginBase(object):
             about to be retrieved
         :param **kwargs: options to be passed to the plugin. The following
             keywork based-options can be specified:
-            filter_opts - options for filtering network list
+            filter_opts - options for filtering port list, the plugin
+            must apply the ones named in supported_port_filters
         :returns: a list of mapping sequences with the following signature:
                      [ {'port-id': uuid representing a particular port
                                     on the specified quantum network
@@ -215,6 +222,19 @@ class QuantumPluginBase(object):
         """
         pass
 
+    def get_ports_details(self, tenant_id, net_id, port_ids):
+        """
+        Retrieves the details of several ports of the specified Virtual
+        Network. Plugins which can fetch them at once should override this.
+
+        :returns: a list of the mapping sequences get_port_details returns,
+                  in the order of port_ids
+        :raises: exception.PortNotFound
+        :raises: exception.NetworkNotFound
+        """
+        return [self.get_port_details(tenant_id, net_id, port_id)
+                for port_id in port_ids]
+
     @abstractmethod
     def plug_interface(self, tenant_id, net_id, port_id, remote_interface_id):
         """
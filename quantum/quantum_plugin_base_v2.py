@@ -60,6 +60,19 @@ class QuantumPluginBaseV2(object):
         """
         pass
 
+    def create_subnet_bulk(self, context, subnets):
+        """
+        Create several subnets at once.
+
+        : param subnets: {"subnets": [{"subnet": <subnet_data>}, ...]}
+        :returns: list of the created subnets, in request order
+
+        Plugins able to create the subnets in a single operation
+        should override this, the default calls create_subnet for each.
+        """
+        return [self.create_subnet(context, subnet)
+                for subnet in subnets['subnets']]
+
     @abstractmethod
     def update_subnet(self, context, id, subnet):
         pass
@@ -73,7 +86,17 @@ class QuantumPluginBaseV2(object):
         pass
 
     @abstractmethod
-    def get_subnets(self, context, filters=None, fields=None, verbose=None):
+    def get_subnets(self, context, filters=None, fields=None, verbose=None,
+                    limit=None, marker=None):
+        """
+        Retrieves a list of subnets.
+
+        :param limit: (optional) maximum number of items to return,
+                      ordered by id. Only passed when the API is
+                      paginating the collection.
+        :param marker: (optional) id of the last item of the previous
+                       page, items with a greater id are returned.
+        """
         pass
 
     @abstractmethod
@@ -95,6 +118,19 @@ class QuantumPluginBaseV2(object):
         """
         pass
 
+    def create_network_bulk(self, context, networks):
+        """
+        Creates several Virtual Networks at once.
+
+        :param networks: {"networks": [{"network": <net_data>}, ...]}
+        :returns: list of the created networks, in request order
+
+        Plugins able to create the networks in a single operation
+        should override this, the default calls create_network for each.
+        """
+        return [self.create_network(context, network)
+                for network in networks['networks']]
+
     @abstractmethod
     def update_network(self, context, id, network):
         pass
@@ -108,7 +144,8 @@ class QuantumPluginBaseV2(object):
         pass
 
     @abstractmethod
-    def get_networks(self, context, filters=None, fields=None, verbose=None):
+    def get_networks(self, context, filters=None, fields=None, verbose=None,
+                     limit=None, marker=None):
         pass
 
     @abstractmethod
@@ -152,6 +189,18 @@ class QuantumPluginBaseV2(object):
         """
         pass
 
+    def create_port_bulk(self, context, ports):
+        """
+        Creates several ports at once.
+
+        :param ports: {"ports": [{"port": <port_data>}, ...]}
+        :returns: list of the created ports, in request order
+
+        Plugins able to create the ports in a single operation should
+        override this, the default calls create_port for each.
+        """
+        return [self.create_port(context, port) for port in ports['ports']]
+
     @abstractmethod
     def update_port(self, context, id, port):
         """
@@ -191,5 +240,6 @@ class QuantumPluginBaseV2(object):
         pass
 
     @abstractmethod
-    def get_ports(self, context, filters=None, fields=None, verbose=None):
+    def get_ports(self, context, filters=None, fields=None, verbose=None,
+                  limit=None, marker=None):
         pass
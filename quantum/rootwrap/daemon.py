@@ -0,0 +1,158 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 Openstack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Long running root wrapper.
+
+Listens on a UNIX socket for commands from the agents, checks them against
+the same filters quantum-rootwrap uses and runs the ones that match. This
+avoids paying for sudo, an interpreter start and loading the filters on
+every command.
+
+Requests and responses are JSON documents, one per line:
+
+    {"cmd": ["ovs-vsctl", "list-br"], "stdin": null}
+    {"returncode": 0, "stdout": "br-int\\n", "stderr": ""}
+"""
+
+import logging
+import os
+import pwd
+import socket
+import SocketServer
+import struct
+import subprocess
+import sys
+
+from quantum.openstack.common import jsonutils
+from quantum.rootwrap import wrapper
+
+
+LOG = logging.getLogger(__name__)
+
+RC_UNAUTHORIZED = 99
+RC_NOCOMMAND = 98
+
+# NOTE(jkoelker) The python 2 socket module does not export SO_PEERCRED,
+#                this is its value on Linux.
+SO_PEERCRED = getattr(socket, 'SO_PEERCRED', 17)
+
+# NOTE(jkoelker) Command output is not guaranteed to be valid UTF-8, so it
+#                is sent as latin-1 which maps every byte to a code point.
+OUTPUT_ENCODING = 'latin-1'
+
+
+class RootwrapHandler(SocketServer.StreamRequestHandler):
+    """Runs the commands sent over one client connection."""
+
+    def handle(self):
+        if not self.server.verify_peer(self.request):
+            LOG.warning("Rejected connection from unauthorized peer")
+            return
+
+        for line in iter(self.rfile.readline, ''):
+            try:
+                request = jsonutils.loads(line)
+                userargs = request['cmd']
+                process_input = request.get('stdin')
+            except (ValueError, KeyError, TypeError):
+                LOG.warning("Dropping connection after malformed request")
+                return
+
+            response = self.server.run_command(userargs, process_input)
+            self.wfile.write(jsonutils.dumps(response) + '\n')
+            self.wfile.flush()
+
+
+class RootwrapServer(SocketServer.ThreadingMixIn,
+                     SocketServer.UnixStreamServer):
+    """
+    UNIX socket server only accepting connections from root and from
+    allowed_uid. The socket itself is only accessible to allowed_uid.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, allowed_uid, filters):
+        self.allowed_uids = set([0, allowed_uid])
+        self.filters = filters
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        old_umask = os.umask(0177)
+        try:
+            SocketServer.UnixStreamServer.__init__(self, socket_path,
+                                                   RootwrapHandler)
+        finally:
+            os.umask(old_umask)
+        os.chown(socket_path, allowed_uid, -1)
+
+    def verify_peer(self, sock):
+        creds = sock.getsockopt(socket.SOL_SOCKET, SO_PEERCRED,
+                                struct.calcsize('3i'))
+        _pid, uid, _gid = struct.unpack('3i', creds)
+        return uid in self.allowed_uids
+
+    def run_command(self, userargs, process_input=None):
+        if not userargs or not isinstance(userargs, list):
+            return {'returncode': RC_NOCOMMAND, 'stdout': '',
+                    'stderr': 'No command specified'}
+
+        userargs = [unicode(arg).encode('utf-8') for arg in userargs]
+        filtermatch = wrapper.match_filter(self.filters, userargs)
+        if not filtermatch:
+            return {'returncode': RC_UNAUTHORIZED, 'stdout': '',
+                    'stderr': 'Unauthorized command: %s' %
+                    ' '.join(userargs)}
+
+        if process_input is not None:
+            process_input = process_input.encode(OUTPUT_ENCODING)
+        try:
+            obj = subprocess.Popen(filtermatch.get_command(userargs),
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE,
+                                   close_fds=True,
+                                   env=filtermatch.get_environment(userargs))
+        except OSError as e:
+            return {'returncode': RC_NOCOMMAND, 'stdout': '',
+                    'stderr': 'Unable to run %s: %s' % (userargs[0], e)}
+        _stdout, _stderr = obj.communicate(process_input)
+        return {'returncode': obj.returncode,
+                'stdout': _stdout.decode(OUTPUT_ENCODING),
+                'stderr': _stderr.decode(OUTPUT_ENCODING)}
+
+
+def main(argv):
+    execname = argv.pop(0)
+    if len(argv) not in (1, 2):
+        print "Usage: %s <socket path> [<user>]" % execname
+        sys.exit(RC_NOCOMMAND)
+
+    socket_path = argv[0]
+    if len(argv) == 2:
+        allowed_uid = pwd.getpwnam(argv[1]).pw_uid
+    elif 'SUDO_UID' in os.environ:
+        allowed_uid = int(os.environ['SUDO_UID'])
+    else:
+        print "%s: %s" % (execname, "Unable to determine the agent's user")
+        sys.exit(RC_NOCOMMAND)
+
+    filters = wrapper.FilterIndex(wrapper.load_filters())
+    server = RootwrapServer(socket_path, allowed_uid, filters)
+    try:
+        server.serve_forever()
+    finally:
+        os.unlink(socket_path)
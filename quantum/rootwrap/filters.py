@@ -32,6 +32,13 @@ class CommandFilter(object):
         """Only check that the first argument (command) matches exec_path"""
         return os.path.basename(self.exec_path) == userargs[0]
 
+    def get_match_key(self):
+        """
+        Returns the command (1st argument) this filter can match, None if
+        it may match any command
+        """
+        return os.path.basename(self.exec_path)
+
     def get_command(self, userargs):
         """Returns command to execute (with sudo -u if run_as != root)."""
         if (self.run_as != 'root'):
@@ -47,19 +54,28 @@ class CommandFilter(object):
 class RegExpFilter(CommandFilter):
     """Command filter doing regexp matching for every argument"""
 
+    REGEXP_SPECIAL_CHARS = set('.^$*+?{}[]\\|()')
+
+    def __init__(self, exec_path, run_as, *args):
+        super(RegExpFilter, self).__init__(exec_path, run_as, *args)
+        # Anchor patterns explicitly at end of string
+        try:
+            self.patterns = [re.compile(pattern + '$') for pattern in args]
+        except re.error:
+            # Badly-formed filter, never matches
+            self.patterns = None
+
     def match(self, userargs):
+        if self.patterns is None:
+            # DENY: Badly-formed filter
+            return False
         # Early skip if command or number of args don't match
-        if (len(self.args) != len(userargs)):
+        if (len(self.patterns) != len(userargs)):
             # DENY: argument numbers don't match
             return False
-        # Compare each arg (anchoring pattern explicitly at end of string)
-        for (pattern, arg) in zip(self.args, userargs):
-            try:
-                if not re.match(pattern + '$', arg):
-                    break
-            except re.error:
-                # DENY: Badly-formed filter
-                return False
+        for (pattern, arg) in zip(self.patterns, userargs):
+            if not pattern.match(arg):
+                break
         else:
             # ALLOW: All arguments matched
             return True
@@ -67,6 +83,11 @@ class RegExpFilter(CommandFilter):
         # DENY: Some arguments did not match
         return False
 
+    def get_match_key(self):
+        if not self.args or set(self.args[0]) & self.REGEXP_SPECIAL_CHARS:
+            return None
+        return self.args[0]
+
 
 class DnsmasqFilter(CommandFilter):
     """Specific filter for the dnsmasq call (which includes env)"""
@@ -81,6 +102,10 @@ class DnsmasqFilter(CommandFilter):
     def get_command(self, userargs):
         return [self.exec_path] + userargs[3:]
 
+    def get_match_key(self):
+        # The command comes after the environment variables
+        return None
+
     def get_environment(self, userargs):
         env = os.environ.copy()
         env['FLAGFILE'] = userargs[0].split('=')[-1]
@@ -122,6 +147,9 @@ class KillFilter(CommandFilter):
             return False
         return True
 
+    def get_match_key(self):
+        return "kill"
+
 
 class ReadFileFilter(CommandFilter):
     """Specific filter for the utils.read_file_as_root call"""
@@ -138,3 +166,6 @@ class ReadFileFilter(CommandFilter):
         if len(userargs) != 2:
             return False
         return True
+
+    def get_match_key(self):
+        return "cat"
@@ -16,8 +16,13 @@
 #    under the License.
 
 
+import json
 import os
+import stat
 import sys
+import tempfile
+
+from quantum.rootwrap import filters
 
 
 FILTERS_MODULES = ['quantum.rootwrap.linuxbridge-agent',
@@ -25,34 +30,210 @@ FILTERS_MODULES = ['quantum.rootwrap.linuxbridge-agent',
                    'quantum.rootwrap.ryu-agent',
                   ]
 
+# The definitions of the filters loaded from FILTERS_MODULES are cached
+# here, so that rootwrap does not import every filter module on each
+# invocation. The directory is created by rootwrap and owned by root.
+FILTERS_CACHE = '/var/cache/quantum-rootwrap/filters.json'
+
+
+class FilterIndex(object):
+    """
+    Filters grouped by the command they can match. Filters that may match
+    any command are part of every group. Each group keeps the order of the
+    filter list.
+    """
+
+    def __init__(self, filters):
+        self.filters = list(filters)
+        keys = set(f.get_match_key() for f in self.filters)
+        keys.discard(None)
+        self.unkeyed = [f for f in self.filters if f.get_match_key() is None]
+        self.index = {}
+        for key in keys:
+            self.index[key] = [f for f in self.filters
+                               if f.get_match_key() in (key, None)]
+        self._executables = set()
+
+    def get_candidates(self, userargs):
+        """Returns the filters that may match userargs, in order."""
+        return self.index.get(userargs[0], self.unkeyed)
+
+    def is_executable(self, exec_path):
+        # NOTE(jkoelker) Only positive results are remembered so an
+        #                executable installed later is still picked up.
+        if exec_path in self._executables:
+            return True
+        if os.access(exec_path, os.X_OK):
+            self._executables.add(exec_path)
+            return True
+        return False
+
+
+def _filters_signature():
+    """
+    Returns the modification time of every filter module, without
+    importing them, to detect a stale filters cache.
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    signature = []
+    for modulename in ['quantum.rootwrap.filters'] + FILTERS_MODULES:
+        mtime = None
+        basename = modulename.split('.')[-1]
+        for suffix in ('.py', '.pyc'):
+            try:
+                mtime = os.stat(os.path.join(package_dir,
+                                             basename + suffix)).st_mtime
+                break
+            except OSError:
+                pass
+        signature.append((modulename, mtime))
+    return signature
+
+
+def _is_trusted(st):
+    """
+    The cached filters decide which commands run as root, so the cache and
+    its directory are only trusted if nobody but root, or the user running
+    rootwrap, can write them.
+    """
+    if st.st_uid not in (0, os.geteuid()):
+        return False
+    return not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def _is_trusted_dir(cache_path):
+    try:
+        st = os.stat(os.path.dirname(cache_path))
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and _is_trusted(st)
+
 
-def load_filters():
-    """Load filters from modules present in quantum.rootwrap."""
-    filters = []
+def _to_str(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [_to_str(item) for item in value]
+    return value
+
+
+def _filter_definition(f):
+    """
+    Returns the class name and constructor arguments of a filter, None if
+    its class is not one of quantum.rootwrap.filters.
+    """
+    name = f.__class__.__name__
+    if getattr(filters, name, None) is not f.__class__:
+        return None
+    if isinstance(f, filters.ReadFileFilter):
+        args = [f.file_path]
+    else:
+        args = [f.exec_path, f.run_as]
+    return [name, args + list(f.args)]
+
+
+def _build_filter(definition):
+    name, args = definition
+    cls = getattr(filters, name, None)
+    if not (isinstance(cls, type) and issubclass(cls, filters.CommandFilter)):
+        raise ValueError("Unknown filter class %s" % name)
+    return cls(*_to_str(args))
+
+
+def _read_filters_cache(cache_path, signature):
+    if not _is_trusted_dir(cache_path):
+        return None
+    try:
+        fd = os.open(cache_path, os.O_RDONLY | os.O_NOFOLLOW)
+    except OSError:
+        return None
+    try:
+        with os.fdopen(fd, 'rb') as cache:
+            st = os.fstat(cache.fileno())
+            if not stat.S_ISREG(st.st_mode) or not _is_trusted(st):
+                return None
+            cached = json.load(cache)
+        if cached['signature'] != json.loads(json.dumps(signature)):
+            return None
+        return [_build_filter(d) for d in cached['filters']]
+    except Exception:
+        return None
+
+
+def _write_filters_cache(cache_path, signature, filterlist):
+    definitions = [_filter_definition(f) for f in filterlist]
+    if None in definitions:
+        # It's OK to run without a cache
+        return
+    cache_dir = os.path.dirname(cache_path)
+    if not os.path.isdir(cache_dir):
+        try:
+            os.mkdir(cache_dir, 0755)
+        except OSError:
+            return
+    if not _is_trusted_dir(cache_path):
+        return
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+    except OSError:
+        return
+    try:
+        with os.fdopen(fd, 'wb') as cache:
+            json.dump({'signature': signature, 'filters': definitions},
+                      cache)
+        os.chmod(tmp_path, 0644)
+        os.rename(tmp_path, cache_path)
+    except Exception:
+        os.unlink(tmp_path)
+
+
+def _import_filters():
+    filterlist = []
     for modulename in FILTERS_MODULES:
         try:
             __import__(modulename)
             module = sys.modules[modulename]
-            filters = filters + module.filterlist
+            filterlist = filterlist + module.filterlist
         except ImportError:
             # It's OK to have missing filters, since filter modules
             # may be shipped with specific nodes
             pass
-    return filters
+    return filterlist
+
+
+def load_filters(cache_path=None):
+    """
+    Load filters from modules present in quantum.rootwrap, or from the
+    filters cache (FILTERS_CACHE unless cache_path is given) if none of
+    the modules changed since it was written.
+    """
+    if cache_path is None:
+        cache_path = FILTERS_CACHE
+
+    signature = _filters_signature()
+    filterlist = _read_filters_cache(cache_path, signature)
+    if filterlist is None:
+        filterlist = _import_filters()
+        _write_filters_cache(cache_path, signature, filterlist)
+    return filterlist
 
 
 def match_filter(filters, userargs):
     """
     Checks user command and arguments through command filters and
     returns the first matching filter, or None is none matched.
+    filters is either a list of filters or a FilterIndex.
     """
 
+    if not isinstance(filters, FilterIndex):
+        filters = FilterIndex(filters)
+
     found_filter = None
 
-    for f in filters:
+    for f in filters.get_candidates(userargs):
         if f.match(userargs):
             # Try other filters if executable is absent
-            if not os.access(f.exec_path, os.X_OK):
+            if not filters.is_executable(f.exec_path):
                 if not found_filter:
                     found_filter = f
                 continue
@@ -0,0 +1,135 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Micro-benchmark of the OVS agent per-port state.
+
+Compares the old list and __dict__ based representations with the
+current ones for a hypervisor with many VIFs spread over many networks:
+
+    python -m quantum.tests.bench_ovs_agent [<networks> [<vifs per net>]]
+"""
+
+import sys
+import timeit
+
+from quantum.agent.linux import ovs_lib
+from quantum.plugins.openvswitch.agent import ovs_quantum_agent
+
+
+class DictVifPort:
+    def __init__(self, port_name, ofport, vif_id, vif_mac, switch):
+        self.port_name = port_name
+        self.ofport = ofport
+        self.vif_id = vif_id
+        self.vif_mac = vif_mac
+        self.switch = switch
+
+
+class Row(object):
+    def __init__(self, uuid, network_id, interface_id, state):
+        self.uuid = uuid
+        self.network_id = network_id
+        self.interface_id = interface_id
+        self.state = state
+        self.op_status = 'UP'
+
+
+def instance_size(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def make_ports(networks, vifs):
+    ports = []
+    for net in xrange(networks):
+        for vif in xrange(vifs):
+            vif_id = 'vif-%05d-%05d' % (net, vif)
+            ports.append(('tap%05d%05d' % (net, vif), net * vifs + vif,
+                          vif_id, 'net-%05d' % net))
+    return ports
+
+
+def bench_memory(ports):
+    name, ofport, vif_id, _net = ports[0]
+    old = instance_size(DictVifPort(name, ofport, vif_id, 'mac', None))
+    new = instance_size(ovs_lib.VifPort(name, ofport, vif_id, 'mac', None))
+    print "VifPort bytes per port:    dict %6d  slots %6d" % (old, new)
+    row = Row('uuid', 'net', vif_id, 'ACTIVE')
+    old = instance_size(row)
+    new = instance_size(ovs_quantum_agent.Port(row))
+    print "Port bytes per port:       dict %6d  slots %6d" % (old, new)
+
+
+def bench_unbind(ports, vifs):
+    by_net = {}
+    for _name, _ofport, vif_id, net in ports:
+        by_net.setdefault(net, []).append(vif_id)
+
+    def unbind(container):
+        for net, vif_ids in by_net.iteritems():
+            members = container(vif_ids)
+            # NOTE(jkoelker) Ports go away in no particular order, unbind
+            #                from the back so the list has to be scanned.
+            for vif_id in reversed(vif_ids):
+                if vif_id in members:
+                    members.remove(vif_id)
+
+    old = min(timeit.repeat(lambda: unbind(list), number=1, repeat=3))
+    new = min(timeit.repeat(lambda: unbind(set), number=1, repeat=3))
+    print "unbind all (%4d per net): list %6.3fs  set %6.3fs" % (vifs, old,
+                                                                 new)
+
+
+def bench_diff(ports):
+    bindings = dict((vif_id, ovs_quantum_agent.Port(
+        Row(vif_id, net, vif_id, 'ACTIVE')))
+        for _name, _ofport, vif_id, net in ports)
+    vif_ids = set(bindings)
+
+    def port_diff():
+        new_bindings = set((p, bindings.get(p), bindings.get(p))
+                           for p in vif_ids)
+        return set([b for b in new_bindings if b[2] != b[1]])
+
+    old_state = ovs_quantum_agent.get_binding_state(bindings)
+
+    def tuple_diff():
+        new_state = ovs_quantum_agent.get_binding_state(bindings)
+        return vif_ids.intersection(
+            vif_id for vif_id, _state in
+            new_state.symmetric_difference(old_state))
+
+    old = min(timeit.repeat(port_diff, number=1, repeat=3))
+    new = min(timeit.repeat(tuple_diff, number=1, repeat=3))
+    print "idle cycle diff:           Port %6.3fs  tuple %5.3fs" % (old, new)
+
+
+def main(argv):
+    networks = int(argv[1]) if len(argv) > 1 else 200
+    vifs = int(argv[2]) if len(argv) > 2 else 20
+    ports = make_ports(networks, vifs)
+    print "%d networks, %d VIFs" % (networks, len(ports))
+    bench_memory(ports)
+    bench_unbind(ports, vifs)
+    bench_diff(ports)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
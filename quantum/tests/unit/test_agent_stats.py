@@ -0,0 +1,120 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2012 OpenStack LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+import unittest
+
+import mock
+
+from quantum.agent import stats
+from quantum.agent.linux import utils
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CycleStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.timer = FakeTimer()
+        self.sink = mock.Mock()
+        self.stats = stats.CycleStats(2, report_interval=10, sink=self.sink,
+                                      timer=self.timer)
+
+    def _cycle(self, db=0.5, wire=0.25, added=0):
+        self.stats.start()
+        with self.stats.phase('db'):
+            self.timer.now += db
+        with self.stats.phase('wire'):
+            self.timer.now += wire
+        self.stats.count('added', added)
+        self.stats.finish()
+
+    def test_cycle(self):
+        with mock.patch.object(utils, 'get_execute_counts') as counts:
+            counts.side_effect = [{'forked': 3, 'daemon': 0},
+                                  {'forked': 7, 'daemon': 0}]
+            self.stats.start()
+            for _i in range(2):
+                with self.stats.phase('db'):
+                    self.timer.now += 0.5
+            self.stats.count('added')
+            self.stats.count('added', 2)
+            self.stats.finish()
+        self.sink.send.assert_called_once_with(
+            {'db': 1.0, 'cycle': 1.0},
+            {'added': 3, 'forked': 4, 'daemon': 0})
+
+    def test_phase_timed_on_error(self):
+        def fail():
+            with self.stats.phase('db'):
+                self.timer.now += 1
+                raise ValueError()
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(self.stats.timers, {'db': 1})
+
+    def test_overrun_logged(self):
+        with mock.patch.object(stats.LOG, 'warning') as warning:
+            self._cycle()
+            self.assertFalse(warning.called)
+            self._cycle(db=2)
+            self.assertTrue(warning.called)
+        self.assertEqual(self.stats.window_overruns, 1)
+
+    def test_report(self):
+        with mock.patch.object(stats.LOG, 'info') as info:
+            self._cycle(added=1)
+            self.timer.now += 4
+            self._cycle(db=1.5, added=2)
+            self.assertFalse(info.called)
+            self.timer.now += 4
+            self._cycle(db=1, added=3)
+            self.assertEqual(info.call_count, 1)
+        message = info.call_args[0][0]
+        self.assertTrue(message.startswith('3 cycles in 11s, 0 longer'))
+        self.assertTrue('cycle=1.250s' in message)
+        self.assertTrue('max=1.750s' in message)
+        self.assertTrue('added=6' in message)
+        self.assertEqual(self.stats.window_cycles, 0)
+
+
+class StatsdSinkTest(unittest.TestCase):
+
+    def test_send(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(('127.0.0.1', 0))
+        self.addCleanup(server.close)
+        sink = stats.StatsdSink('127.0.0.1', server.getsockname()[1],
+                                'quantum.agent.host.ovs')
+        sink.send({'cycle': 0.25}, {'added': 2})
+        self.assertEqual(server.recv(1024),
+                         'quantum.agent.host.ovs.cycle:250|ms\n'
+                         'quantum.agent.host.ovs.added:2|c')
+
+    def test_create_stats(self):
+        self.assertEqual(stats.create_stats('ovs', 2).sink, None)
+        with mock.patch.object(socket, 'gethostname',
+                               return_value='compute1.example.com'):
+            cycle_stats = stats.create_stats('ovs', 2,
+                                             statsd_host='127.0.0.1')
+        self.assertEqual(cycle_stats.sink.prefix,
+                         'quantum.agent.compute1.ovs')
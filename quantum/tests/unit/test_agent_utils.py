@@ -15,6 +15,10 @@
 #    under the License.
 # @author: Dan Wendlandt, Nicira, Inc.
 
+import os
+import shutil
+import tempfile
+import time
 import unittest
 
 from quantum.agent.linux import utils
@@ -52,3 +56,50 @@ class AgentUtilsExecuteTest(unittest.TestCase):
         result = utils.execute(["cat"], process_input="%s\n" %
                                self.test_file[:-1])
         self.assertEqual(result, "%s\n" % self.test_file[:-1])
+
+    def test_timeout(self):
+        start = time.time()
+        self.assertRaises(RuntimeError, utils.execute, ["sleep", "5"],
+                          timeout=0.1)
+        self.assertTrue(time.time() - start < 5)
+        self.assertEqual(utils.execute(["echo", "-n", "fast"], timeout=5),
+                         "fast")
+
+    def test_execute_counts(self):
+        before = utils.get_execute_counts()
+        utils.execute(["true"])
+        utils.execute(["true"], self.root_helper)
+        after = utils.get_execute_counts()
+        self.assertEqual(after['forked'] - before['forked'], 2)
+        self.assertEqual(after['daemon'], before['daemon'])
+
+
+class AgentUtilsExecuteManyTest(unittest.TestCase):
+    def test_results_in_order(self):
+        cmds = [["sh", "-c", "sleep 0.%d; echo -n %d" % (3 - i, i)]
+                for i in range(4)]
+        self.assertEqual(utils.execute_many(cmds, max_workers=4),
+                         ["0", "1", "2", "3"])
+
+    def test_concurrent(self):
+        start = time.time()
+        utils.execute_many([["sleep", "0.5"]] * 4, max_workers=4)
+        self.assertTrue(time.time() - start < 1.5)
+
+    def test_first_error_raised_after_all_ran(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        test_file = os.path.join(tmpdir, "test_execute_many.tmp")
+        cmds = [["ls", test_file + "-missing"],
+                ["sh", "-c", "sleep 0.2; touch %s" % test_file]]
+        self.assertRaises(RuntimeError, utils.execute_many, cmds)
+        self.assertEqual(utils.execute(["ls", test_file]),
+                         "%s\n" % test_file)
+
+    def test_check_exit_code(self):
+        self.assertEqual(utils.execute_many([["false"], ["echo", "-n", "x"]],
+                                            check_exit_code=False),
+                         ["", "x"])
+
+    def test_empty(self):
+        self.assertEqual(utils.execute_many([]), [])
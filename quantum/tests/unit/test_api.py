@@ -275,6 +275,13 @@ class APIFiltersTest(test_api.AbstractAPITest):
         self.assertEqual(len(network_data['networks']), 1)
         self.assertEqual(network_data['networks'][0]['id'], self.net1_id)
 
+    def test_network_unknown_filter_ignored(self):
+        flt = "name=test-1&unknown=value"
+        network_data = self._do_filtered_network_list_request(flt)
+        # Check network count: should return 1
+        self.assertEqual(len(network_data['networks']), 1)
+        self.assertEqual(network_data['networks'][0]['id'], self.net1_id)
+
     def test_port_state_filter(self):
         # First filter for 'ACTIVE' ports in 1st network
         flt = "state=ACTIVE"
@@ -340,6 +347,13 @@ class APIFiltersTest(test_api.AbstractAPITest):
         # Check port count: should return 2
         self.assertEqual(len(port_data['ports']), 2)
 
+    def test_port_unknown_filter_ignored(self):
+        flt = "state=DOWN&unknown=value"
+        port_data = self._do_filtered_port_list_request(flt, self.net1_id)
+        # Check port count: should return 1
+        self.assertEqual(len(port_data['ports']), 1)
+        self.assertEqual(port_data['ports'][0]['id'], self.port12_id)
+
 
 class APIRootTest(unittest.TestCase):
     def setUp(self):
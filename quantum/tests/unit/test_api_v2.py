@@ -353,6 +353,112 @@ class APIv2TestCase(unittest.TestCase):
                                                       fields=['foo'],
                                                       verbose=True)
 
+    def test_limit(self):
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = []
+
+        self.api.get(_get_path('networks'), {'limit': '10'})
+        instance.get_networks.assert_called_once_with(mock.ANY,
+                                                      filters={},
+                                                      fields=mock.ANY,
+                                                      verbose=mock.ANY,
+                                                      limit=10,
+                                                      marker=None)
+
+    def test_limit_with_marker(self):
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = []
+        marker = str(uuid.uuid4())
+
+        self.api.get(_get_path('networks'), {'limit': '10',
+                                             'marker': marker})
+        instance.get_networks.assert_called_once_with(mock.ANY,
+                                                      filters={},
+                                                      fields=mock.ANY,
+                                                      verbose=mock.ANY,
+                                                      limit=10,
+                                                      marker=marker)
+
+    def test_limit_with_fields_adds_id(self):
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = [{'id': 'a', 'name': 'net1'}]
+
+        res = self.api.get(_get_path('networks'), {'limit': '1',
+                                                   'fields': 'name'})
+        instance.get_networks.assert_called_once_with(mock.ANY,
+                                                      filters={},
+                                                      fields=['name', 'id'],
+                                                      verbose=mock.ANY,
+                                                      limit=1,
+                                                      marker=None)
+        self.assertEqual(res.json['networks'], [{'name': 'net1'}])
+
+    def test_limit_invalid(self):
+        for value in ('foo', '0', '-1'):
+            res = self.api.get(_get_path('networks'), {'limit': value},
+                               expect_errors=True)
+            self.assertEqual(res.status_int, exc.HTTPBadRequest.code)
+
+    def test_limit_next_link(self):
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = [{'id': 'a'}, {'id': 'b'}]
+
+        res = self.api.get(_get_path('networks'), {'limit': '2',
+                                                   'name': 'net1'})
+        links = res.json['networks_links']
+        self.assertEqual(len(links), 1)
+        self.assertEqual(links[0]['rel'], 'next')
+        self.assertTrue('marker=b' in links[0]['href'])
+        self.assertTrue('limit=2' in links[0]['href'])
+        self.assertTrue('name=net1' in links[0]['href'])
+
+    def test_limit_last_page_no_link(self):
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = [{'id': 'a'}]
+
+        res = self.api.get(_get_path('networks'), {'limit': '2'})
+        self.assertTrue('networks_links' not in res.json)
+
+
+class APIv2MaxLimitTestCase(unittest.TestCase):
+    def setUp(self):
+        plugin = 'quantum.quantum_plugin_base_v2.QuantumPluginBaseV2'
+        self._plugin_patcher = mock.patch(plugin, autospec=True)
+        self.plugin = self._plugin_patcher.start()
+
+        api = router.APIRouter({'plugin_provider': plugin,
+                                'pagination_max_limit': '5'})
+        self.api = webtest.TestApp(api)
+
+    def tearDown(self):
+        self._plugin_patcher.stop()
+        self.api = None
+        self.plugin = None
+
+    def test_default_limit(self):
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = []
+
+        self.api.get(_get_path('networks'))
+        instance.get_networks.assert_called_once_with(mock.ANY,
+                                                      filters=mock.ANY,
+                                                      fields=mock.ANY,
+                                                      verbose=mock.ANY,
+                                                      limit=5,
+                                                      marker=None)
+
+    def test_limit_capped(self):
+        instance = self.plugin.return_value
+        instance.get_networks.return_value = []
+
+        self.api.get(_get_path('networks'), {'limit': '1000'})
+        instance.get_networks.assert_called_once_with(mock.ANY,
+                                                      filters=mock.ANY,
+                                                      fields=mock.ANY,
+                                                      verbose=mock.ANY,
+                                                      limit=5,
+                                                      marker=None)
+
 
 class JSONV2TestCase(APIv2TestCase):
     def test_list(self):
@@ -397,17 +503,22 @@ class JSONV2TestCase(APIv2TestCase):
         data = {'networks': [{'name': 'net1', 'admin_state_up': True},
                              {'name': 'net2', 'admin_state_up': True}]}
 
-        def side_effect(context, network):
-            nets = network.copy()
-            for net in nets['networks']:
+        def side_effect(context, networks):
+            nets = []
+            for net in networks['networks']:
+                net = net['network'].copy()
                 net.update({'subnets': []})
+                nets.append(net)
             return nets
 
         instance = self.plugin.return_value
-        instance.create_network.side_effect = side_effect
+        instance.create_network_bulk.side_effect = side_effect
 
         res = self.api.post_json(_get_path('networks'), data)
         self.assertEqual(res.status_int, exc.HTTPCreated.code)
+        self.assertEqual([n['name'] for n in res.json['networks']],
+                         ['net1', 'net2'])
+        self.assertFalse(instance.create_network.called)
 
     def test_create_bulk_no_networks(self):
         data = {'networks': []}
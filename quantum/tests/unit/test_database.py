@@ -22,6 +22,9 @@ that tests the database api method calls
 
 import unittest
 
+import mock
+
+from quantum.common import exceptions as q_exc
 from quantum.db import api as db
 from quantum.tests.unit import database_stubs as db_stubs
 
@@ -125,3 +128,84 @@ class QuantumDBTest(unittest.TestCase):
         self.dbtest.unplug_interface(net1["id"], port1["id"])
         port = self.dbtest.get_port(net1["id"], port1["id"])
         self.assertTrue(port[0]["attachment"] is None)
+
+
+class QuantumDBFiltersTest(unittest.TestCase):
+    """Class consisting of Quantum DB filter unit tests"""
+    def setUp(self):
+        """Setup for tests"""
+        db.configure_db({'sql_connection': 'sqlite:///:memory:'})
+        self.tenant_id = "t1"
+        self.net1 = db.network_create(self.tenant_id, "net1", op_status="UP")
+        self.net2 = db.network_create(self.tenant_id, "net2")
+        self.port11 = db.port_create(self.net1.uuid, "ACTIVE", op_status="UP")
+        self.port12 = db.port_create(self.net1.uuid, "DOWN", op_status="UP")
+        self.port21 = db.port_create(self.net2.uuid, "ACTIVE")
+        db.port_set_attachment(self.port11.uuid, self.net1.uuid, "vif1.1")
+
+    def tearDown(self):
+        """Tear Down"""
+        db.clear_db()
+
+    def _networks(self, **filter_opts):
+        return sorted(net.name for net in
+                      db.network_list(self.tenant_id, filter_opts))
+
+    def _ports(self, net_id, **filter_opts):
+        return sorted(port.uuid for port in
+                      db.port_list(net_id, filter_opts))
+
+    def test_network_filters(self):
+        self.assertEqual(self._networks(), ["net1", "net2"])
+        self.assertEqual(self._networks(name="net2"), ["net2"])
+        self.assertEqual(self._networks(**{"op-status": "UP"}), ["net1"])
+        self.assertEqual(self._networks(**{"port-state": "DOWN"}), ["net1"])
+        self.assertEqual(self._networks(**{"has-attachment": "True"}),
+                         ["net1"])
+        self.assertEqual(self._networks(**{"has-attachment": "false"}),
+                         ["net2"])
+        self.assertEqual(self._networks(attachment="vif1.1"), ["net1"])
+        self.assertEqual(self._networks(port=self.port21.uuid), ["net2"])
+        self.assertEqual(self._networks(name="net2", port=self.port11.uuid),
+                         [])
+        self.assertEqual(self._networks(verbose="True"), ["net1", "net2"])
+
+    def test_network_port_op_status_filter(self):
+        # NOTE(jkoelker) Ports which are not ACTIVE are reported DOWN
+        self.assertEqual(self._networks(**{"port-op-status": "UP"}),
+                         ["net1"])
+        self.assertEqual(self._networks(**{"port-op-status": "DOWN"}),
+                         ["net1"])
+        self.assertEqual(self._networks(**{"port-op-status": "UNKNOWN"}),
+                         ["net2"])
+
+    def test_port_filters(self):
+        net_id = self.net1.uuid
+        self.assertEqual(self._ports(net_id, state="ACTIVE"),
+                         [self.port11.uuid])
+        self.assertEqual(self._ports(net_id, **{"op-status": "DOWN"}),
+                         [self.port12.uuid])
+        self.assertEqual(self._ports(net_id, **{"has-attachment": "False"}),
+                         [self.port12.uuid])
+        self.assertEqual(self._ports(net_id, attachment="vif1.1",
+                                     state="ACTIVE"),
+                         [self.port11.uuid])
+        self.assertEqual(self._ports(net_id, attachment="vif1.2"), [])
+
+    def test_ports_get(self):
+        net_id = self.net1.uuid
+        port_ids = [self.port12.uuid, self.port11.uuid]
+        self.assertEqual([port.uuid for port in db.ports_get(port_ids,
+                                                             net_id)],
+                         port_ids)
+        self.assertEqual(db.ports_get([], net_id), [])
+        self.assertRaises(q_exc.PortNotFound, db.ports_get,
+                          [self.port11.uuid, self.port21.uuid], net_id)
+
+    def test_ports_get_batches(self):
+        ports = [db.port_create(self.net2.uuid, "ACTIVE") for _i in range(4)]
+        port_ids = [port.uuid for port in reversed(ports)]
+        with mock.patch.object(db, 'FETCH_BATCH_SIZE', 3):
+            self.assertEqual([port.uuid for port in
+                              db.ports_get(port_ids, self.net2.uuid)],
+                             port_ids)
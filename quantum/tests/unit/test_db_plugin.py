@@ -17,8 +17,13 @@ import logging
 import unittest
 import contextlib
 
+from sqlalchemy import event
+
 from quantum.api.v2.router import APIRouter
 from quantum.db import api as db
+from quantum.db import db_base_plugin_v2
+from quantum.db import mac_allocator
+from quantum.db import models_v2
 from quantum.tests.unit.testlib_api import create_request
 from quantum.wsgi import Serializer, JSONDeserializer
 
@@ -35,6 +40,10 @@ class QuantumDbPluginV2TestCase(unittest.TestCase):
         db._ENGINE = None
         db._MAKER = None
 
+        # NOTE(jkoelker) The reserved MAC blocks go away with the database
+        db_base_plugin_v2.QuantumDbPluginV2._mac_allocator = \
+            mac_allocator.MacAllocator()
+
         self._tenant_id = 'test-tenant'
 
         json_deserializer = JSONDeserializer()
@@ -104,10 +113,38 @@ class QuantumDbPluginV2TestCase(unittest.TestCase):
                                   gateway, prefix)
         return self.deserialize(fmt, res)
 
+    def _create_port(self, fmt, net_id, admin_state_up=True,
+                     device_id='dev_id_1', fixed_ips=None):
+        data = {'port': {'network_id': net_id,
+                         'admin_state_up': admin_state_up,
+                         'device_id': device_id}}
+        if fixed_ips is not None:
+            data['port']['fixed_ips'] = fixed_ips
+        port_req = self.new_create_request('ports', data, fmt)
+        return port_req.get_response(self.api)
+
     def _delete(self, collection, id):
         req = self.new_delete_request(collection, id)
         req.get_response(self.api)
 
+    @contextlib.contextmanager
+    def statements(self):
+        """Captures the SQL statements issued within the block"""
+        statements = []
+        capturing = [True]
+
+        def _capture(conn, cursor, statement, *args):
+            if capturing[0]:
+                statements.append(statement)
+
+        # NOTE(jkoelker) The engine is thrown away in tearDown, so the
+        #                listener is disabled rather than removed
+        event.listen(db._ENGINE, 'before_cursor_execute', _capture)
+        try:
+            yield statements
+        finally:
+            capturing[0] = False
+
     @contextlib.contextmanager
     def network(self, name='net1', admin_status_up=True, fmt='json'):
         res = self._create_network(fmt, name, admin_status_up)
@@ -115,6 +152,14 @@ class QuantumDbPluginV2TestCase(unittest.TestCase):
         yield network
         self._delete('networks', network['network']['id'])
 
+    @contextlib.contextmanager
+    def port(self, network, fmt='json', fixed_ips=None):
+        res = self._create_port(fmt, network['network']['id'],
+                                fixed_ips=fixed_ips)
+        port = self.deserialize(fmt, res)
+        yield port
+        self._delete('ports', port['port']['id'])
+
     @contextlib.contextmanager
     def subnet(self, network=None, gateway='10.0.0.1',
                prefix='10.0.0.0/24', fmt='json'):
@@ -237,6 +282,231 @@ class TestV2HTTPResponse(QuantumDbPluginV2TestCase):
 #        self.assertEquals(res.status_int, 404)
 
 
+class TestPortsV2(QuantumDbPluginV2TestCase):
+    def test_list_ports_statement_count(self):
+        with self.network() as network:
+            with self.port(network):
+                req = self.new_list_request('ports')
+                with self.statements() as one:
+                    req.get_response(self.api)
+                with self.port(network):
+                    with self.port(network):
+                        req = self.new_list_request('ports')
+                        with self.statements() as many:
+                            res = self.deserialize(
+                                'json', req.get_response(self.api))
+
+        self.assertEquals(len(res['ports']), 3)
+        # NOTE(jkoelker) One statement for the ports and one for their
+        #                fixed_ips, no matter how many ports
+        self.assertEquals(len(one), 2)
+        self.assertEquals(len(many), len(one))
+
+    def test_create_ports_bulk(self):
+        with self.network() as network:
+            net_id = network['network']['id']
+            data = {'ports': [{'network_id': net_id,
+                               'admin_state_up': True,
+                               'device_id': 'dev_id_%d' % i}
+                              for i in range(3)]}
+            req = self.new_create_request('ports', data)
+            with self.statements() as statements:
+                res = req.get_response(self.api)
+            self.assertEquals(res.status_int, 201)
+            ports = self.deserialize('json', res)['ports']
+            self.assertEquals([p['device_id'] for p in ports],
+                              ['dev_id_0', 'dev_id_1', 'dev_id_2'])
+            inserts = [s for s in statements
+                       if s.startswith('INSERT INTO ports')]
+            self.assertEquals(len(inserts), 1)
+            for port in ports:
+                self._delete('ports', port['id'])
+
+    def test_create_ports_bulk_network_not_found(self):
+        with self.network() as network:
+            data = {'ports': [{'network_id': network['network']['id'],
+                               'admin_state_up': True,
+                               'device_id': 'dev_id_1'},
+                              {'network_id': 'bogus',
+                               'admin_state_up': True,
+                               'device_id': 'dev_id_2'}]}
+            res = self.new_create_request('ports', data).get_response(
+                self.api)
+            self.assertEquals(res.status_int, 404)
+
+            req = self.new_list_request('ports')
+            res = self.deserialize('json', req.get_response(self.api))
+            self.assertEquals(res['ports'], [])
+
+    def test_create_ports_unique_macs(self):
+        with self.network() as network:
+            net_id = network['network']['id']
+            size = mac_allocator.BLOCK_SIZE + 10
+            data = {'ports': [{'network_id': net_id,
+                               'admin_state_up': True,
+                               'device_id': 'dev_id'}] * size}
+            res = self.new_create_request('ports', data).get_response(
+                self.api)
+            ports = self.deserialize('json', res)['ports']
+            macs = set(p['mac_address'] for p in ports)
+            self.assertEquals(len(macs), size)
+
+            with self.statements() as statements:
+                self._create_port('json', net_id)
+            self.assertFalse([s for s in statements
+                              if 'macaddressblocks' in s])
+
+    def test_create_port_mac_in_use(self):
+        with self.network() as network:
+            data = {'port': {'network_id': network['network']['id'],
+                             'admin_state_up': True,
+                             'device_id': 'dev_id',
+                             'mac_address': '00:16:3e:00:00:01'}}
+            res = self.new_create_request('ports', data).get_response(
+                self.api)
+            self.assertEquals(res.status_int, 201)
+            res = self.new_create_request('ports', data).get_response(
+                self.api)
+            self.assertEquals(res.status_int, 409)
+
+    def test_create_port_mac_in_allocator_range(self):
+        with self.network() as network:
+            net_id = network['network']['id']
+            # NOTE(jkoelker) The first address the allocator hands out
+            mac = mac_allocator.BASE_MAC
+            data = {'port': {'network_id': net_id,
+                             'admin_state_up': True,
+                             'device_id': 'dev_id',
+                             'mac_address': mac}}
+            res = self.new_create_request('ports', data).get_response(
+                self.api)
+            self.assertEquals(res.status_int, 400)
+
+            port = self.deserialize('json',
+                                    self._create_port('json', net_id))
+            self.assertEquals(port['port']['mac_address'], mac)
+
+    def test_mac_allocator_blocks_do_not_overlap(self):
+        allocator1 = mac_allocator.MacAllocator(block_size=4)
+        allocator2 = mac_allocator.MacAllocator(block_size=4)
+        macs = allocator1.allocate(3) + allocator2.allocate(3)
+        macs.extend(allocator1.allocate(3))
+        self.assertEquals(len(set(macs)), 9)
+        self.assertEquals(macs[:3], ['02:16:3e:00:00:00',
+                                     '02:16:3e:00:00:01',
+                                     '02:16:3e:00:00:02'])
+        self.assertEquals(macs[3], '02:16:3e:00:00:04')
+
+    def _free_ranges(self):
+        session = db.get_session()
+        ranges = session.query(models_v2.IPAvailabilityRange).all()
+        return sorted((int(r.first_ip, 16), int(r.last_ip, 16))
+                      for r in ranges)
+
+    def test_create_port_allocates_ip(self):
+        with self.subnet() as subnet:
+            network = {'network': {'id': subnet['subnet']['network_id']}}
+            with self.port(network) as port1:
+                with self.port(network) as port2:
+                    self.assertEquals(port1['port']['fixed_ips'],
+                                      ['10.0.0.2'])
+                    self.assertEquals(port2['port']['fixed_ips'],
+                                      ['10.0.0.3'])
+
+    def test_delete_port_releases_ip(self):
+        with self.subnet() as subnet:
+            net_id = subnet['subnet']['network_id']
+            port1 = self.deserialize('json', self._create_port('json',
+                                                               net_id))
+            port2 = self.deserialize('json', self._create_port('json',
+                                                               net_id))
+            self._delete('ports', port1['port']['id'])
+            self.assertEquals(len(self._free_ranges()), 2)
+
+            port3 = self.deserialize('json', self._create_port('json',
+                                                               net_id))
+            self.assertEquals(port3['port']['fixed_ips'], ['10.0.0.2'])
+            self.assertEquals(len(self._free_ranges()), 1)
+
+            self._delete('ports', port2['port']['id'])
+            self._delete('ports', port3['port']['id'])
+            self.assertEquals(self._free_ranges(),
+                              [(0x0a000002, 0x0a0000fe)])
+
+    def test_create_port_specific_ip(self):
+        with self.subnet() as subnet:
+            network = {'network': {'id': subnet['subnet']['network_id']}}
+            fixed_ips = [{'subnet': subnet['subnet']['id'],
+                          'address': '10.0.0.10'}]
+            with self.port(network, fixed_ips=fixed_ips) as port:
+                self.assertEquals(port['port']['fixed_ips'], ['10.0.0.10'])
+                res = self._create_port('json',
+                                        subnet['subnet']['network_id'],
+                                        fixed_ips=fixed_ips)
+                self.assertEquals(res.status_int, 409)
+                self.assertEquals(len(self._free_ranges()), 2)
+            self.assertEquals(len(self._free_ranges()), 1)
+
+    def test_create_port_gateway_ip_unavailable(self):
+        with self.subnet() as subnet:
+            fixed_ips = [{'subnet': subnet['subnet']['id'],
+                          'address': '10.0.0.1'}]
+            res = self._create_port('json', subnet['subnet']['network_id'],
+                                    fixed_ips=fixed_ips)
+            self.assertEquals(res.status_int, 409)
+
+    def test_create_port_subnet_exhausted(self):
+        with self.subnet(gateway='10.0.0.1', prefix='10.0.0.0/30') as subnet:
+            network = {'network': {'id': subnet['subnet']['network_id']}}
+            with self.port(network) as port:
+                self.assertEquals(port['port']['fixed_ips'], ['10.0.0.2'])
+                res = self._create_port('json',
+                                        subnet['subnet']['network_id'])
+                self.assertEquals(res.status_int, 409)
+
+    def test_create_ports_bulk_allocates_ips(self):
+        with self.subnet() as subnet:
+            data = {'ports': [{'network_id': subnet['subnet']['network_id'],
+                               'admin_state_up': True,
+                               'device_id': 'dev_id_%d' % i}
+                              for i in range(3)]}
+            res = self.new_create_request('ports', data).get_response(
+                self.api)
+            ports = self.deserialize('json', res)['ports']
+            self.assertEquals([p['fixed_ips'] for p in ports],
+                              [['10.0.0.2'], ['10.0.0.3'], ['10.0.0.4']])
+            for port in ports:
+                self._delete('ports', port['id'])
+
+    def test_allocation_is_constant_time(self):
+        """Allocating from a /16 does not depend on how full it is"""
+        with self.subnet(gateway='10.1.0.1', prefix='10.1.0.0/16') as subnet:
+            self.assertEquals(self._free_ranges(),
+                              [(0x0a010002, 0x0a01fffe)])
+            net_id = subnet['subnet']['network_id']
+
+            with self.statements() as first:
+                self._create_port('json', net_id)
+
+            data = {'ports': [{'network_id': net_id,
+                               'admin_state_up': True,
+                               'device_id': 'dev_id'}] * 500}
+            self.new_create_request('ports', data).get_response(self.api)
+
+            with self.statements() as last:
+                res = self._create_port('json', net_id)
+            port = self.deserialize('json', res)
+            self.assertEquals(port['port']['fixed_ips'], ['10.1.1.247'])
+
+            # NOTE(jkoelker) Ignore the occasional MAC block reservation
+            first = [s for s in first if 'macaddressblocks' not in s]
+            last = [s for s in last if 'macaddressblocks' not in s]
+            self.assertEquals(len(first), len(last))
+            self.assertFalse([s for s in last if 'ipallocations' in s and
+                              s.startswith('SELECT')])
+            self.assertEquals(len(self._free_ranges()), 1)
+
+
 class TestNetworksV2(QuantumDbPluginV2TestCase):
     # NOTE(cerberus): successful network update and delete are
     #                 effectively tested above
@@ -259,6 +529,102 @@ class TestNetworksV2(QuantumDbPluginV2TestCase):
                 self.assertEquals(res['networks'][1]['name'],
                                   net2['network']['name'])
 
+    def test_list_networks_with_pagination(self):
+        with self.network(name='net1') as net1:
+            with self.network(name='net2') as net2:
+                with self.network(name='net3') as net3:
+                    ids = sorted([net1['network']['id'],
+                                  net2['network']['id'],
+                                  net3['network']['id']])
+
+                    req = self._req('GET', 'networks')
+                    req.GET['limit'] = '2'
+                    res = self.deserialize('json',
+                                           req.get_response(self.api))
+                    self.assertEquals([n['id'] for n in res['networks']],
+                                      ids[:2])
+                    self.assertEquals(len(res['networks_links']), 1)
+
+                    req = self._req('GET', 'networks')
+                    req.GET['limit'] = '2'
+                    req.GET['marker'] = ids[1]
+                    res = self.deserialize('json',
+                                           req.get_response(self.api))
+                    self.assertEquals([n['id'] for n in res['networks']],
+                                      ids[2:])
+                    self.assertTrue('networks_links' not in res)
+
+    def test_list_networks_with_fields(self):
+        with self.network(name='net1'):
+            req = self._req('GET', 'networks')
+            req.GET['fields'] = 'name'
+            with self.statements() as statements:
+                res = self.deserialize('json', req.get_response(self.api))
+
+            self.assertEquals(res['networks'], [{'name': 'net1'}])
+            selects = [s for s in statements if 'FROM networks' in s]
+            self.assertEquals(len(selects), 1)
+            self.assertTrue('networks.name' in selects[0])
+            self.assertTrue('networks.op_status' not in selects[0])
+            self.assertFalse([s for s in statements if 'FROM subnets' in s])
+
+    def _list_statement_count(self, resource):
+        req = self.new_list_request(resource)
+        with self.statements() as statements:
+            res = self.deserialize('json', req.get_response(self.api))
+        return len(res[resource]), len(statements)
+
+    def test_list_networks_statement_count(self):
+        with self.network() as net1:
+            with self.subnet(network=net1):
+                one, one_count = self._list_statement_count('networks')
+                with self.network() as net2:
+                    with self.subnet(network=net2):
+                        with self.network():
+                            many, many_count = \
+                                self._list_statement_count('networks')
+
+        self.assertEquals((one, many), (1, 3))
+        # NOTE(jkoelker) One statement for the networks and one for
+        #                their subnets, no matter how many networks
+        self.assertEquals(one_count, 2)
+        self.assertEquals(many_count, one_count)
+
+    def test_list_networks_subnets_batched(self):
+        with self.network() as net1:
+            with self.subnet(network=net1) as subnet1:
+                with self.network() as net2:
+                    with self.subnet(network=net2,
+                                     prefix='10.0.1.0/24') as subnet2:
+                        req = self.new_list_request('networks')
+                        res = self.deserialize('json',
+                                               req.get_response(self.api))
+
+        subnets = dict((n['id'], n['subnets']) for n in res['networks'])
+        self.assertEquals(subnets[net1['network']['id']],
+                          [subnet1['subnet']['id']])
+        self.assertEquals(subnets[net2['network']['id']],
+                          [subnet2['subnet']['id']])
+
+    def test_show_network_with_fields(self):
+        with self.network(name='net1') as net:
+            req = self._req('GET', 'networks', id=net['network']['id'])
+            req.GET['fields'] = 'subnets'
+            res = self.deserialize('json', req.get_response(self.api))
+            self.assertEquals(res['network'], {'subnets': []})
+
+    def test_create_networks_bulk(self):
+        data = {'networks': [{'name': 'net1', 'admin_state_up': True},
+                             {'name': 'net2', 'admin_state_up': True}]}
+        res = self.new_create_request('networks', data).get_response(
+            self.api)
+        self.assertEquals(res.status_int, 201)
+        nets = self.deserialize('json', res)['networks']
+        self.assertEquals([n['name'] for n in nets], ['net1', 'net2'])
+        for net in nets:
+            self.assertEquals(net['subnets'], [])
+            self._delete('networks', net['id'])
+
     def test_show_network(self):
         with self.network(name='net1') as net:
             req = self.new_show_request('networks', net['network']['id'])
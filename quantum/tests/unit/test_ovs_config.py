@@ -38,6 +38,9 @@ local_ip = 10.0.0.3
 [AGENT]
 root_helper = mysudo
 polling_interval=50
+warm_restart = True
+stats_interval = 300
+statsd_host = statsd.example.com
 """
 
         (fd, path) = tempfile.mkstemp(prefix='ovs_config', suffix='.ini')
@@ -54,6 +57,10 @@ polling_interval=50
             self.assertEqual(100, conf.DATABASE.reconnect_interval)
             self.assertEqual(50, conf.AGENT.polling_interval)
             self.assertEqual('mysudo', conf.AGENT.root_helper)
+            self.assertTrue(conf.AGENT.warm_restart)
+            self.assertEqual(300, conf.AGENT.stats_interval)
+            self.assertEqual('statsd.example.com', conf.AGENT.statsd_host)
+            self.assertEqual(8125, conf.AGENT.statsd_port)
         finally:
             os.remove(path)
 
@@ -75,6 +82,9 @@ polling_interval=50
             self.assertEqual(2, conf.DATABASE.reconnect_interval)
             self.assertEqual(2, conf.AGENT.polling_interval)
             self.assertEqual('sudo', conf.AGENT.root_helper)
+            self.assertFalse(conf.AGENT.warm_restart)
+            self.assertEqual(60, conf.AGENT.stats_interval)
+            self.assertEqual(None, conf.AGENT.statsd_host)
         finally:
             os.remove(path)
 
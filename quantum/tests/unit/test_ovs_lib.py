@@ -21,6 +21,7 @@ import uuid
 import mox
 
 from quantum.agent.linux import ovs_lib, utils
+from quantum.openstack.common import jsonutils
 
 
 class OVS_Lib_Test(unittest.TestCase):
@@ -133,6 +134,46 @@ class OVS_Lib_Test(unittest.TestCase):
                              (vid, ofport))
         self.mox.VerifyAll()
 
+    def test_deferred_flows(self):
+        ofport = "5"
+        utils.execute(["ovs-ofctl", "del-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="in_port=%s\ndl_vlan=4\n" % ofport)
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="hard_timeout=0,idle_timeout=0,"
+                                    "priority=2,in_port=%s,actions=drop\n"
+                                    "hard_timeout=0,idle_timeout=0,"
+                                    "priority=1,actions=normal\n" % ofport)
+        utils.execute(["ovs-ofctl", "mod-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="in_port=%s,actions=normal\n" % ofport)
+        self.mox.ReplayAll()
+
+        with self.br.deferred_flows():
+            self.br.delete_flows(in_port=ofport)
+            with self.br.deferred_flows():
+                self.br.delete_flows(dl_vlan=4)
+            self.br.add_flow(priority=2, in_port=ofport, actions="drop")
+            self.br.add_flow(priority=1, actions="normal")
+            self.br.mod_flow(in_port=ofport, actions="normal")
+        self.mox.VerifyAll()
+
+    def test_deferred_flows_flushed_before_other_commands(self):
+        utils.execute(["ovs-ofctl", "add-flows", self.BR_NAME, "-"],
+                      root_helper=self.root_helper,
+                      process_input="hard_timeout=0,idle_timeout=0,"
+                                    "priority=1,actions=normal\n")
+        utils.execute(["ovs-ofctl", "dump-flows", self.BR_NAME],
+                      root_helper=self.root_helper).AndReturn(
+                          "ignore\nflow-1\n")
+        self.mox.ReplayAll()
+
+        with self.br.deferred_flows():
+            self.br.add_flow(priority=1, actions="normal")
+            self.assertEqual(self.br.count_flows(), 1)
+        self.mox.VerifyAll()
+
     def test_get_port_ofport(self):
         pname = "tap99"
         ofport = "6"
@@ -176,18 +217,15 @@ class OVS_Lib_Test(unittest.TestCase):
         ip = "9.9.9.9"
         ofport = "6"
 
-        utils.execute(["ovs-vsctl", self.TO, "add-port",
-                      self.BR_NAME, pname], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                      pname, "type=gre"], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                      pname, "options:remote_ip=" + ip],
-                      root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                      pname, "options:in_key=flow"],
-                      root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                      pname, "options:out_key=flow"],
+        utils.execute(["ovs-vsctl", self.TO,
+                       "--", "add-port", self.BR_NAME, pname,
+                       "--", "set", "Interface", pname, "type=gre",
+                       "--", "set", "Interface", pname,
+                       "options:remote_ip=" + ip,
+                       "--", "set", "Interface", pname,
+                       "options:in_key=flow",
+                       "--", "set", "Interface", pname,
+                       "options:out_key=flow"],
                       root_helper=self.root_helper)
         utils.execute(["ovs-vsctl", self.TO, "get",
                       "Interface", pname, "ofport"],
@@ -197,17 +235,84 @@ class OVS_Lib_Test(unittest.TestCase):
         self.assertEqual(self.br.add_tunnel_port(pname, ip), ofport)
         self.mox.VerifyAll()
 
+    def test_create_bridge(self):
+        utils.execute(["ovs-vsctl", self.TO, "--", "--may-exist", "add-br",
+                       self.BR_NAME], root_helper=self.root_helper)
+        self.mox.ReplayAll()
+
+        self.br.create_bridge()
+        self.mox.VerifyAll()
+
+    def test_get_tunnel_ports(self):
+        interfaces = {"headings": ["name", "ofport", "type", "options"],
+                      "data": [["patch-int", 1, "patch",
+                                ["map", [["peer", "patch-tun"]]]],
+                               ["gre-0a000002", 2, "gre",
+                                ["map", [["in_key", "flow"],
+                                         ["remote_ip", "10.0.0.2"]]]],
+                               ["gre-0a000003", ["set", []], "gre",
+                                ["map", [["remote_ip", "10.0.0.3"]]]]]}
+        utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
+                      root_helper=self.root_helper).AndReturn(
+                          "patch-int\ngre-0a000002\ngre-0a000003\n")
+        utils.execute(["ovs-vsctl", self.TO, "--format=json",
+                       "--columns=name,ofport,type,options",
+                       "list", "Interface", "patch-int", "gre-0a000002",
+                       "gre-0a000003"],
+                      root_helper=self.root_helper).AndReturn(
+                          jsonutils.dumps(interfaces))
+        self.mox.ReplayAll()
+
+        self.assertEqual(self.br.get_tunnel_ports(),
+                         {"10.0.0.2": ("gre-0a000002", "2"),
+                          "10.0.0.3": ("gre-0a000003", None)})
+        self.mox.VerifyAll()
+
+    def test_dump_flows(self):
+        utils.execute(["ovs-ofctl", "dump-flows", self.BR_NAME],
+                      root_helper=self.root_helper).AndReturn(
+                          "NXST_FLOW reply (xid=0x4):\n"
+                          " cookie=0x0, duration=5.1s, table=0, "
+                          "n_packets=0, n_bytes=0, priority=3,tun_id=0x2a "
+                          "actions=mod_vlan_vid:5,output:1\n"
+                          " cookie=0x0, duration=5.2s, table=0, "
+                          "n_packets=2, n_bytes=84, priority=1,arp "
+                          "actions=drop\n")
+        self.mox.ReplayAll()
+
+        flows = self.br.dump_flows()
+        self.assertEqual([actions for match, actions in flows],
+                         ["mod_vlan_vid:5,output:1", "drop"])
+        self.assertEqual(flows[0][0]["tun_id"], "0x2a")
+        self.assertEqual(flows[0][0]["priority"], "3")
+        self.assertTrue("arp" in flows[1][0])
+        self.assertEqual(flows[1][0]["arp"], None)
+        self.mox.VerifyAll()
+
+    def test_get_port_tags(self):
+        ports = {"headings": ["name", "tag"],
+                 "data": [["tap1", 5], ["tap2", ["set", []]]]}
+        utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
+                      root_helper=self.root_helper).AndReturn("tap1\ntap2\n")
+        utils.execute(["ovs-vsctl", self.TO, "--format=json",
+                       "--columns=name,tag", "list", "Port", "tap1", "tap2"],
+                      root_helper=self.root_helper).AndReturn(
+                          jsonutils.dumps(ports))
+        self.mox.ReplayAll()
+
+        self.assertEqual(self.br.get_port_tags(), {"tap1": 5, "tap2": None})
+        self.mox.VerifyAll()
+
     def test_add_patch_port(self):
         pname = "tap99"
         peer = "bar10"
         ofport = "6"
 
-        utils.execute(["ovs-vsctl", self.TO, "add-port",
-                      self.BR_NAME, pname], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set", "Interface",
-                      pname, "type=patch"], root_helper=self.root_helper)
-        utils.execute(["ovs-vsctl", self.TO, "set",
-                      "Interface", pname, "options:peer=" + peer],
+        utils.execute(["ovs-vsctl", self.TO,
+                       "--", "add-port", self.BR_NAME, pname,
+                       "--", "set", "Interface", pname, "type=patch",
+                       "--", "set", "Interface", pname,
+                       "options:peer=" + peer],
                       root_helper=self.root_helper)
         utils.execute(["ovs-vsctl", self.TO, "get",
                       "Interface", pname, "ofport"],
@@ -217,6 +322,53 @@ class OVS_Lib_Test(unittest.TestCase):
         self.assertEqual(self.br.add_patch_port(pname, peer), ofport)
         self.mox.VerifyAll()
 
+    def test_vsctl_transaction(self):
+        pname = "tap99"
+        utils.execute(["ovs-vsctl", self.TO,
+                       "--", "set", "Port", pname, "tag=5",
+                       "--", "clear", "Port", pname, "other_config",
+                       "--", "--if-exists", "del-port", self.BR_NAME,
+                       "tap5"],
+                      root_helper=self.root_helper)
+        self.mox.ReplayAll()
+
+        with self.br.vsctl_transaction():
+            self.br.set_db_attribute("Port", pname, "tag", "5")
+            with self.br.vsctl_transaction():
+                self.br.clear_db_attribute("Port", pname, "other_config")
+            self.br.delete_port("tap5")
+        self.mox.VerifyAll()
+
+    def test_vsctl_transaction_flushes_before_read(self):
+        pname = "tap99"
+        utils.execute(["ovs-vsctl", self.TO, "set", "Port", pname, "tag=5"],
+                      root_helper=self.root_helper)
+        utils.execute(["ovs-vsctl", self.TO, "get",
+                       "Interface", pname, "ofport"],
+                      root_helper=self.root_helper).AndReturn("6")
+        utils.execute(["ovs-vsctl", self.TO, "clear", "Port", pname, "tag"],
+                      root_helper=self.root_helper)
+        self.mox.ReplayAll()
+
+        with self.br.vsctl_transaction():
+            self.br.set_db_attribute("Port", pname, "tag", "5")
+            self.assertEqual(self.br.get_port_ofport(pname), "6")
+            self.br.clear_db_attribute("Port", pname, "tag")
+        self.mox.VerifyAll()
+
+    def test_vsctl_transaction_flushed_on_error(self):
+        utils.execute(["ovs-vsctl", self.TO, "set", "Port", "tap99",
+                       "tag=5"], root_helper=self.root_helper)
+        self.mox.ReplayAll()
+
+        try:
+            with self.br.vsctl_transaction():
+                self.br.set_db_attribute("Port", "tap99", "tag", "5")
+                raise ValueError()
+        except ValueError:
+            pass
+        self.mox.VerifyAll()
+
     def _test_get_vif_ports(self, is_xen=False):
         pname = "tap99"
         ofport = "6"
@@ -227,22 +379,23 @@ class OVS_Lib_Test(unittest.TestCase):
                       root_helper=self.root_helper).AndReturn("%s\n" % pname)
 
         if is_xen:
-            external_ids = ('{xs-vif-uuid="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
+            external_ids = [["xs-vif-uuid", vif_id], ["attached-mac", mac]]
         else:
-            external_ids = ('{iface-id="%s", attached-mac="%s"}'
-                            % (vif_id, mac))
-
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                      "Interface", pname, "external_ids"],
-                      root_helper=self.root_helper).AndReturn(external_ids)
-        utils.execute(["ovs-vsctl", self.TO, "get",
-                      "Interface", pname, "ofport"],
-                      root_helper=self.root_helper).AndReturn(ofport)
+            external_ids = [["iface-id", vif_id], ["attached-mac", mac]]
+        interfaces = {"headings": ["name", "ofport", "external_ids"],
+                      "data": [[pname, int(ofport),
+                                ["map", external_ids]]]}
+
+        utils.execute(["ovs-vsctl", self.TO, "--format=json",
+                       "--columns=name,ofport,external_ids",
+                       "list", "Interface", pname],
+                      root_helper=self.root_helper).AndReturn(
+                          jsonutils.dumps(interfaces))
         if is_xen:
             utils.execute(["xe", "vif-param-get", "param-name=other-config",
                           "param-key=nicira-iface-id", "uuid=" + vif_id],
-                          root_helper=self.root_helper).AndReturn(vif_id)
+                          root_helper=self.root_helper, timeout=None,
+                          check_exit_code=True).AndReturn(vif_id)
         self.mox.ReplayAll()
 
         ports = self.br.get_vif_ports()
@@ -260,6 +413,38 @@ class OVS_Lib_Test(unittest.TestCase):
     def test_get_vif_ports_xen(self):
         self._test_get_vif_ports(True)
 
+    def test_get_vif_ports_skips_non_vifs(self):
+        interfaces = {"headings": ["name", "ofport", "external_ids"],
+                      "data": [["patch-tun", 1, ["map", []]],
+                               ["tap1", ["set", []],
+                                ["map", [["iface-id", "vif1"],
+                                         ["attached-mac", "mac1"]]]],
+                               ["tap2", 3,
+                                ["map", [["iface-id", "vif2"],
+                                         ["attached-mac", "mac2"]]]]]}
+        utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
+                      root_helper=self.root_helper).AndReturn(
+                          "patch-tun\ntap1\ntap2\n")
+        utils.execute(["ovs-vsctl", self.TO, "--format=json",
+                       "--columns=name,ofport,external_ids",
+                       "list", "Interface", "patch-tun", "tap1", "tap2"],
+                      root_helper=self.root_helper).AndReturn(
+                          jsonutils.dumps(interfaces))
+        self.mox.ReplayAll()
+
+        ports = self.br.get_vif_ports()
+        self.assertEqual([(p.port_name, p.ofport, p.vif_id) for p in ports],
+                         [("tap2", "3", "vif2")])
+        self.mox.VerifyAll()
+
+    def test_get_vif_ports_empty_bridge(self):
+        utils.execute(["ovs-vsctl", self.TO, "list-ports", self.BR_NAME],
+                      root_helper=self.root_helper).AndReturn("")
+        self.mox.ReplayAll()
+
+        self.assertEqual(self.br.get_vif_ports(), [])
+        self.mox.VerifyAll()
+
     def test_clear_db_attribute(self):
         pname = "tap77"
         utils.execute(["ovs-vsctl", self.TO, "clear", "Port",
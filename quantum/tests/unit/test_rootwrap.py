@@ -0,0 +1,180 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 Openstack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from quantum.rootwrap import filters
+from quantum.rootwrap import wrapper
+
+
+class RootwrapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.filters = [
+            filters.RegExpFilter("/bin/ls", "root", 'ls', '/[a-z]+'),
+            filters.CommandFilter("/usr/bin/foo_bar_not_exist", "root"),
+            filters.RegExpFilter("/bin/cat", "root", 'ca[t]', '/[a-z]+'),
+            filters.CommandFilter("/bin/cat", "root"),
+            filters.DnsmasqFilter("/usr/bin/dnsmasq", "root"),
+            ]
+        self.index = wrapper.FilterIndex(self.filters)
+
+    def test_index_keeps_unkeyed_filters_in_order(self):
+        self.assertEqual(self.index.get_candidates(['cat', '/etc']),
+                         self.filters[2:5])
+        self.assertEqual(self.index.get_candidates(['ls', '/etc']),
+                         [self.filters[0], self.filters[2],
+                          self.filters[4]])
+        self.assertEqual(self.index.get_candidates(['vi', '/etc']),
+                         self.filters[2:3] + self.filters[4:5])
+
+    def test_match_filter(self):
+        f = wrapper.match_filter(self.index, ['ls', '/root'])
+        self.assertTrue(f is self.filters[0])
+        f = wrapper.match_filter(self.index, ['cat', '/etc', '/root'])
+        self.assertTrue(f is self.filters[3])
+        f = wrapper.match_filter(self.filters, ['cat', '/etc'])
+        self.assertTrue(f is self.filters[2])
+        self.assertEqual(wrapper.match_filter(self.index, ['ls', '.']),
+                         None)
+
+    def test_missing_executable_falls_back(self):
+        f = wrapper.match_filter(self.index, ['foo_bar_not_exist'])
+        self.assertTrue(f is self.filters[1])
+
+    def test_regexp_compiled_once(self):
+        with mock.patch('re.compile') as compile:
+            f = filters.RegExpFilter("/bin/ls", "root", 'ls', '/[a-z]+')
+            f.match(['ls', '/root'])
+            f.match(['ls', '/etc'])
+        self.assertEqual(compile.call_count, 2)
+
+    def test_badly_formed_regexp(self):
+        f = filters.RegExpFilter("/bin/ls", "root", 'ls', '[')
+        self.assertFalse(f.match(['ls', '[']))
+        self.assertEqual(f.get_match_key(), 'ls')
+        f = filters.RegExpFilter("/bin/ls", "root", 'l.', '/')
+        self.assertEqual(f.get_match_key(), None)
+
+
+class FiltersCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmpdir, 'filters.cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cache_written_and_used(self):
+        filterlist = wrapper.load_filters(self.cache_path)
+        self.assertTrue(os.path.exists(self.cache_path))
+        self.assertEqual(os.stat(self.cache_path).st_mode & 0777, 0644)
+        with mock.patch.object(wrapper, '_import_filters') as import_filters:
+            cached = wrapper.load_filters(self.cache_path)
+        self.assertFalse(import_filters.called)
+        self.assertEqual([(f.__class__, f.exec_path) for f in cached],
+                         [(f.__class__, f.exec_path) for f in filterlist])
+
+    def test_stale_cache_ignored(self):
+        wrapper.load_filters(self.cache_path)
+        signature = [('quantum.rootwrap.filters', 0)]
+        with mock.patch.object(wrapper, '_filters_signature',
+                               return_value=signature):
+            with mock.patch.object(wrapper, '_import_filters',
+                                   return_value=[]) as import_filters:
+                self.assertEqual(wrapper.load_filters(self.cache_path), [])
+        self.assertTrue(import_filters.called)
+
+    def test_writable_cache_ignored(self):
+        wrapper.load_filters(self.cache_path)
+        os.chmod(self.cache_path, 0666)
+        with mock.patch.object(wrapper, '_import_filters',
+                               return_value=[]) as import_filters:
+            wrapper.load_filters(self.cache_path)
+        self.assertTrue(import_filters.called)
+
+    def test_symlinked_cache_ignored(self):
+        wrapper.load_filters(self.cache_path)
+        link_path = os.path.join(self.tmpdir, 'link.cache')
+        os.symlink(self.cache_path, link_path)
+        with mock.patch.object(wrapper, '_import_filters',
+                               return_value=[]) as import_filters:
+            wrapper.load_filters(link_path)
+        self.assertTrue(import_filters.called)
+
+    def test_writable_cache_dir_ignored(self):
+        wrapper.load_filters(self.cache_path)
+        os.chmod(self.tmpdir, 0777)
+        with mock.patch.object(wrapper, '_import_filters',
+                               return_value=[]) as import_filters:
+            wrapper.load_filters(self.cache_path)
+        self.assertTrue(import_filters.called)
+
+    def test_default_cache_path_used(self):
+        cache_path = os.path.join(self.tmpdir, 'quantum-rootwrap',
+                                  'filters.json')
+        with mock.patch.object(wrapper, 'FILTERS_CACHE', cache_path):
+            filterlist = wrapper.load_filters()
+            self.assertTrue(os.path.exists(cache_path))
+            self.assertEqual(os.stat(os.path.dirname(cache_path)).st_mode &
+                             0777, 0755)
+            with mock.patch.object(wrapper,
+                                   '_import_filters') as import_filters:
+                cached = wrapper.load_filters()
+        self.assertFalse(import_filters.called)
+        self.assertEqual(len(cached), len(filterlist))
+
+    def test_cached_filters_rebuilt(self):
+        filterlist = [filters.RegExpFilter("/bin/ls", "root", "ls", "/.*"),
+                      filters.KillFilter("/bin/kill", "root", ["", "-9"],
+                                         ["/usr/sbin/dnsmasq"]),
+                      filters.ReadFileFilter("/etc/hosts")]
+        with mock.patch.object(wrapper, '_import_filters',
+                               return_value=filterlist):
+            wrapper.load_filters(self.cache_path)
+        cached = wrapper.load_filters(self.cache_path)
+        self.assertEqual([(f.__class__, f.exec_path, f.run_as, f.args)
+                          for f in cached],
+                         [(f.__class__, f.exec_path, f.run_as, f.args)
+                          for f in filterlist])
+        self.assertTrue(cached[0].match(["ls", "/tmp"]))
+        self.assertTrue(cached[2].match(["cat", "/etc/hosts"]))
+
+    def test_unknown_filter_class_ignored(self):
+        wrapper.load_filters(self.cache_path)
+        with open(self.cache_path) as cache:
+            cached = json.load(cache)
+        cached['filters'] = [['Popen', ['/bin/sh']]]
+        with open(self.cache_path, 'w') as cache:
+            json.dump(cached, cache)
+        with mock.patch.object(wrapper, '_import_filters',
+                               return_value=[]) as import_filters:
+            wrapper.load_filters(self.cache_path)
+        self.assertTrue(import_filters.called)
+
+    def test_missing_cache_dir(self):
+        cache_path = os.path.join(self.tmpdir, 'missing', 'cache',
+                                  'filters.cache')
+        self.assertTrue(wrapper.load_filters(cache_path))
+        self.assertFalse(os.path.exists(cache_path))
@@ -0,0 +1,136 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2012 Openstack, LLC.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+import mock
+
+from quantum.agent.linux import utils
+from quantum.rootwrap import daemon
+from quantum.rootwrap import filters
+
+
+class RootwrapDaemonTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.tmpdir, 'rootwrap.sock')
+        self.root_helper = utils.ROOTWRAP_DAEMON_PREFIX + self.socket_path
+        filterlist = [filters.CommandFilter("/bin/echo", "root"),
+                      filters.CommandFilter("/bin/cat", "root"),
+                      filters.CommandFilter("/bin/false", "root"),
+                      filters.CommandFilter("/nonexistent/missing", "root")]
+        self.server = daemon.RootwrapServer(self.socket_path, os.getuid(),
+                                            filterlist)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def tearDown(self):
+        utils.get_rootwrap_client(self.socket_path).close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_socket_only_accessible_to_owner(self):
+        mode = os.stat(self.socket_path).st_mode & 0777
+        self.assertEqual(mode, 0600)
+
+    def test_execute(self):
+        result = utils.execute(["echo", "-n", "hello"], self.root_helper)
+        self.assertEqual(result, "hello")
+
+    def test_connection_is_reused(self):
+        client = utils.get_rootwrap_client(self.socket_path)
+        utils.execute(["echo"], self.root_helper)
+        sock = client.sock
+        utils.execute(["echo"], self.root_helper)
+        self.assertTrue(client.sock is sock)
+
+    def test_process_input(self):
+        result = utils.execute(["cat"], self.root_helper,
+                               process_input="flow\xff\n")
+        self.assertEqual(result, "flow\xff\n")
+
+    def test_check_exit_code(self):
+        self.assertRaises(RuntimeError, utils.execute, ["false"],
+                          self.root_helper)
+        self.assertEqual(utils.execute(["false"], self.root_helper,
+                                       check_exit_code=False), "")
+
+    def test_unauthorized_command(self):
+        stdout, stderr = utils.execute(["ls", "/"], self.root_helper,
+                                       check_exit_code=False,
+                                       return_stderr=True)
+        self.assertEqual(stdout, "")
+        self.assertEqual(stderr, "Unauthorized command: ls /")
+
+    def test_missing_executable(self):
+        self.assertRaises(RuntimeError, utils.execute, ["missing"],
+                          self.root_helper)
+        returncode, _stdout, stderr = utils.get_rootwrap_client(
+            self.socket_path).execute(["missing"])
+        self.assertEqual(returncode, daemon.RC_NOCOMMAND)
+        self.assertTrue(stderr.startswith("Unable to run"))
+
+    def test_unauthorized_peer(self):
+        self.server.allowed_uids = set()
+        self.assertRaises(socket.error, utils.execute, ["echo"],
+                          self.root_helper)
+
+    def test_reconnect_after_daemon_restart(self):
+        utils.execute(["echo"], self.root_helper)
+        client = utils.get_rootwrap_client(self.socket_path)
+        client.sock.shutdown(socket.SHUT_RDWR)
+        result = utils.execute(["echo", "-n", "again"], self.root_helper)
+        self.assertEqual(result, "again")
+
+    def test_no_resend_after_lost_reply(self):
+        client = utils.get_rootwrap_client(self.socket_path)
+        utils.execute(["echo"], self.root_helper)
+        sent = []
+
+        def receive():
+            sent.append(True)
+            raise socket.error("Connection reset by peer")
+
+        client._receive = receive
+        self.assertRaises(socket.error, utils.execute, ["echo"],
+                          self.root_helper)
+        self.assertEqual(len(sent), 1)
+
+    def test_execute_many_closes_worker_connections(self):
+        close = utils.RootwrapClient.close
+        closed = []
+
+        def record_close(client):
+            closed.append(client)
+            close(client)
+
+        with mock.patch.object(utils.RootwrapClient, 'close', record_close):
+            result = utils.execute_many([["echo", "-n", "a"],
+                                         ["echo", "-n", "b"]],
+                                        root_helper=self.root_helper,
+                                        max_workers=2)
+        self.assertEqual(result, ["a", "b"])
+        self.assertEqual(len(closed), 2)
+        self.assertTrue(all(client.sock is None for client in closed))